@@ -1,5 +1,18 @@
 import argparse
 import binascii
+import collections
+import json
+import os
+import sys
+
+# Ontology's deploy price: a flat fee plus a fee per whole KB of code
+CONTRACT_CREATE_GAS = 20000000
+UINT_DEPLOY_CODE_LEN_GAS = 200000
+PER_UNIT_CODE_LEN = 1024
+
+# what `compile.py` replaces each `throw_conversion` with
+THROW_CONVERSION_LENGTH = 11
+THROW_CONVERSION_REPLACEMENT = b'\xff' * THROW_CONVERSION_LENGTH
 
 
 def hexlify_avm(blob):
@@ -11,9 +24,107 @@ def read_avm(filename):
         return hexlify_avm(f.read())
 
 
+def deploy_gas(code_length):
+    return CONTRACT_CREATE_GAS + code_length // PER_UNIT_CODE_LEN * UINT_DEPLOY_CODE_LEN_GAS
+
+
+def read_debug_map(avm_file):
+    """
+    :return: list of (start, end, function) from the `.debug.json` written next
+    to `avm_file` by `compile.py --export-debug`, or None without one.
+    """
+    debug_file = ''.join([os.path.splitext(avm_file)[0], '.debug.json'])
+    if not os.path.exists(debug_file):
+        return None
+    with open(debug_file) as f:
+        debug = json.load(f)
+    files = {item['id']: os.path.splitext(os.path.basename(item['url']))[0] for item in debug['files']}
+    return [(item['start'], item['end'], '.'.join([files.get(item['file'], '?'), item['method']]))
+            for item in debug['map']]
+
+
+def profile_avm(avm_file):
+    """
+    Splits a contract into the Python functions it was compiled from.
+    :return: dict with the contract's `size`, estimated `deploy_gas`, the
+    `throw_conversion` sites and, by function, the bytes, instruction count,
+    opcode histogram and syscall counts.
+    """
+    from neovm import disassemble
+
+    with open(avm_file, 'rb') as f:
+        code = f.read()
+    debug_map = read_debug_map(avm_file) or list()
+    owners = dict()
+    for start, end, function in debug_map:
+        for offset in range(start, end + 1):
+            owners[offset] = function
+
+    functions = collections.defaultdict(lambda: {'bytes': 0, 'instructions': 0, 'opcodes': collections.Counter(),
+                                                 'syscalls': collections.Counter()})
+    instructions = disassemble(code)
+    for index, (offset, name, operand) in enumerate(instructions):
+        end = instructions[index + 1][0] if index + 1 < len(instructions) else len(code)
+        function = functions[owners.get(offset, '<unmapped>')]
+        function['bytes'] += end - offset
+        function['instructions'] += 1
+        function['opcodes'][name] += 1
+        if name == 'SYSCALL':
+            function['syscalls'][operand.decode('ascii', 'replace')] += 1
+
+    sites = code.count(THROW_CONVERSION_REPLACEMENT)
+    return {
+        'file': avm_file,
+        'size': len(code),
+        'deploy_gas': deploy_gas(len(code)),
+        'debug_map': bool(debug_map),
+        'throw_conversion': {'sites': sites, 'bytes': sites * THROW_CONVERSION_LENGTH},
+        'functions': {name: dict(item, opcodes=dict(item['opcodes'].most_common()),
+                                 syscalls=dict(item['syscalls'].most_common()))
+                      for name, item in sorted(functions.items(), key=lambda pair: -pair[1]['bytes'])},
+    }
+
+
+def print_profile(profile, top=5):
+    print('## {} ##'.format(profile['file']))
+    print('size {} bytes, deploy gas {}, throw_conversion {} sites / {} bytes{}'.format(
+        profile['size'], profile['deploy_gas'], profile['throw_conversion']['sites'],
+        profile['throw_conversion']['bytes'], '' if profile['debug_map'] else ', no debug map'))
+    for name, item in profile['functions'].items():
+        opcodes = ' '.join('{}:{}'.format(opcode, count) for opcode, count in list(item['opcodes'].items())[:top])
+        syscalls = ' '.join('{}:{}'.format(syscall.split('.')[-1], count)
+                            for syscall, count in item['syscalls'].items())
+        print('{:<36} {:>6} B {:>5.1f}% {:>5} ops  {}{}'.format(
+            name, item['bytes'], 100.0 * item['bytes'] / profile['size'], item['instructions'], opcodes,
+            ''.join(['  | ', syscalls]) if syscalls else ''))
+
+
 if __name__ == '__main__':
     args = argparse.ArgumentParser()
     args.add_argument('input', metavar='I', type=str, nargs='+', help='File glob patterns to compile')
+    args.add_argument('--profile', action='store_true',
+                      help='report size, opcodes and syscalls by function instead of the hex')
+    args.add_argument('--top', type=int, default=5, help='opcodes shown per function with --profile')
+    args.add_argument('--json', type=str, help='also write the profiles to this JSON file')
+    args.add_argument('--max-size', type=int, help='fail if a contract is larger than this many bytes')
     args = args.parse_args()
+
+    profiles = list()
     for avm_file in args.input:
-        print(read_avm(avm_file))
+        if args.profile or args.json:
+            profiles.append(profile_avm(avm_file))
+            if args.profile:
+                print_profile(profiles[-1], args.top)
+        elif not args.max_size:
+            print(read_avm(avm_file))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(profiles, f, indent=2)
+
+    if args.max_size:
+        oversized = [(avm_file, os.path.getsize(avm_file)) for avm_file in args.input
+                     if os.path.getsize(avm_file) > args.max_size]
+        for avm_file, size in oversized:
+            print('{} is {} bytes, over the limit of {}'.format(avm_file, size, args.max_size), file=sys.stderr)
+        if oversized:
+            sys.exit(1)
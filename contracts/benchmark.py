@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from simulator import (CONTRACTS_ROOT, DEPLOYER, SPOKKZ_COIN, SPOKKZ_COIN_ADDRESS, SPUUL_TOKENIZATION, Simulator,
+                       script_hash)
+
+SPUUL_TOKENIZATION_ADDRESS = '0000000000000000000000000000000000005b01'
+
+HOLDER_BALANCE = 10 ** 12
+SEED_BATCH = 256
+
+# per-op counts are deterministic, so any increase is a regression
+COUNT_FIELDS = ('reads_per_op', 'writes_per_op', 'notify_per_op')
+
+
+class Bench(object):
+    """
+    Both contracts deployed on a simulator with `holders` funded accounts.
+    Each holder has approved SpuulTokenization and the next holder, so
+    `transferFrom` and `confirmPayment` can run from any of them.
+    """
+
+    def __init__(self, holders):
+        self.sim = Simulator()
+        self.spkz = self.sim.deploy(SPOKKZ_COIN, SPOKKZ_COIN_ADDRESS).contract_address
+        self.spuul = self.sim.deploy(SPUUL_TOKENIZATION, SPUUL_TOKENIZATION_ADDRESS).contract_address
+        self.spuul_hash = bytes.fromhex(self.spuul)[::-1]
+        self.deployer = script_hash(DEPLOYER)
+        # index + 1, so no holder is the all-zero hash
+        self.holders = [(index + 1).to_bytes(20, 'big') for index in range(holders)]
+        self.setup(self.spkz, 'deploy', [], [DEPLOYER])
+        self.setup(self.spuul, 'deploy', [], [DEPLOYER])
+        for start in range(0, holders, SEED_BATCH):
+            self.setup(self.spkz, 'transferMulti',
+                       [[self.deployer, item, HOLDER_BALANCE] for item in self.holders[start:start + SEED_BATCH]],
+                       [DEPLOYER])
+        for index, item in enumerate(self.holders):
+            self.setup(self.spkz, 'approve', [item, self.spuul_hash, HOLDER_BALANCE // 4], [item])
+            self.setup(self.spkz, 'approve', [item, self.holder(index + 1), HOLDER_BALANCE // 4], [item])
+        self.state = self.sim.snapshot()
+
+    def setup(self, contract_address, operation, args, signers):
+        result = self.sim.invoke(contract_address, operation, args, signers)
+        if result['State'] != 1:
+            raise RuntimeError(''.join(['setup ', operation, ' failed: ', result.get('Error', '')]))
+
+    def holder(self, index):
+        return self.holders[index % len(self.holders)]
+
+
+################################################################################
+# cases: functions of (bench, iteration) returning (contract, operation, args, signers)
+
+def transfer(bench, index):
+    sender = bench.holder(index)
+    return bench.spkz, 'transfer', [sender, bench.holder(index + 1), 1], [sender]
+
+
+def transfer_multi(batch):
+    def case(bench, index):
+        sender = bench.holder(index)
+        return (bench.spkz, 'transferMulti', [[sender, bench.holder(index + 1 + item), 1] for item in range(batch)],
+                [sender])
+    return case
+
+
+def approve(bench, index):
+    sender = bench.holder(index)
+    return bench.spkz, 'approve', [sender, bench.spuul_hash, HOLDER_BALANCE // 4], [sender]
+
+
+def transfer_from(bench, index):
+    owner, spender = bench.holder(index), bench.holder(index + 1)
+    return bench.spkz, 'transferFrom', [spender, owner, spender, 1], [spender]
+
+
+def balance_of(bench, index):
+    return bench.spkz, 'balanceOf', [bench.holder(index)], []
+
+
+def total_supply(bench, index):
+    return bench.spkz, 'totalSupply', [], []
+
+
+def confirm_payment(bench, index):
+    return bench.spuul, 'confirmPayment', [bench.holder(index), 1, ''.join(['order-', str(index)])], [DEPLOYER]
+
+
+def amount_paid(bench, index):
+    return bench.spuul, 'amountPaid', [''.join(['order-', str(index)])], []
+
+
+def cases(batches):
+    """
+    :return: list of (name, case, size), where size is the number of transfers per op.
+    """
+    items = [('SpokkzCoin.transfer', transfer, 1),
+             ('SpokkzCoin.approve', approve, 1),
+             ('SpokkzCoin.transferFrom', transfer_from, 1),
+             ('SpokkzCoin.balanceOf', balance_of, 1),
+             ('SpokkzCoin.totalSupply', total_supply, 1),
+             ('SpuulTokenization.confirmPayment', confirm_payment, 1),
+             ('SpuulTokenization.amountPaid', amount_paid, 1)]
+    for batch in batches:
+        items.append((''.join(['SpokkzCoin.transferMulti batch=', str(batch)]), transfer_multi(batch), batch))
+    return items
+
+
+def run_case(bench, case, iterations, repeat):
+    """
+    Runs `iterations` ops from the same starting state `repeat` times.
+    :return: the result of the fastest round.
+    """
+    calls = [case(bench, index) for index in range(iterations)]
+    best = None
+    for _ in range(repeat):
+        bench.sim.restore(bench.state)
+        results = list()
+        started_at = time.perf_counter()
+        for contract_address, operation, args, signers in calls:
+            results.append(bench.sim.invoke(contract_address, operation, args, signers))
+        elapsed = time.perf_counter() - started_at
+        if best is None or elapsed < best[0]:
+            best = (elapsed, results)
+    elapsed, results = best
+    return {
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / elapsed, 1),
+        'reads_per_op': sum(item['Reads'] for item in results) / iterations,
+        'writes_per_op': sum(item['Writes'] for item in results) / iterations,
+        'notify_per_op': sum(len(item['Notify']) for item in results) / iterations,
+        'failed': sum(1 for item in results if item['State'] != 1),
+    }
+
+
+def run(holder_counts, batches, iterations, repeat):
+    results = dict()
+    for holders in holder_counts:
+        bench = Bench(holders)
+        for name, case, size in cases(batches):
+            key = ''.join([name, ' holders=', str(holders)])
+            results[key] = run_case(bench, case, max(10, iterations // size), repeat)
+            print('{:<60} {:>10.1f} ops/s {:>6.1f} r {:>6.1f} w {:>6.1f} n {:>4} failed'.format(
+                key, results[key]['ops_per_sec'], results[key]['reads_per_op'], results[key]['writes_per_op'],
+                results[key]['notify_per_op'], results[key]['failed']))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=CONTRACTS_ROOT,
+                                       stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, max_slowdown):
+    """
+    :return: list of regressions of `current` against `baseline`, by case.
+    """
+    regressions = list()
+    for key, result in sorted(current['results'].items()):
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        if result['ops_per_sec'] < base['ops_per_sec'] * (1 - max_slowdown):
+            regressions.append('{}: {:.1f} ops/s, was {:.1f}'.format(key, result['ops_per_sec'], base['ops_per_sec']))
+        for field in COUNT_FIELDS:
+            if result[field] > base[field]:
+                regressions.append('{}: {} {}, was {}'.format(key, field, result[field], base[field]))
+        if result['failed'] > base['failed']:
+            regressions.append('{}: {} failed, was {}'.format(key, result['failed'], base['failed']))
+    return regressions
+
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser()
+    args.add_argument('--holders', type=int, nargs='+', default=[100, 10000], help='holder set sizes to sweep')
+    args.add_argument('--batches', type=int, nargs='+', default=[1, 4, 16, 64, 256],
+                      help='transferMulti batch sizes to sweep')
+    args.add_argument('--iterations', '-n', type=int, default=2000, help='transfers per case')
+    args.add_argument('--repeat', '-r', type=int, default=3, help='rounds per case, the fastest counts')
+    args.add_argument('--out', '-o', type=str, default='benchmark.json', help='output JSON file')
+    args.add_argument('--compare', '-c', type=str, help='earlier output JSON file to check for regressions')
+    args.add_argument('--max-slowdown', type=float, default=0.2, help='tolerated ops/s drop against --compare')
+    args = args.parse_args()
+
+    report = {'commit': git_commit(), 'python': platform.python_version(), 'created_at': time.time(),
+              'results': run(args.holders, args.batches, args.iterations, args.repeat)}
+    out_dir = os.path.dirname(args.out)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.max_slowdown)
+        for regression in regressions:
+            print(''.join(['REGRESSION ', regression]))
+        if regressions:
+            sys.exit(1)
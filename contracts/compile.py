@@ -1,5 +1,15 @@
 import os
+import io
+import ast
+import sys
+import time
+import shutil
+import hashlib
 import argparse
+import tempfile
+import contextlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 from boa.compiler import Compiler
 from glob import glob
 
@@ -8,8 +18,64 @@ throw_conversion = bytes.fromhex(
 )
 
 
-def compile_contract(file, out_dir=None, export_debug=True, print_code=True):
-    compiler = Compiler.load(file)
+def source_files(file, search_paths=None):
+    """
+    :return: the contract file and the sources of the modules it imports,
+    transitively, except boa's own. Modules are looked up like boa does,
+    relative to the working directory and the contract's directory.
+    """
+    if search_paths is None:
+        search_paths = [os.getcwd(), os.path.dirname(os.path.abspath(file))]
+    files = []
+    pending = [os.path.abspath(file)]
+    while pending:
+        path = pending.pop()
+        if path in files:
+            continue
+        files.append(path)
+        with open(path) as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ImportFrom):
+                modules = [node.module or '']
+            elif isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            else:
+                continue
+            for module in modules:
+                if module.split('.')[0] == 'boa':
+                    continue
+                for search_path in search_paths:
+                    module_path = os.path.join(search_path, *module.split('.')) + '.py'
+                    if os.path.exists(module_path):
+                        pending.append(os.path.abspath(module_path))
+                        break
+    return files
+
+
+def cache_key(file, export_debug):
+    """
+    :return: hash of the compiler version, the `throw_conversion` rewrite and
+    the contents of the contract and every module it imports.
+    """
+    key = hashlib.sha256()
+    key.update(Compiler.version().encode())
+    key.update(throw_conversion)
+    key.update(os.path.basename(file).encode())
+    key.update(b'debug' if export_debug else b'')
+    for path in sorted(source_files(file)):
+        with open(path, 'rb') as f:
+            key.update(os.path.basename(path).encode())
+            key.update(hashlib.sha256(f.read()).digest())
+    return key.hexdigest()
+
+
+def compile_contract(file, out_dir=None, export_debug=True, print_code=True, cache_dir=None):
+    """
+    Compiles a contract into `out_dir`. With `cache_dir`, the outputs of an
+    unchanged contract are restored from the cache instead of compiled.
+    :return: True if the outputs came from the cache.
+    """
     basename, _ = os.path.splitext(os.path.basename(file))
 
     if not out_dir:
@@ -20,26 +86,112 @@ def compile_contract(file, out_dir=None, export_debug=True, print_code=True):
         os.mkdir(out_dir)
 
     output_path = os.path.join(out_dir, '{}.avm'.format(basename))
+    outputs = ['{}.avm'.format(basename), '{}.txt'.format(basename)]
+    if export_debug:
+        outputs.append('{}.debug.json'.format(basename))
+
+    entry_dir = None
+    if cache_dir:
+        entry_dir = os.path.join(cache_dir, cache_key(file, export_debug))
+        if os.path.isdir(entry_dir):
+            for output in outputs[:1] + outputs[2:]:
+                shutil.copyfile(os.path.join(entry_dir, output), os.path.join(out_dir, output))
+            if print_code:
+                print('## {} ## (cached)'.format(basename))
+                with open(os.path.join(entry_dir, outputs[1])) as f:
+                    print(f.read(), end='')
+            return True
+
+    compiler = Compiler.load(file)
 
     avm_code = compiler.write().replace(throw_conversion, b'\xff' * len(throw_conversion))
     compiler.write_file(avm_code, output_path)
 
     if export_debug:
-        compiler.entry_module.export_debug(output_path)
+        compiler.entry_module.export_debug(output_path, avm_code)
 
-    if print_code:
-        print('## {} ##'.format(basename))
+    code = io.StringIO()
+    with contextlib.redirect_stdout(code):
         compiler.entry_module.to_s()
 
-
-def compile_match_files(glob_pattern, out_dir=None, export_debug=True, print_code=True):
-    for file in glob(glob_pattern):
+    if print_code:
+        print('## {} ##'.format(basename))
+        print(code.getvalue(), end='')
+
+    if entry_dir:
+        # fill a temporary directory and move it in place, so a cache entry is always complete
+        os.makedirs(cache_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(dir=cache_dir)
+        for output in outputs[:1] + outputs[2:]:
+            shutil.copyfile(os.path.join(out_dir, output), os.path.join(staging_dir, output))
+        with open(os.path.join(staging_dir, outputs[1]), 'w') as f:
+            f.write(code.getvalue())
+        try:
+            os.rename(staging_dir, entry_dir)
+        except OSError:
+            # another build stored the same entry first
+            shutil.rmtree(staging_dir)
+    return False
+
+
+def compile_file(file, out_dir=None, export_debug=True, print_code=True, cache_dir=None):
+    """
+    Compiles a contract with everything it prints captured, so contracts
+    compiled side by side don't interleave their output.
+    :return: (output, seconds taken, True if cached, traceback or None on success).
+    """
+    output = io.StringIO()
+    started_at = time.perf_counter()
+    cached, error = False, None
+    with contextlib.redirect_stdout(output):
+        try:
+            cached = compile_contract(file, out_dir, export_debug, print_code, cache_dir)
+        except Exception:
+            error = traceback.format_exc()
+    return output.getvalue(), time.perf_counter() - started_at, cached, error
+
+
+def compile_match_files(glob_pattern, out_dir=None, export_debug=True, print_code=True, cache_dir=None, jobs=None):
+    """
+    Compiles the matching contracts in a pool of `jobs` processes, default
+    one per CPU. Each contract's output is printed whole, in file name
+    order, followed by its timing. A failing contract doesn't stop the others.
+    :return: list of the files that failed.
+    """
+    files = []
+    for file in sorted(glob(glob_pattern)):
         basename, ext = os.path.splitext(os.path.basename(file))
 
         if ext != '.py' or basename in ('__init__', ):
             continue
 
-        compile_contract(file, out_dir, export_debug, print_code)
+        files.append(file)
+
+    if not files:
+        return []
+    # the output directory is shared, so create it before the workers race to
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    arguments = [(file, out_dir, export_debug, print_code, cache_dir) for file in files]
+    jobs = min(jobs or os.cpu_count() or 1, len(files))
+    failed = []
+    with contextlib.ExitStack() as stack:
+        if jobs > 1:
+            # boa's compiler is a process wide singleton, hence processes rather than threads
+            results = stack.enter_context(ProcessPoolExecutor(jobs)).map(compile_file, *zip(*arguments))
+        else:
+            results = (compile_file(*item) for item in arguments)
+        for file, (output, elapsed, cached, error) in zip(files, results):
+            print(output, end='')
+            if error:
+                failed.append(file)
+                print('{} failed after {:.2f}s'.format(file, elapsed))
+                print(error, end='', file=sys.stderr)
+            else:
+                print('{} {} in {:.2f}s'.format(file, 'restored' if cached else 'compiled', elapsed))
+            sys.stdout.flush()
+    return failed
 
 
 if __name__ == '__main__':
@@ -47,7 +199,15 @@ if __name__ == '__main__':
     args.add_argument('input', metavar='I', type=str, nargs='+', help='File glob patterns to compile')
     args.add_argument('--out', '-o', type=str, help='output directory', default='build')
     args.add_argument('--export-debug', action='store_true')
+    args.add_argument('--cache-dir', type=str, help='build cache directory', default='.build-cache')
+    args.add_argument('--no-cache', action='store_true', help='compile every contract from scratch')
+    args.add_argument('--jobs', '-j', type=int, help='contracts compiled in parallel, default one per CPU')
     args = args.parse_args()
 
+    failed = []
     for pattern in args.input:
-        compile_match_files(pattern, args.out, args.export_debug)
\ No newline at end of file
+        failed += compile_match_files(pattern, args.out, args.export_debug,
+                                      cache_dir=None if args.no_cache else args.cache_dir, jobs=args.jobs)
+    if failed:
+        print('{} contract(s) failed to compile: {}'.format(len(failed), ', '.join(failed)), file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,228 @@
+import argparse
+import collections
+import html
+import json
+import os
+
+from neovm import Engine, decode_args, gas_report, script_hash_of
+from simulator import CONTRACTS_ROOT, DEPLOYER
+
+INVOCATION = '<invocation>'
+UNMAPPED = '<unmapped>'
+HEAT_WIDTH = 10
+
+
+class SourceMap(object):
+    """
+    Maps the offsets of a built contract to the Python source lines and
+    functions they were compiled from, by its `.debug.json`. boa inlines
+    module level assignments like `ctx = GetContext()` into every function,
+    so their cost lands on the assignment's line.
+    """
+
+    def __init__(self, avm_file):
+        with open(avm_file, 'rb') as f:
+            self.code = f.read()
+        self.contract_address = script_hash_of(self.code)[::-1].hex()
+        with open(''.join([os.path.splitext(avm_file)[0], '.debug.json'])) as f:
+            debug = json.load(f)
+        files = {item['id']: self.__resolve(item['url']) for item in debug['files']}
+        self.__lines = dict()
+        for item in debug['map']:
+            source_file = files.get(item['file'], UNMAPPED)
+            # named after the defining module, like `avm.py --profile` does
+            function = '.'.join([os.path.splitext(os.path.basename(source_file))[0], item['method']])
+            location = (source_file, item['file_line_no'], function)
+            for offset in range(item['start'], item['end'] + 1):
+                self.__lines[offset] = location
+
+    @staticmethod
+    def __resolve(url):
+        """
+        The debug map holds the paths of the machine that compiled the
+        contract; fall back to the file of the same name in this checkout.
+        """
+        if os.path.exists(url):
+            return url
+        for directory in ('contracts', 'libs'):
+            path = os.path.join(CONTRACTS_ROOT, directory, os.path.basename(url))
+            if os.path.exists(path):
+                return path
+        return url
+
+    def locate(self, offset):
+        """
+        :return: (source file, line, function) of the instruction at `offset`.
+        """
+        return self.__lines.get(offset, (UNMAPPED, 0, UNMAPPED))
+
+
+class GasProfile(object):
+    """
+    Gas and opcode counts by source line and by function, accumulated from
+    execution trace steps of (contract address, offset, opcode, gas).
+    """
+
+    def __init__(self, source_maps):
+        self.source_maps = {source_map.contract_address: source_map for source_map in source_maps}
+        self.lines = collections.defaultdict(lambda: {'gas': 0, 'steps': 0, 'opcodes': collections.Counter()})
+        self.functions = collections.defaultdict(lambda: {'gas': 0, 'steps': 0})
+        self.gas = 0
+        self.steps = 0
+
+    def add(self, contract_address, offset, opcode, gas):
+        source_map = self.source_maps.get(contract_address)
+        if source_map is None:
+            source_file, line, function = INVOCATION, 0, INVOCATION
+        else:
+            source_file, line, function = source_map.locate(offset)
+        item = self.lines[(source_file, line)]
+        item['gas'] += gas
+        item['steps'] += 1
+        item['opcodes'][opcode] += 1
+        self.functions[function]['gas'] += gas
+        self.functions[function]['steps'] += 1
+        self.gas += gas
+        self.steps += 1
+
+    def on_step(self, script_hash, offset, opcode, gas):
+        """
+        `Engine.invoke` step hook.
+        """
+        self.add(script_hash[::-1].hex(), offset, opcode, gas)
+
+    def load_trace(self, path):
+        """
+        Adds a trace saved as JSON lines of `{"contract", "offset", "opcode", "gas"}`,
+        e.g. converted from a node's VM debug log or written with `--save-trace`.
+        """
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    step = json.loads(line)
+                    self.add(step['contract'], step['offset'], step.get('opcode', '?'), step['gas'])
+
+    def source_files(self):
+        return sorted(set(source_file for source_file, _ in self.lines if os.path.exists(source_file)))
+
+    def text(self, context=0):
+        """
+        :return: the profile as text: functions by gas, then each source file
+        with the gas, share, steps and a heat bar of the lines that ran.
+        """
+        out = ['{:<48} {:>10} {:>6} {:>8}'.format('function', 'gas', '%', 'steps')]
+        for name, item in sorted(self.functions.items(), key=lambda pair: -pair[1]['gas']):
+            out.append('{:<48} {:>10} {:>6.1f} {:>8}'.format(name, item['gas'], self.__share(item['gas']),
+                                                            item['steps']))
+        top = max([item['gas'] for item in self.lines.values()] or [1])
+        for source_file in self.source_files():
+            with open(source_file) as f:
+                source = f.read().splitlines()
+            hit = [line for file_name, line in self.lines if file_name == source_file]
+            shown = sorted(set(number for line in hit
+                               for number in range(max(1, line - context), min(len(source), line + context) + 1)))
+            out.extend(['', ''.join(['## ', os.path.relpath(source_file, CONTRACTS_ROOT), ' ##'])])
+            previous = None
+            for number in shown:
+                if previous is not None and number > previous + 1:
+                    out.append('...')
+                previous = number
+                item = self.lines.get((source_file, number))
+                if item is None:
+                    out.append('{:>5} {:>10} {:>6} {:>8} {:<{}} {}'.format(
+                        number, '', '', '', '', HEAT_WIDTH, source[number - 1]))
+                    continue
+                out.append('{:>5} {:>10} {:>6.1f} {:>8} {:<{}} {}'.format(
+                    number, item['gas'], self.__share(item['gas']), item['steps'],
+                    '#' * round(HEAT_WIDTH * item['gas'] / top) or '.', HEAT_WIDTH, source[number - 1]))
+        return '\n'.join(out)
+
+    def html(self, title='gas profile'):
+        """
+        :return: the profile as a standalone HTML page: functions by gas, then
+        each source file with every line shaded by its share of the gas.
+        """
+        top = max([item['gas'] for item in self.lines.values()] or [1])
+        out = ['<!DOCTYPE html><html><head><meta charset="utf-8"><title>', html.escape(title), '</title><style>',
+               'body{font-family:sans-serif}table{border-collapse:collapse}td,th{padding:0 8px;text-align:right}',
+               'td.src{text-align:left;font-family:monospace;white-space:pre}',
+               '</style></head><body><h1>', html.escape(title), '</h1>',
+               '<p>', str(self.gas), ' gas in ', str(self.steps), ' steps</p>',
+               '<table><tr><th>function</th><th>gas</th><th>%</th><th>steps</th></tr>']
+        for name, item in sorted(self.functions.items(), key=lambda pair: -pair[1]['gas']):
+            out.append('<tr><td class="src">{}</td><td>{}</td><td>{:.1f}</td><td>{}</td></tr>'.format(
+                html.escape(name), item['gas'], self.__share(item['gas']), item['steps']))
+        out.append('</table>')
+        for source_file in self.source_files():
+            with open(source_file) as f:
+                source = f.read().splitlines()
+            out.extend(['<h2>', html.escape(os.path.relpath(source_file, CONTRACTS_ROOT)), '</h2>',
+                        '<table><tr><th>line</th><th>gas</th><th>%</th><th>steps</th><th></th></tr>'])
+            for number, text in enumerate(source, 1):
+                item = self.lines.get((source_file, number))
+                if item is None:
+                    out.append('<tr><td>{}</td><td></td><td></td><td></td><td class="src">{}</td></tr>'.format(
+                        number, html.escape(text)))
+                    continue
+                opcodes = ', '.join('{} {}'.format(opcode, count) for opcode, count in item['opcodes'].most_common())
+                out.append(''.join([
+                    '<tr style="background:rgba(255,0,0,{:.2f})" title="{}">'.format(
+                        0.05 + 0.75 * item['gas'] / top, html.escape(opcodes)),
+                    '<td>{}</td><td>{}</td><td>{:.1f}</td><td>{}</td><td class="src">{}</td></tr>'.format(
+                        number, item['gas'], self.__share(item['gas']), item['steps'], html.escape(text))]))
+            out.append('</table>')
+        out.append('</body></html>')
+        return ''.join(out)
+
+    def __share(self, gas):
+        return 100.0 * gas / self.gas if self.gas else 0.0
+
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser()
+    args.add_argument('avm', metavar='AVM', type=str, nargs='+',
+                      help='built contracts, each with its .debug.json; the first is invoked')
+    args.add_argument('--trace', '-t', type=str, help='profile this JSON lines trace instead of running the VM')
+    args.add_argument('--operation', '-op', type=str,
+                      help='operation to profile after deploying every contract, by default the whole gas report')
+    args.add_argument('--args', '-a', type=str, default='[]',
+                      help='JSON list of arguments; strings starting with 0x are hex byte arrays')
+    args.add_argument('--signer', '-s', type=str, nargs='*', default=[DEPLOYER], help='base58 signer addresses')
+    args.add_argument('--save-trace', type=str, help='also write the VM trace as JSON lines')
+    args.add_argument('--html', type=str, help='write an HTML heatmap to this file instead of printing text')
+    args.add_argument('--context', '-C', type=int, default=0, help='source lines shown around the lines that ran')
+    args = args.parse_args()
+
+    profile = GasProfile([SourceMap(avm_file) for avm_file in args.avm])
+    if args.trace:
+        profile.load_trace(args.trace)
+    else:
+        steps = list()
+
+        def on_step(script_hash, offset, opcode, gas):
+            profile.on_step(script_hash, offset, opcode, gas)
+            if args.save_trace:
+                steps.append({'contract': script_hash[::-1].hex(), 'offset': offset, 'opcode': opcode, 'gas': gas})
+
+        if args.operation:
+            engine = Engine()
+            addresses = [engine.load(avm_file) for avm_file in args.avm]
+            for contract_address in addresses:
+                engine.invoke(contract_address, 'deploy', [], [DEPLOYER])
+            result = engine.invoke(addresses[0], args.operation, decode_args(json.loads(args.args)), args.signer,
+                                   on_step=on_step)
+            if result['State'] != 1:
+                print(''.join(['operation failed: ', result['Error']]))
+        else:
+            gas_report(args.avm[0], args.avm[1] if len(args.avm) > 1 else None, on_step=on_step)
+        if args.save_trace:
+            with open(args.save_trace, 'w') as f:
+                for step in steps:
+                    f.write(json.dumps(step))
+                    f.write('\n')
+
+    if args.html:
+        with open(args.html, 'w') as f:
+            f.write(profile.html(' '.join([os.path.basename(avm_file) for avm_file in args.avm])))
+    else:
+        print(profile.text(args.context))
@@ -0,0 +1,439 @@
+import argparse
+import decimal
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ontology.common.address import Address
+from ontology.core.transaction import Transaction
+from ontology.exception.exception import SDKException
+
+from simulator import DEPLOYER, SPOKKZ_COIN, SPOKKZ_COIN_ADDRESS, SPUUL_TOKENIZATION, ByteArray, Simulator, to_bytes
+
+VERSION = '1.0.0-mock'
+
+# the explorer's DEFAULT_CONTRACT_ADDRESS
+DEFAULT_SPKZ_ADDRESS = 'af85e68414d5d7dd5726cca3a3df4658708b2c8a'
+
+SUCCESS = 0
+INVALID_METHOD = 42001
+INVALID_PARAMS = 42002
+INVALID_TRANSACTION = 43001
+UNKNOWN_TRANSACTION = 44001
+UNKNOWN_BLOCK = 44003
+UNKNOWN_CONTRACT = 44004
+INTERNAL_ERROR = 45001
+
+ERROR_DESC = {
+    SUCCESS: 'SUCCESS',
+    INVALID_METHOD: 'INVALID METHOD',
+    INVALID_PARAMS: 'INVALID PARAMS',
+    INVALID_TRANSACTION: 'INVALID TRANSACTION',
+    UNKNOWN_TRANSACTION: 'UNKNOWN TRANSACTION',
+    UNKNOWN_BLOCK: 'UNKNOWN BLOCK',
+    UNKNOWN_CONTRACT: 'UNKNOWN CONTRACT',
+    INTERNAL_ERROR: 'INTERNAL ERROR',
+}
+
+# Ontology's syscall prices; opcodes are not metered, so this is a lower bound of the real cost
+MIN_TRANSACTION_GAS = 20000
+STORAGE_GET_GAS = 200
+STORAGE_PUT_GAS = 4000
+
+# the native ONG contract charges every transaction's fee to the governance address
+ONG_ADDRESS = '0200000000000000000000000000000000000000'
+GOVERNANCE_ADDRESS = 'AFmseVrdL9f9oyCzZefL9tG6UbviEH9ugK'
+ONG_DECIMALS = 9
+
+PUSH0 = 0x00
+PUSHBYTES75 = 0x4b
+PUSHDATA1 = 0x4c
+PUSHDATA2 = 0x4d
+PUSHDATA4 = 0x4e
+PUSHM1 = 0x4f
+PUSH1 = 0x51
+PUSH16 = 0x60
+APPCALL = 0x67
+PACK = 0xc1
+
+
+class RpcError(Exception):
+    def __init__(self, code, result=''):
+        super().__init__(code, result)
+        self.code = code
+        self.result = result
+
+
+def decode_invocation(code):
+    """
+    Decodes the invocation script the SDK builds: the pushed arguments, a
+    `PACK` per list, the operation and an `APPCALL` of the contract.
+    :return: (contract address hex, operation, args).
+    """
+    stack = list()
+    position = 0
+    while position < len(code):
+        opcode = code[position]
+        position += 1
+        if opcode == PUSH0:
+            stack.append(ByteArray())
+        elif opcode <= PUSHDATA4:
+            if opcode <= PUSHBYTES75:
+                length = opcode
+            else:
+                size = {PUSHDATA1: 1, PUSHDATA2: 2, PUSHDATA4: 4}[opcode]
+                length = int.from_bytes(code[position:position + size], 'little')
+                position += size
+            stack.append(ByteArray(code[position:position + length]))
+            position += length
+        elif opcode == PUSHM1:
+            stack.append(-1)
+        elif PUSH1 <= opcode <= PUSH16:
+            stack.append(opcode - PUSH1 + 1)
+        elif opcode == PACK:
+            count = int(stack.pop())
+            stack.append([stack.pop() for _ in range(count)])
+        elif opcode == APPCALL:
+            contract_address = bytes(code[position:position + 20])[::-1].hex()
+            operation = stack.pop()
+            args = stack.pop() if stack else list()
+            return contract_address, operation, args
+        else:
+            raise ValueError('unsupported opcode {:#04x} at {}'.format(opcode, position - 1))
+    raise ValueError('no APPCALL in invocation script')
+
+
+def to_hex(value):
+    """
+    Formats a contract result or Notify state the way the node does.
+    """
+    if isinstance(value, list):
+        return [to_hex(item) for item in value]
+    if isinstance(value, bool):
+        return '01' if value else '00'
+    return to_bytes(value).hex()
+
+
+def gas_of(result):
+    return max(MIN_TRANSACTION_GAS, result['Reads'] * STORAGE_GET_GAS + result['Writes'] * STORAGE_PUT_GAS)
+
+
+class MockNode(object):
+    """
+    Answers the JSON-RPC methods the explorer and the SDK use from contracts
+    running on a `Simulator`. Sent transactions are executed when received
+    and confirmed in the next block, produced every `block_interval` seconds.
+    Signatures are not verified: every signer of a transaction is a witness.
+    Like the node, every transaction ends with the native ONG `transfer`
+    notify of its fee, which is taken from the payer's ONG.
+    :param balances: dict of base58 address to `{'ont': int, 'ong': int}`, ONG in its smallest unit.
+    """
+
+    def __init__(self, sim, block_interval=1.0, balances=None):
+        self.sim = sim
+        self.block_interval = block_interval
+        self.balances = balances or dict()
+        self.blocks = list()
+        self.events = dict()
+        self.heights = dict()
+        self.pending = list()
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.produce_block()
+        self.methods = {
+            'getversion': self.get_version,
+            'getblockcount': self.get_block_count,
+            'getblock': self.get_block,
+            'getbalance': self.get_balance,
+            'getsmartcodeevent': self.get_smart_code_event,
+            'getblockheightbytxhash': self.get_block_height_by_tx_hash,
+            'getstorage': self.get_storage,
+            'sendrawtransaction': self.send_raw_transaction,
+        }
+
+    def start(self):
+        if self.block_interval > 0:
+            # with no interval every transaction produces its own block
+            threading.Thread(target=self.__produce_blocks, name='mock-node-blocks', daemon=True).start()
+
+    def stop(self):
+        self.__stop.set()
+
+    def __produce_blocks(self):
+        while not self.__stop.wait(self.block_interval):
+            self.produce_block()
+
+    def produce_block(self):
+        with self.__lock:
+            height = len(self.blocks)
+            prev_hash = self.blocks[-1]['Hash'] if self.blocks else '00' * 32
+            transactions, self.pending = self.pending, list()
+            block_hash = hashlib.sha256(''.join([prev_hash] + [item['Hash'] for item in transactions]).encode() +
+                                        height.to_bytes(4, 'little')).hexdigest()
+            for item in transactions:
+                self.heights[item['Hash']] = height
+            self.blocks.append({
+                'Hash': block_hash,
+                'Header': {'Version': 0, 'PrevBlockHash': prev_hash, 'Timestamp': int(time.time()), 'Height': height,
+                           'Hash': block_hash},
+                'Transactions': transactions,
+            })
+
+    def handle(self, method, params):
+        """
+        :return: (error code, result).
+        """
+        handler = self.methods.get(method)
+        if handler is None:
+            return INVALID_METHOD, ''
+        try:
+            return SUCCESS, handler(*params)
+        except RpcError as e:
+            return e.code, e.result
+        except (TypeError, ValueError, IndexError) as e:
+            return INVALID_PARAMS, str(e)
+        except SDKException as e:
+            # e.g. an address the SDK cannot decode
+            return INVALID_PARAMS, e.args[1]
+
+    def get_version(self):
+        return VERSION
+
+    def get_block_count(self):
+        return len(self.blocks)
+
+    def get_block(self, height_or_hash, verbose=0):
+        if int(verbose) != 1:
+            raise RpcError(INVALID_PARAMS, 'only verbose blocks are supported')
+        with self.__lock:
+            if isinstance(height_or_hash, int):
+                if not 0 <= height_or_hash < len(self.blocks):
+                    raise RpcError(UNKNOWN_BLOCK)
+                return self.blocks[height_or_hash]
+            for block in self.blocks:
+                if block['Hash'] == height_or_hash:
+                    return block
+        raise RpcError(UNKNOWN_BLOCK)
+
+    def get_balance(self, b58_address, *_):
+        Address.b58decode(b58_address)
+        with self.__lock:
+            balance = self.balances.get(b58_address, dict())
+            return {'ont': str(balance.get('ont', 0)), 'ong': str(balance.get('ong', 0))}
+
+    def get_smart_code_event(self, hash_or_height, *_):
+        with self.__lock:
+            if isinstance(hash_or_height, int):
+                if not 0 <= hash_or_height < len(self.blocks):
+                    raise RpcError(UNKNOWN_BLOCK)
+                events = [self.events[item['Hash']] for item in self.blocks[hash_or_height]['Transactions']]
+                return events or None
+            return self.events.get(hash_or_height) if hash_or_height in self.heights else None
+
+    def get_block_height_by_tx_hash(self, tx_hash):
+        with self.__lock:
+            if tx_hash not in self.heights:
+                raise RpcError(UNKNOWN_TRANSACTION)
+            return self.heights[tx_hash]
+
+    def get_storage(self, contract_address, key):
+        if contract_address.lower() not in self.sim.contracts:
+            raise RpcError(UNKNOWN_CONTRACT)
+        value = self.sim.get(contract_address, bytes.fromhex(key))
+        return to_hex(value) if value != 0 else None
+
+    def send_raw_transaction(self, tx_data, pre_exec=0):
+        try:
+            tx = Transaction.deserialize_from(bytes.fromhex(tx_data))
+            contract_address, operation, args = decode_invocation(tx.payload)
+        except Exception as e:
+            raise RpcError(INVALID_TRANSACTION, ''.join(['cannot decode transaction: ', str(e)]))
+        if contract_address not in self.sim.contracts:
+            raise RpcError(UNKNOWN_CONTRACT, contract_address)
+        signers = list()
+        for sig in tx.sigs:
+            if len(sig.public_keys) == 1:
+                signers.append(Address.address_from_bytes_pubkey(sig.public_keys[0]).to_array())
+            else:
+                signers.append(Address.address_from_multi_pub_keys(sig.M, sig.public_keys).to_array())
+        if int(pre_exec) == 1:
+            result = self.sim.invoke(contract_address, operation, args, signers, commit=False)
+            return {'State': result['State'], 'Gas': gas_of(result), 'Result': to_hex(result['Result'])}
+
+        if len(signers) == 0:
+            raise RpcError(INVALID_TRANSACTION, 'transaction is not signed')
+        if tx.gas_limit < MIN_TRANSACTION_GAS:
+            raise RpcError(INVALID_TRANSACTION, 'gas limit is lower than the minimum')
+        tx_hash = tx.hash256_explorer()
+        with self.__lock:
+            if tx_hash in self.events:
+                raise RpcError(INVALID_TRANSACTION, 'transaction already exists')
+            self.events[tx_hash] = None
+        result = self.sim.invoke(contract_address, operation, args, signers,
+                                 commit=lambda item: gas_of(item) <= tx.gas_limit)
+        gas = gas_of(result)
+        state = 1 if result['State'] == 1 and gas <= tx.gas_limit else 0
+        notify = [{'ContractAddress': item['ContractAddress'], 'States': to_hex(item['States'])}
+                  for item in result['Notify']] if state == 1 else list()
+        gas_consumed = min(gas, tx.gas_limit)
+        payer = Address(tx.payer).b58encode()
+        with self.__lock:
+            # a failed transaction pays its fee too; the native notify has plain string and int states
+            balance = self.balances.setdefault(payer, {'ont': 0, 'ong': 0})
+            fee = min(gas_consumed * tx.gas_price, balance.get('ong', 0))
+            balance['ong'] = balance.get('ong', 0) - fee
+            notify.append({'ContractAddress': ONG_ADDRESS, 'States': ['transfer', payer, GOVERNANCE_ADDRESS, fee]})
+            self.events[tx_hash] = {'TxHash': tx_hash, 'State': state, 'GasConsumed': gas_consumed,
+                                    'Notify': notify}
+            self.pending.append({'Hash': tx_hash, 'Version': tx.version, 'Nonce': tx.nonce, 'GasPrice': tx.gas_price,
+                                 'GasLimit': tx.gas_limit, 'Payer': payer,
+                                 'TxType': tx.tx_type, 'Payload': {'Code': bytes(tx.payload).hex()}})
+        if self.block_interval == 0:
+            self.produce_block()
+        return tx_hash
+
+
+class Faults(object):
+    """
+    Latency, jitter and failures added to every request, optionally set per
+    method. Draws come from one seeded generator, so a profile replays the
+    same way for the same sequence of requests.
+    """
+
+    def __init__(self, latency=0, jitter=0, error_rate=0, drop_rate=0, methods=None, seed=None):
+        self.default = {'latency': latency, 'jitter': jitter, 'error_rate': error_rate, 'drop_rate': drop_rate}
+        self.methods = methods or dict()
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def load(path, seed=None):
+        """
+        :param path: JSON file of the constructor arguments, e.g.
+        {"latency": 0.05, "jitter": 0.02, "methods": {"sendrawtransaction": {"latency": 0.3}}}.
+        """
+        with open(path) as f:
+            profile = json.load(f)
+        profile.setdefault('seed', seed)
+        return Faults(**profile)
+
+    def draw(self, method):
+        """
+        :return: (delay in seconds, 'drop', 'error' or None).
+        """
+        settings = dict(self.default, **self.methods.get(method, dict()))
+        with self.__lock:
+            delay = max(0, settings['latency'] + self.__random.uniform(-settings['jitter'], settings['jitter']))
+            draw = self.__random.random()
+        if draw < settings['drop_rate']:
+            return delay, 'drop'
+        if draw < settings['drop_rate'] + settings['error_rate']:
+            return delay, 'error'
+        return delay, None
+
+
+def make_handler(node, faults):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                method, params = request.get('method'), request.get('params') or list()
+            except ValueError:
+                request, method, params = dict(), None, None
+            delay, fault = faults.draw(method)
+            time.sleep(delay)
+            if fault == 'drop':
+                # no response at all, as when the node dies mid-request
+                self.close_connection = True
+                return
+            if fault == 'error':
+                error, result = INTERNAL_ERROR, 'injected error'
+            elif params is None:
+                error, result = INVALID_PARAMS, 'malformed request'
+            else:
+                error, result = node.handle(method, params)
+            body = json.dumps({'desc': ERROR_DESC[error], 'error': error, 'id': request.get('id'),
+                               'jsonrpc': '2.0', 'result': result}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def make_node(spkz_address=DEFAULT_SPKZ_ADDRESS, spuul_address=None, funds=(), block_interval=1.0, balances=None):
+    """
+    Deploys SpokkzCoin, and SpuulTokenization when given an address, and
+    funds accounts from the deployer.
+    :param funds: list of (base58 address, whole tokens).
+    :param balances: ONT and ONG balances, see `MockNode`.
+    """
+    sim = Simulator()
+    sim.deploy(SPOKKZ_COIN, spkz_address)
+    sim.invoke(spkz_address, 'deploy', [], [DEPLOYER])
+    if spuul_address is not None:
+        # the app call in SpuulTokenization names the SPKZ address it was written for
+        sim.deploy(SPUUL_TOKENIZATION, spuul_address, {SPOKKZ_COIN_ADDRESS: spkz_address})
+        sim.invoke(spuul_address, 'deploy', [], [DEPLOYER])
+    decimals = sim.invoke(spkz_address, 'decimals')['Result']
+    deployer = Address.b58decode(DEPLOYER).to_array()
+    for b58_address, amount in funds:
+        result = sim.invoke(spkz_address, 'transfer',
+                            [deployer, Address.b58decode(b58_address).to_array(), amount * 10 ** decimals], [DEPLOYER])
+        if result['State'] != 1:
+            raise RuntimeError(''.join(['funding ', b58_address, ' failed: ', result.get('Error', '')]))
+    return MockNode(sim, block_interval, balances)
+
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser()
+    args.add_argument('--host', type=str, default='127.0.0.1')
+    args.add_argument('--port', '-p', type=int, default=20336)
+    args.add_argument('--spkz-address', type=str, default=DEFAULT_SPKZ_ADDRESS, help='SpokkzCoin contract address')
+    args.add_argument('--spuul-address', type=str, help='deploy SpuulTokenization at this contract address')
+    args.add_argument('--fund', type=str, nargs='*', default=[], metavar='ADDRESS=TOKENS',
+                      help='SPKZ to transfer from the deployer on start')
+    args.add_argument('--ont', type=str, nargs='*', default=[], metavar='ADDRESS=ONT', help='ONT balances')
+    args.add_argument('--ong', type=str, nargs='*', default=[], metavar='ADDRESS=ONG',
+                      help='ONG balances, in whole ONG; fees are taken from them')
+    args.add_argument('--block-interval', type=float, default=1.0, help='seconds per block, 0 for a block per tx')
+    args.add_argument('--latency', type=float, default=0, help='seconds added to every response')
+    args.add_argument('--jitter', type=float, default=0, help='uniform +- seconds around --latency')
+    args.add_argument('--error-rate', type=float, default=0, help='share of requests answered with an error')
+    args.add_argument('--drop-rate', type=float, default=0, help='share of requests closed without a response')
+    args.add_argument('--profile', type=str, help='JSON fault profile, overrides the fault options')
+    args.add_argument('--seed', type=int, help='seed for latency and fault draws')
+    args = args.parse_args()
+
+    if args.profile:
+        faults = Faults.load(args.profile, args.seed)
+    else:
+        faults = Faults(args.latency, args.jitter, args.error_rate, args.drop_rate, seed=args.seed)
+    funds = [(item.split('=')[0], int(item.split('=')[1])) for item in args.fund]
+    balances = dict()
+    for asset, items, unit in (('ont', args.ont, 1), ('ong', args.ong, 10 ** ONG_DECIMALS)):
+        for item in items:
+            b58_address, amount = item.split('=')
+            Address.b58decode(b58_address)
+            balances.setdefault(b58_address, {'ont': 0, 'ong': 0})[asset] = int(decimal.Decimal(amount) * unit)
+    node = make_node(args.spkz_address, args.spuul_address, funds, args.block_interval, balances)
+    node.start()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(node, faults))
+    print('mock node listening on http://{}:{}'.format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.stop()
+        server.server_close()
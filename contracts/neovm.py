@@ -0,0 +1,716 @@
+import argparse
+import collections
+import hashlib
+import json
+
+from ontology.common.address import Address
+from ontology.smart_contract.neo_contract.abi.build_params import BuildParams
+
+from simulator import DEPLOYER
+
+OPCODES = {
+    0x00: 'PUSH0', 0x4c: 'PUSHDATA1', 0x4d: 'PUSHDATA2', 0x4e: 'PUSHDATA4', 0x4f: 'PUSHM1',
+    0x61: 'NOP', 0x62: 'JMP', 0x63: 'JMPIF', 0x64: 'JMPIFNOT', 0x65: 'CALL', 0x66: 'RET', 0x67: 'APPCALL',
+    0x68: 'SYSCALL', 0x69: 'TAILCALL',
+    0x6a: 'DUPFROMALTSTACK', 0x6b: 'TOALTSTACK', 0x6c: 'FROMALTSTACK', 0x6d: 'XDROP', 0x72: 'XSWAP', 0x73: 'XTUCK',
+    0x74: 'DEPTH', 0x75: 'DROP', 0x76: 'DUP', 0x77: 'NIP', 0x78: 'OVER', 0x79: 'PICK', 0x7a: 'ROLL', 0x7b: 'ROT',
+    0x7c: 'SWAP', 0x7d: 'TUCK',
+    0x7e: 'CAT', 0x7f: 'SUBSTR', 0x80: 'LEFT', 0x81: 'RIGHT', 0x82: 'SIZE',
+    0x83: 'INVERT', 0x84: 'AND', 0x85: 'OR', 0x86: 'XOR', 0x87: 'EQUAL',
+    0x8b: 'INC', 0x8c: 'DEC', 0x8d: 'SIGN', 0x8f: 'NEGATE', 0x90: 'ABS', 0x91: 'NOT', 0x92: 'NZ',
+    0x93: 'ADD', 0x94: 'SUB', 0x95: 'MUL', 0x96: 'DIV', 0x97: 'MOD', 0x98: 'SHL', 0x99: 'SHR',
+    0x9a: 'BOOLAND', 0x9b: 'BOOLOR', 0x9c: 'NUMEQUAL', 0x9e: 'NUMNOTEQUAL', 0x9f: 'LT', 0xa0: 'GT', 0xa1: 'LTE',
+    0xa2: 'GTE', 0xa3: 'MIN', 0xa4: 'MAX', 0xa5: 'WITHIN',
+    0xa7: 'SHA1', 0xa8: 'SHA256', 0xa9: 'HASH160', 0xaa: 'HASH256',
+    0xc0: 'ARRAYSIZE', 0xc1: 'PACK', 0xc2: 'UNPACK', 0xc3: 'PICKITEM', 0xc4: 'SETITEM', 0xc5: 'NEWARRAY',
+    0xc6: 'NEWSTRUCT', 0xc7: 'NEWMAP', 0xc8: 'APPEND', 0xc9: 'REVERSE', 0xca: 'REMOVE', 0xcb: 'HASKEY',
+    0xcc: 'KEYS', 0xcd: 'VALUES',
+    0xf0: 'THROW', 0xf1: 'THROWIFNOT',
+}
+OPCODES.update({code: ''.join(['PUSHBYTES', str(code)]) for code in range(0x01, 0x4c)})
+OPCODES.update({code: ''.join(['PUSH', str(code - 0x50)]) for code in range(0x51, 0x61)})
+
+# Ontology's gas prices: every opcode and unlisted syscall costs OPCODE_GAS
+OPCODE_GAS = 1
+GAS_TABLE = {
+    'APPCALL': 10,
+    'TAILCALL': 10,
+    'SHA1': 10,
+    'SHA256': 10,
+    'HASH160': 20,
+    'HASH256': 20,
+    'System.Storage.Get': 200,
+    'System.Storage.Put': 4000,
+    'System.Storage.Delete': 100,
+    'System.Runtime.CheckWitness': 200,
+    'System.Blockchain.GetHeader': 100,
+    'System.Blockchain.GetBlock': 200,
+    'System.Blockchain.GetTransaction': 100,
+    'System.Blockchain.GetContract': 100,
+    'Ontology.Runtime.AddressToBase58': 40,
+    'Ontology.Runtime.Base58ToAddress': 30,
+}
+# Storage.Put is charged per started unit of key plus value bytes
+PER_UNIT_CODE_LEN = 1024
+# and a transaction per whole unit of invocation script bytes
+UINT_INVOKE_CODE_LEN = 20000
+MIN_TRANSACTION_GAS = 20000
+VM_STEP_LIMIT = 400000
+
+
+class VmFault(Exception):
+    """
+    The execution faulted, e.g. on `THROW`, an invalid opcode or out of gas.
+    """
+
+
+class Struct(list):
+    """
+    A struct stack item: an array copied by value when stored.
+    """
+
+    def clone(self):
+        return Struct(item.clone() if isinstance(item, Struct) else item for item in self)
+
+
+class StorageContext(object):
+    __slots__ = ('script_hash', 'read_only')
+
+    def __init__(self, script_hash, read_only=False):
+        self.script_hash = script_hash
+        self.read_only = read_only
+
+
+class MemoryStorage(object):
+    """
+    Dict storage backend. Any object with the same `get`, `put` and `delete`
+    can back an `Engine`, e.g. to read state from a node.
+    """
+
+    def __init__(self):
+        self.items = dict()
+
+    def get(self, script_hash, key):
+        return self.items.get((script_hash, key))
+
+    def put(self, script_hash, key, value):
+        self.items[(script_hash, key)] = value
+
+    def delete(self, script_hash, key):
+        self.items.pop((script_hash, key), None)
+
+
+def script_hash_of(code):
+    """
+    :return: the script hash of a contract's code; its contract address is the reversed hex.
+    """
+    return hashlib.new('ripemd160', hashlib.sha256(code).digest()).digest()
+
+
+def int_to_bytes(value):
+    if value == 0:
+        return b''
+    return value.to_bytes((value + (value < 0)).bit_length() // 8 + 1, 'little', signed=True)
+
+
+def as_bytes(item):
+    if isinstance(item, bytes):
+        return item
+    if isinstance(item, bool):
+        return b'\x01' if item else b'\x00'
+    if isinstance(item, int):
+        return int_to_bytes(item)
+    raise VmFault(''.join(['not a byte array: ', type(item).__name__]))
+
+
+def as_int(item):
+    if isinstance(item, bool):
+        return int(item)
+    if isinstance(item, int):
+        return item
+    if isinstance(item, bytes):
+        return int.from_bytes(item, 'little', signed=True)
+    raise VmFault(''.join(['not an integer: ', type(item).__name__]))
+
+
+def as_bool(item):
+    if isinstance(item, bytes):
+        return any(item)
+    if isinstance(item, (bool, int)):
+        return item != 0
+    return True
+
+
+def to_python(item):
+    """
+    Converts a stack item to a JSON friendly value: byte arrays as hex, like the node does.
+    """
+    if isinstance(item, list):
+        return [to_python(value) for value in item]
+    if isinstance(item, dict):
+        return {key.hex(): to_python(value) for key, value in item.items()}
+    if isinstance(item, bool):
+        return '01' if item else '00'
+    if isinstance(item, (bytes, int)):
+        return as_bytes(item).hex()
+    return repr(item)
+
+
+def disassemble(code):
+    """
+    :return: list of (offset, opcode name, operand bytes).
+    """
+    instructions = list()
+    position = 0
+    while position < len(code):
+        opcode = code[position]
+        offset, operand_length, operand_start = position, 0, position + 1
+        if 0x01 <= opcode <= 0x4b:
+            operand_length = opcode
+        elif opcode in (0x4c, 0x4d, 0x4e):
+            size = {0x4c: 1, 0x4d: 2, 0x4e: 4}[opcode]
+            operand_length = int.from_bytes(code[operand_start:operand_start + size], 'little')
+            operand_start += size
+        elif opcode in (0x62, 0x63, 0x64, 0x65):
+            operand_length = 2
+        elif opcode in (0x67, 0x69):
+            operand_length = 20
+        elif opcode == 0x68:
+            operand_length = code[operand_start]
+            operand_start += 1
+        position = operand_start + operand_length
+        instructions.append((offset, OPCODES.get(opcode, '{:#04x}'.format(opcode)),
+                             bytes(code[operand_start:position])))
+    return instructions
+
+
+def decode_args(value):
+    """
+    Converts JSON arguments to invocation arguments: strings starting with 0x become byte arrays.
+    """
+    if isinstance(value, list):
+        return [decode_args(item) for item in value]
+    if isinstance(value, str) and value.startswith('0x'):
+        return bytes.fromhex(value[2:])
+    return value
+
+
+def build_invocation(script_hash, operation, args):
+    """
+    Builds the invocation script the SDK sends for `Main(operation, args)`.
+    """
+    code = BuildParams.create_code_params_script([operation.encode(), args])
+    code.append(0x67)
+    code += script_hash
+    return bytes(code)
+
+
+def transaction_gas(vm_gas, code_length):
+    """
+    :return: the gas a transaction is charged for an invocation, as the node computes it.
+    """
+    return max(MIN_TRANSACTION_GAS, vm_gas) + code_length // PER_UNIT_CODE_LEN * UINT_INVOKE_CODE_LEN
+
+
+class Context(object):
+    __slots__ = ('code', 'script_hash', 'ip')
+
+    def __init__(self, code, script_hash, ip=0):
+        self.code = code
+        self.script_hash = script_hash
+        self.ip = ip
+
+
+class Engine(object):
+    """
+    Executes compiled `.avm` contracts, i.e. the NeoVM opcodes and the
+    Ontology syscalls boa emits, and meters gas with Ontology's price table.
+    Writes go to an overlay that reaches the storage backend only when the
+    invocation halts, so a fault leaves the backend untouched.
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage if storage is not None else MemoryStorage()
+        self.contracts = dict()
+        self.syscalls = {
+            'System.Storage.GetContext': self.__get_context,
+            'System.Storage.GetReadOnlyContext': self.__get_read_only_context,
+            'System.Storage.Get': self.__storage_get,
+            'System.Storage.Put': self.__storage_put,
+            'System.Storage.Delete': self.__storage_delete,
+            'System.Runtime.CheckWitness': self.__check_witness,
+            'System.Runtime.Notify': self.__notify,
+            'System.Runtime.Log': self.__log,
+            'System.Runtime.GetTrigger': lambda: self.__push(0x10),
+            'System.Runtime.GetTime': lambda: self.__push(self.time),
+            'System.ExecutionEngine.GetScriptContainer': lambda: self.__push(b''),
+            'System.ExecutionEngine.GetExecutingScriptHash': lambda: self.__push(self.__contexts[-1].script_hash),
+            'System.ExecutionEngine.GetCallingScriptHash': lambda: self.__push(self.__calling_script_hash() or b''),
+            'System.ExecutionEngine.GetEntryScriptHash': lambda: self.__push(self.__contexts[0].script_hash),
+        }
+        self.time = 0
+        self.__reset()
+
+    def __reset(self):
+        self.__stack = list()
+        self.__alt_stack = list()
+        self.__contexts = list()
+        self.__witnesses = frozenset()
+        self.__writes = dict()
+        self.__notifications = list()
+        self.__logs = list()
+
+    def deploy(self, code):
+        """
+        :param code: the `.avm` bytes.
+        :return: the contract address.
+        """
+        code = bytes(code)
+        script_hash = script_hash_of(code)
+        self.contracts[script_hash] = code
+        return script_hash[::-1].hex()
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            return self.deploy(f.read())
+
+    def invoke(self, contract_address, operation, args=None, signers=(), gas_limit=None, on_step=None):
+        """
+        Runs `Main(operation, args)` of a deployed contract from an invocation
+        script, like a transaction does.
+        :param signers: base58 addresses or script hashes `CheckWitness` accepts.
+        :param gas_limit: fault once the VM gas exceeds it.
+        :param on_step: function of (script hash, offset, opcode name, gas) called per instruction.
+        :return: dict with `State`, `Gas` (what the transaction is charged), `VmGas`, `Steps`,
+        `Result`, `Notify` and, on failure, `Error`.
+        """
+        script_hash = bytes.fromhex(contract_address)[::-1]
+        if script_hash not in self.contracts:
+            raise KeyError(''.join(['no contract deployed at ', contract_address]))
+        code = build_invocation(script_hash, operation, list() if args is None else args)
+        self.__reset()
+        self.__witnesses = frozenset(Address.b58decode(signer).to_array() if isinstance(signer, str)
+                                     else bytes(signer) for signer in signers)
+        self.__contexts.append(Context(code, script_hash_of(code)))
+        gas = steps = 0
+        try:
+            while self.__contexts:
+                context = self.__contexts[-1]
+                offset = context.ip
+                try:
+                    opcode, name, price = self.__step(context)
+                except VmFault:
+                    raise
+                except Exception as e:
+                    # e.g. a stack underflow or a stack item of the wrong kind: the node's VM faults on these too
+                    raise VmFault('{!r} at {}'.format(e, offset)) from e
+                gas += price
+                steps += 1
+                if on_step is not None:
+                    on_step(context.script_hash, offset, name, price)
+                if gas_limit is not None and gas > gas_limit:
+                    raise VmFault('out of gas')
+                if steps > VM_STEP_LIMIT:
+                    raise VmFault('step limit exceeded')
+        except VmFault as e:
+            return {'State': 0, 'Gas': transaction_gas(gas, len(code)), 'VmGas': gas, 'Steps': steps,
+                    'Result': None, 'Notify': list(), 'Error': str(e)}
+        for (write_hash, key), value in self.__writes.items():
+            if value is None:
+                self.storage.delete(write_hash, key)
+            else:
+                self.storage.put(write_hash, key, value)
+        result = to_python(self.__stack[-1]) if self.__stack else None
+        return {'State': 1, 'Gas': transaction_gas(gas, len(code)), 'VmGas': gas, 'Steps': steps, 'Result': result,
+                'Notify': self.__notifications}
+
+    ############################################################################
+    # execution
+
+    def __push(self, item):
+        self.__stack.append(item)
+
+    def __pop(self):
+        return self.__stack.pop()
+
+    def __calling_script_hash(self):
+        current = self.__contexts[-1].script_hash
+        for context in reversed(self.__contexts):
+            if context.script_hash != current:
+                return context.script_hash
+        return None
+
+    def __step(self, context):
+        """
+        Executes one instruction.
+        :return: (opcode, name, gas price).
+        """
+        code = context.code
+        if context.ip >= len(code):
+            # running off the end of a script returns
+            self.__contexts.pop()
+            return 0x66, 'RET', OPCODE_GAS
+        offset = context.ip
+        opcode = code[offset]
+        context.ip += 1
+        name = OPCODES.get(opcode)
+        if name is None:
+            raise VmFault('invalid opcode {:#04x} at {}'.format(opcode, offset))
+        price = GAS_TABLE.get(name, OPCODE_GAS)
+        stack = self.__stack
+        if opcode == 0x00:
+            stack.append(b'')
+        elif opcode <= 0x4e:
+            if opcode <= 0x4b:
+                length = opcode
+            else:
+                size = {0x4c: 1, 0x4d: 2, 0x4e: 4}[opcode]
+                length = int.from_bytes(code[context.ip:context.ip + size], 'little')
+                context.ip += size
+            stack.append(code[context.ip:context.ip + length])
+            context.ip += length
+        elif opcode == 0x4f:
+            stack.append(-1)
+        elif 0x51 <= opcode <= 0x60:
+            stack.append(opcode - 0x50)
+        elif opcode == 0x61:
+            pass
+        elif 0x62 <= opcode <= 0x65:
+            target = offset + int.from_bytes(code[context.ip:context.ip + 2], 'little', signed=True)
+            context.ip += 2
+            if target < 0 or target > len(code):
+                raise VmFault('jump out of script at {}'.format(offset))
+            if opcode == 0x62:
+                context.ip = target
+            elif opcode == 0x63:
+                if as_bool(stack.pop()):
+                    context.ip = target
+            elif opcode == 0x64:
+                if not as_bool(stack.pop()):
+                    context.ip = target
+            else:
+                self.__contexts.append(Context(code, context.script_hash, target))
+        elif opcode == 0x66:
+            self.__contexts.pop()
+        elif opcode in (0x67, 0x69):
+            script_hash = bytes(code[context.ip:context.ip + 20])
+            context.ip += 20
+            if not any(script_hash):
+                script_hash = as_bytes(stack.pop())
+            callee = self.contracts.get(script_hash)
+            if callee is None:
+                raise VmFault(''.join(['no contract deployed at ', script_hash[::-1].hex()]))
+            if opcode == 0x69:
+                self.__contexts.pop()
+            self.__contexts.append(Context(callee, script_hash))
+        elif opcode == 0x68:
+            length = code[context.ip]
+            name = bytes(code[context.ip + 1:context.ip + 1 + length]).decode('ascii')
+            context.ip += 1 + length
+            syscall = self.syscalls.get(name)
+            if syscall is None:
+                raise VmFault(''.join(['unsupported syscall ', name]))
+            price = self.__put_price() if name == 'System.Storage.Put' else GAS_TABLE.get(name, OPCODE_GAS)
+            syscall()
+        else:
+            self.__execute(opcode, stack)
+        return opcode, name, price
+
+    def __put_price(self):
+        key, value = as_bytes(self.__stack[-2]), as_bytes(self.__stack[-3])
+        return ((len(key) + len(value) - 1) // PER_UNIT_CODE_LEN + 1) * GAS_TABLE['System.Storage.Put']
+
+    def __execute(self, opcode, stack):
+        """
+        Stack, splice, arithmetic, crypto and collection opcodes.
+        """
+        if opcode == 0x6a:
+            stack.append(self.__alt_stack[-1])
+        elif opcode == 0x6b:
+            self.__alt_stack.append(stack.pop())
+        elif opcode == 0x6c:
+            stack.append(self.__alt_stack.pop())
+        elif opcode == 0x6d:
+            n = as_int(stack.pop())
+            del stack[-1 - n]
+        elif opcode == 0x72:
+            n = as_int(stack.pop())
+            stack[-1], stack[-1 - n] = stack[-1 - n], stack[-1]
+        elif opcode == 0x73:
+            n = as_int(stack.pop())
+            stack.insert(len(stack) - n, stack[-1])
+        elif opcode == 0x74:
+            stack.append(len(stack))
+        elif opcode == 0x75:
+            stack.pop()
+        elif opcode == 0x76:
+            stack.append(stack[-1])
+        elif opcode == 0x77:
+            del stack[-2]
+        elif opcode == 0x78:
+            stack.append(stack[-2])
+        elif opcode == 0x79:
+            n = as_int(stack.pop())
+            stack.append(stack[-1 - n])
+        elif opcode == 0x7a:
+            n = as_int(stack.pop())
+            if n > 0:
+                stack.append(stack.pop(-1 - n))
+        elif opcode == 0x7b:
+            stack.append(stack.pop(-3))
+        elif opcode == 0x7c:
+            stack[-1], stack[-2] = stack[-2], stack[-1]
+        elif opcode == 0x7d:
+            stack.insert(-2, stack[-1])
+        elif opcode == 0x7e:
+            second = as_bytes(stack.pop())
+            stack.append(as_bytes(stack.pop()) + second)
+        elif opcode == 0x7f:
+            count, index = as_int(stack.pop()), as_int(stack.pop())
+            stack.append(as_bytes(stack.pop())[index:index + count])
+        elif opcode == 0x80:
+            count = as_int(stack.pop())
+            stack.append(as_bytes(stack.pop())[:count])
+        elif opcode == 0x81:
+            count = as_int(stack.pop())
+            value = as_bytes(stack.pop())
+            if count > len(value):
+                raise VmFault('RIGHT past the start of the array')
+            stack.append(value[len(value) - count:])
+        elif opcode == 0x82:
+            stack.append(len(as_bytes(stack.pop())))
+        elif opcode == 0x83:
+            stack.append(~as_int(stack.pop()))
+        elif opcode == 0x87:
+            second, first = stack.pop(), stack.pop()
+            if isinstance(first, (list, dict, StorageContext)) or isinstance(second, (list, dict, StorageContext)):
+                stack.append(first is second)
+            else:
+                stack.append(as_bytes(first) == as_bytes(second))
+        elif opcode in (0x8b, 0x8c, 0x8d, 0x8f, 0x90, 0x92):
+            value = as_int(stack.pop())
+            stack.append({0x8b: lambda: value + 1, 0x8c: lambda: value - 1,
+                          0x8d: lambda: (value > 0) - (value < 0), 0x8f: lambda: -value,
+                          0x90: lambda: abs(value), 0x92: lambda: value != 0}[opcode]())
+        elif opcode == 0x91:
+            stack.append(not as_bool(stack.pop()))
+        elif opcode in (0x84, 0x85, 0x86, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99,
+                        0x9c, 0x9e, 0x9f, 0xa0, 0xa1, 0xa2, 0xa3, 0xa4):
+            second, first = as_int(stack.pop()), as_int(stack.pop())
+            stack.append(self.__binary(opcode, first, second))
+        elif opcode in (0x9a, 0x9b):
+            second, first = as_bool(stack.pop()), as_bool(stack.pop())
+            stack.append(first and second if opcode == 0x9a else first or second)
+        elif opcode == 0xa5:
+            upper, lower, value = as_int(stack.pop()), as_int(stack.pop()), as_int(stack.pop())
+            stack.append(lower <= value < upper)
+        elif opcode == 0xa7:
+            stack.append(hashlib.sha1(as_bytes(stack.pop())).digest())
+        elif opcode == 0xa8:
+            stack.append(hashlib.sha256(as_bytes(stack.pop())).digest())
+        elif opcode == 0xa9:
+            stack.append(script_hash_of(as_bytes(stack.pop())))
+        elif opcode == 0xaa:
+            stack.append(hashlib.sha256(hashlib.sha256(as_bytes(stack.pop())).digest()).digest())
+        elif opcode == 0xc0:
+            item = stack.pop()
+            stack.append(len(item) if isinstance(item, (list, dict)) else len(as_bytes(item)))
+        elif opcode == 0xc1:
+            count = as_int(stack.pop())
+            stack.append([stack.pop() for _ in range(count)])
+        elif opcode == 0xc2:
+            items = stack.pop()
+            stack.extend(reversed(items))
+            stack.append(len(items))
+        elif opcode == 0xc3:
+            key, collection = stack.pop(), stack.pop()
+            if isinstance(collection, dict):
+                stack.append(collection[as_bytes(key)])
+            elif isinstance(collection, list):
+                stack.append(collection[self.__index(collection, key)])
+            else:
+                value = as_bytes(collection)
+                stack.append(value[self.__index(value, key)])
+        elif opcode == 0xc4:
+            value, key, collection = stack.pop(), stack.pop(), stack.pop()
+            if isinstance(value, Struct):
+                value = value.clone()
+            if isinstance(collection, dict):
+                collection[as_bytes(key)] = value
+            else:
+                collection[self.__index(collection, key)] = value
+        elif opcode in (0xc5, 0xc6):
+            item = stack.pop()
+            kind = Struct if opcode == 0xc6 else list
+            stack.append(kind(item) if isinstance(item, list) else kind([False] * as_int(item)))
+        elif opcode == 0xc7:
+            stack.append(dict())
+        elif opcode == 0xc8:
+            value, collection = stack.pop(), stack.pop()
+            collection.append(value.clone() if isinstance(value, Struct) else value)
+        elif opcode == 0xc9:
+            stack.pop().reverse()
+        elif opcode == 0xca:
+            key, collection = stack.pop(), stack.pop()
+            if isinstance(collection, dict):
+                collection.pop(as_bytes(key), None)
+            else:
+                del collection[self.__index(collection, key)]
+        elif opcode == 0xcb:
+            key, collection = stack.pop(), stack.pop()
+            if isinstance(collection, dict):
+                stack.append(as_bytes(key) in collection)
+            else:
+                stack.append(0 <= as_int(key) < len(collection))
+        elif opcode == 0xcc:
+            stack.append(list(stack.pop().keys()))
+        elif opcode == 0xcd:
+            collection = stack.pop()
+            stack.append(list(collection.values()) if isinstance(collection, dict) else list(collection))
+        elif opcode == 0xf0:
+            raise VmFault('THROW')
+        elif opcode == 0xf1:
+            if not as_bool(stack.pop()):
+                raise VmFault('THROWIFNOT')
+
+    @staticmethod
+    def __index(collection, key):
+        index = as_int(key)
+        if not 0 <= index < len(collection):
+            raise VmFault('index {} out of range'.format(index))
+        return index
+
+    @staticmethod
+    def __binary(opcode, first, second):
+        if opcode == 0x96 or opcode == 0x97:
+            if second == 0:
+                raise VmFault('division by zero')
+            # BigInteger division truncates and the remainder takes the dividend's sign
+            quotient = abs(first) // abs(second) * (1 if (first < 0) == (second < 0) else -1)
+            return quotient if opcode == 0x96 else first - quotient * second
+        return {
+            0x84: lambda: first & second, 0x85: lambda: first | second, 0x86: lambda: first ^ second,
+            0x93: lambda: first + second, 0x94: lambda: first - second, 0x95: lambda: first * second,
+            0x98: lambda: first << second, 0x99: lambda: first >> second,
+            0x9c: lambda: first == second, 0x9e: lambda: first != second, 0x9f: lambda: first < second,
+            0xa0: lambda: first > second, 0xa1: lambda: first <= second, 0xa2: lambda: first >= second,
+            0xa3: lambda: min(first, second), 0xa4: lambda: max(first, second),
+        }[opcode]()
+
+    ############################################################################
+    # syscalls
+
+    def __storage_context(self, write=False):
+        context = self.__pop()
+        if not isinstance(context, StorageContext):
+            raise VmFault('not a storage context')
+        if context.script_hash != self.__contexts[-1].script_hash:
+            raise VmFault('storage context of another contract')
+        if write and context.read_only:
+            raise VmFault('read only storage context')
+        return context.script_hash
+
+    def __get_context(self):
+        self.__push(StorageContext(self.__contexts[-1].script_hash))
+
+    def __get_read_only_context(self):
+        self.__push(StorageContext(self.__contexts[-1].script_hash, True))
+
+    def __storage_get(self):
+        script_hash = self.__storage_context()
+        key = (script_hash, as_bytes(self.__pop()))
+        value = self.__writes[key] if key in self.__writes else self.storage.get(*key)
+        self.__push(value if value is not None else b'')
+
+    def __storage_put(self):
+        script_hash = self.__storage_context(write=True)
+        key = as_bytes(self.__pop())
+        self.__writes[(script_hash, key)] = as_bytes(self.__pop())
+
+    def __storage_delete(self):
+        script_hash = self.__storage_context(write=True)
+        self.__writes[(script_hash, as_bytes(self.__pop()))] = None
+
+    def __check_witness(self):
+        witness = as_bytes(self.__pop())
+        if len(witness) == 33:
+            witness = Address.address_from_bytes_pubkey(witness).to_array()
+        self.__push(witness in self.__witnesses or witness == self.__calling_script_hash())
+
+    def __notify(self):
+        self.__notifications.append({'ContractAddress': self.__contexts[-1].script_hash[::-1].hex(),
+                                     'States': to_python(self.__pop())})
+
+    def __log(self):
+        self.__logs.append(as_bytes(self.__pop()))
+
+
+def gas_report(spokkz_coin, spuul_tokenization=None, batches=(1, 4, 16, 64), on_step=None):
+    """
+    Deploys the built contracts and measures the gas of their state changing operations.
+    :param spokkz_coin: path of SpokkzCoin.avm.
+    :param spuul_tokenization: path of SpuulTokenization.avm, which calls SpokkzCoin at its compiled address.
+    :param on_step: step hook of the measured invocations, see `Engine.invoke`.
+    :return: dict of the results by operation.
+    """
+    engine = Engine()
+    spkz = engine.load(spokkz_coin)
+    deployer = Address.b58decode(DEPLOYER).to_array()
+    holders = [(index + 1).to_bytes(20, 'big') for index in range(max(batches))]
+    report = collections.OrderedDict()
+
+    def measure(name, contract_address, operation, args, signers):
+        result = engine.invoke(contract_address, operation, args, signers, on_step=on_step)
+        if result['State'] != 1:
+            raise RuntimeError(''.join([name, ' failed: ', result['Error']]))
+        report[name] = {key: result[key] for key in ('Gas', 'VmGas', 'Steps')}
+
+    measure('SpokkzCoin.deploy', spkz, 'deploy', [], [DEPLOYER])
+    measure('SpokkzCoin.transfer', spkz, 'transfer', [deployer, holders[0], 10 ** 8], [DEPLOYER])
+    for batch in batches:
+        measure(''.join(['SpokkzCoin.transferMulti batch=', str(batch)]), spkz, 'transferMulti',
+                [[deployer, holder, 10 ** 8] for holder in holders[:batch]], [DEPLOYER])
+    measure('SpokkzCoin.approve', spkz, 'approve', [holders[0], holders[1], 10 ** 8], [holders[0]])
+    measure('SpokkzCoin.transferFrom', spkz, 'transferFrom', [holders[1], holders[0], holders[1], 1], [holders[1]])
+    measure('SpokkzCoin.balanceOf', spkz, 'balanceOf', [holders[0]], [])
+    if spuul_tokenization:
+        spuul = engine.load(spuul_tokenization)
+        measure('SpuulTokenization.deploy', spuul, 'deploy', [], [DEPLOYER])
+        engine.invoke(spkz, 'approve', [holders[0], bytes.fromhex(spuul)[::-1], 10 ** 8], [holders[0]])
+        measure('SpuulTokenization.confirmPayment', spuul, 'confirmPayment', [holders[0], 1, 'order-1'], [DEPLOYER])
+        measure('SpuulTokenization.amountPaid', spuul, 'amountPaid', ['order-1'], [])
+    return report
+
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser()
+    args.add_argument('avm', metavar='AVM', type=str, nargs='+',
+                      help='SpokkzCoin.avm and optionally SpuulTokenization.avm, or the contracts for --operation')
+    args.add_argument('--batches', type=int, nargs='+', default=[1, 4, 16, 64],
+                      help='transferMulti batch sizes to report')
+    args.add_argument('--out', '-o', type=str, help='output JSON file for the report')
+    args.add_argument('--operation', '-op', type=str, help='invoke this operation of the first contract instead')
+    args.add_argument('--args', '-a', type=str, default='[]',
+                      help='JSON list of arguments for --operation; strings starting with 0x are hex byte arrays')
+    args.add_argument('--signer', '-s', type=str, nargs='*', default=[], help='base58 signer addresses')
+    args.add_argument('--gas-limit', type=int)
+    args.add_argument('--disassemble', action='store_true', help='print the first contract instead')
+    args = args.parse_args()
+
+    if args.disassemble:
+        with open(args.avm[0], 'rb') as f:
+            for offset, name, operand in disassemble(f.read()):
+                print('{:>6} {:<16} {}'.format(offset, name, operand.hex()))
+    elif args.operation:
+        engine = Engine()
+        addresses = [engine.load(avm_file) for avm_file in args.avm]
+        print(json.dumps(engine.invoke(addresses[0], args.operation, decode_args(json.loads(args.args)), args.signer,
+                                       args.gas_limit), indent=2))
+    else:
+        report = gas_report(args.avm[0], args.avm[1] if len(args.avm) > 1 else None, args.batches)
+        for name, result in report.items():
+            print('{:<45} {:>10} gas {:>10} vm gas {:>8} steps'.format(
+                name, result['Gas'], result['VmGas'], result['Steps']))
+        if args.out:
+            with open(args.out, 'w') as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,374 @@
+import hashlib
+import importlib.util
+import itertools
+import os
+import sys
+import threading
+import types
+
+import base58
+
+CONTRACTS_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+SPOKKZ_COIN = os.path.join(CONTRACTS_ROOT, 'contracts', 'SpokkzCoin.py')
+SPUUL_TOKENIZATION = os.path.join(CONTRACTS_ROOT, 'contracts', 'SpuulTokenization.py')
+
+# the deployer both contracts hard-code, and the SPKZ address SpuulTokenization calls
+DEPLOYER = 'AZgDDvShZpuW3Ved3Ku7dY5TkWJvfdSyih'
+SPOKKZ_COIN_ADDRESS = 'b52b63902ed5d6455cd7929a13613fc1b88a056f'
+
+ADDRESS_VERSION = 0x17
+
+# sys.modules and sys.path are process-wide, so only one contract is loaded at a time
+_load_lock = threading.Lock()
+_module_ids = itertools.count()
+
+_missing = object()
+
+
+class ByteArray(bytes):
+    """
+    A byte array stack item, e.g. an argument decoded from an invocation
+    script. Like in the NeoVM it acts as a little-endian integer in arithmetic,
+    in comparisons with integers and as a condition, and equals the string it
+    encodes, so `operation == 'transfer'` holds.
+    """
+
+    __hash__ = bytes.__hash__
+
+    def __int__(self):
+        return int.from_bytes(self, 'little', signed=True)
+
+    def __index__(self):
+        return int(self)
+
+    def __bool__(self):
+        return any(self)
+
+    def __eq__(self, other):
+        if isinstance(other, str):
+            return bytes(self) == other.encode('utf-8')
+        if isinstance(other, int):
+            return int(self) == other
+        return bytes.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __lt__(self, other):
+        return int(self) < int(other)
+
+    def __le__(self, other):
+        return int(self) <= int(other)
+
+    def __gt__(self, other):
+        return int(self) > int(other)
+
+    def __ge__(self, other):
+        return int(self) >= int(other)
+
+    def __add__(self, other):
+        return int(self) + int(other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return int(self) - int(other)
+
+    def __rsub__(self, other):
+        return int(other) - int(self)
+
+    def __mul__(self, other):
+        return int(self) * int(other)
+
+    __rmul__ = __mul__
+
+
+def to_bytes(value):
+    """
+    Converts a value to the byte array the NeoVM would see, e.g. for storage
+    keys and `concat`.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    if isinstance(value, bool):
+        return b'\x01' if value else b''
+    if isinstance(value, int):
+        if value == 0:
+            return b''
+        length = (value + (value < 0)).bit_length() // 8 + 1
+        return value.to_bytes(length, 'little', signed=True)
+    raise TypeError(''.join(['unsupported stack item: ', repr(value)]))
+
+
+def script_hash(address):
+    """
+    :param address: base58 address, e.g. 'AZgDDvShZpuW3Ved3Ku7dY5TkWJvfdSyih'.
+    :return: its 20 byte script hash, as `ToScriptHash` gives it.
+    """
+    data = base58.b58decode(address)
+    if len(data) != 25 or data[0] != ADDRESS_VERSION:
+        raise ValueError(''.join(['invalid address: ', address]))
+    if hashlib.sha256(hashlib.sha256(data[:21]).digest()).digest()[:4] != data[21:]:
+        raise ValueError(''.join(['invalid address checksum: ', address]))
+    return data[1:21]
+
+
+class StorageContext(object):
+    __slots__ = ('script_hash',)
+
+    def __init__(self, script_hash):
+        self.script_hash = script_hash
+
+
+class Contract(object):
+    """
+    One loaded contract module and the address it is deployed at.
+    """
+
+    def __init__(self, path, contract_address, module):
+        self.path = path
+        self.contract_address = contract_address
+        self.script_hash = bytes.fromhex(contract_address)[::-1]
+        self.module = module
+
+
+class Simulator(object):
+    """
+    Runs the boa contracts as plain Python. Each contract is loaded as its own
+    module with in-memory `boa.interop` implementations bound to this
+    simulator, so `Main(operation, args)` is called directly against a dict
+    storage instead of a node.
+
+    Storage values keep their Python type; a missing key reads as 0, which is
+    how the VM's empty byte array behaves in conditions and arithmetic. Every
+    write of an invocation is journaled and undone when it raises, e.g. on
+    `Revert`, including writes made by the contracts it called. `CheckWitness`
+    holds for the invocation's signers and for the calling contract, as on
+    Ontology, so the Spuul -> SPKZ `transferFrom` works as deployed.
+    """
+
+    def __init__(self):
+        self.contracts = dict()
+        self.storage = dict()
+        self.__frames = list()
+        self.__witnesses = frozenset()
+        self.__notifications = None
+        self.__journal = None
+        self.__reads = 0
+        self.__writes = 0
+        self.__loading = None
+        self.__app_calls = None
+        self.__lock = threading.RLock()
+        self.__interop = self.__make_interop()
+
+    def deploy(self, path, contract_address, app_calls=None):
+        """
+        Loads a contract source file.
+        :param path: e.g. 'contracts/SpokkzCoin.py'.
+        :param contract_address: hex contract address, as the explorer and `RegisterAppCall` write it.
+        :param app_calls: dict of hex address in `RegisterAppCall` -> address of the deployed
+        contract to route it to, when the callee was deployed at another address.
+        :return: the `Contract`.
+        """
+        contract_address = contract_address.lower()
+        with self.__lock:
+            if contract_address in self.contracts:
+                raise ValueError(''.join(['contract already deployed at ', contract_address]))
+            self.__app_calls = {key.lower(): value.lower() for key, value in (app_calls or dict()).items()}
+            self.__loading = bytes.fromhex(contract_address)[::-1]
+            try:
+                module = self.__load(path)
+            finally:
+                self.__loading = None
+                self.__app_calls = None
+            contract = Contract(path, contract_address, module)
+            self.contracts[contract_address] = contract
+            self.storage.setdefault(contract.script_hash, dict())
+            return contract
+
+    def __load(self, path):
+        with _load_lock:
+            shadowed = {name: module for name, module in sys.modules.items()
+                        if name.split('.')[0] in ('boa', 'libs')}
+            for name in shadowed:
+                del sys.modules[name]
+            sys.modules.update(self.__interop)
+            sys.path.insert(0, CONTRACTS_ROOT)
+            try:
+                name = ''.join(['simulated_', os.path.splitext(os.path.basename(path))[0], '_',
+                                str(next(_module_ids))])
+                spec = importlib.util.spec_from_file_location(name, path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                return module
+            finally:
+                sys.path.remove(CONTRACTS_ROOT)
+                for name in [name for name in sys.modules if name.split('.')[0] in ('boa', 'libs')]:
+                    del sys.modules[name]
+                sys.modules.update(shadowed)
+
+    def invoke(self, contract_address, operation, args=None, signers=(), commit=True):
+        """
+        Calls `Main(operation, args)` of a deployed contract as one transaction.
+        :param signers: base58 addresses or script hashes `CheckWitness` accepts.
+        :param commit: False for a dry run, or a function of the result telling whether to
+        keep its writes, e.g. a gas limit check.
+        :return: dict with `State` (1 or 0), `Result`, `Notify`, the number of storage `Reads`
+        and `Writes` and, on failure, `Error`; a failed invocation leaves the storage as it was.
+        """
+        contract = self.contracts[contract_address.lower()]
+        with self.__lock:
+            self.__witnesses = frozenset(script_hash(signer) if isinstance(signer, str) else bytes(signer)
+                                         for signer in signers)
+            self.__notifications = list()
+            self.__journal = list()
+            self.__reads = self.__writes = 0
+            try:
+                result = self.__call(contract, operation, list() if args is None else args)
+            except Exception as e:
+                self.__undo(self.__journal)
+                return {'State': 0, 'Result': None, 'Notify': list(), 'Reads': self.__reads, 'Writes': self.__writes,
+                        'Error': repr(e)}
+            else:
+                result = {'State': 1, 'Result': result, 'Notify': self.__notifications, 'Reads': self.__reads,
+                          'Writes': self.__writes}
+                if not (commit(result) if callable(commit) else commit):
+                    self.__undo(self.__journal)
+                return result
+            finally:
+                del self.__frames[:]
+                self.__witnesses = frozenset()
+                self.__notifications = None
+                self.__journal = None
+
+    def __call(self, contract, operation, args):
+        self.__frames.append(contract.script_hash)
+        try:
+            return contract.module.Main(operation, args)
+        finally:
+            self.__frames.pop()
+
+    def app_call(self, script_hash, operation, args):
+        contract = self.contracts.get(bytes(script_hash)[::-1].hex())
+        if contract is None:
+            raise LookupError(''.join(['no contract deployed at ', bytes(script_hash)[::-1].hex()]))
+        return self.__call(contract, operation, args)
+
+    def __undo(self, journal):
+        for storage, key, value in reversed(journal):
+            if value is _missing:
+                storage.pop(key, None)
+            else:
+                storage[key] = value
+
+    def snapshot(self):
+        """
+        :return: a copy of all contracts' storage for `restore`, e.g. to reset between tests.
+        """
+        with self.__lock:
+            return {key: dict(storage) for key, storage in self.storage.items()}
+
+    def restore(self, snapshot):
+        with self.__lock:
+            self.storage = {key: dict(storage) for key, storage in snapshot.items()}
+
+    def get(self, contract_address, key):
+        """
+        Reads a storage value of a contract outside of any invocation.
+        """
+        return self.storage[bytes.fromhex(contract_address)[::-1]].get(to_bytes(key), 0)
+
+    ############################################################################
+    # interop
+
+    def __storage(self, context):
+        if not isinstance(context, StorageContext):
+            raise TypeError('not a storage context')
+        if self.__frames and self.__frames[-1] != context.script_hash:
+            raise PermissionError('storage context of another contract')
+        return self.storage.setdefault(context.script_hash, dict())
+
+    def __get_context(self):
+        return StorageContext(self.__loading if self.__loading is not None else self.__frames[-1])
+
+    def __get(self, context, key):
+        self.__reads += 1
+        return self.__storage(context).get(to_bytes(key), 0)
+
+    def __put(self, context, key, value):
+        storage = self.__storage(context)
+        key = to_bytes(key)
+        self.__writes += 1
+        if self.__journal is not None:
+            self.__journal.append((storage, key, storage.get(key, _missing)))
+        storage[key] = value
+
+    def __delete(self, context, key):
+        storage = self.__storage(context)
+        key = to_bytes(key)
+        self.__writes += 1
+        if self.__journal is not None:
+            self.__journal.append((storage, key, storage.get(key, _missing)))
+        storage.pop(key, None)
+
+    def __check_witness(self, witness):
+        witness = to_bytes(witness)
+        return witness in self.__witnesses or (len(self.__frames) > 1 and witness == self.__frames[-2])
+
+    def __notify(self, state):
+        self.__notifications.append({'ContractAddress': self.__frames[-1][::-1].hex(), 'States': state})
+        return True
+
+    def __register_app_call(self, contract_address, *_):
+        contract_address = self.__app_calls.get(contract_address.lower(), contract_address.lower())
+        target = bytes.fromhex(contract_address)[::-1]
+
+        def app_call(operation, args):
+            return self.app_call(target, operation, args)
+
+        return app_call
+
+    def __make_interop(self):
+        """
+        :return: the `boa` modules the contracts import, bound to this simulator.
+        """
+        def module(name, **functions):
+            item = types.ModuleType(name)
+            item.__dict__.update(functions)
+            item.__all__ = list(functions)
+            return item
+
+        return {
+            'boa': module('boa'),
+            'boa.builtins': module(
+                'boa.builtins',
+                concat=lambda a, b: to_bytes(a) + to_bytes(b),
+                take=lambda source, count: source[:count],
+                substr=lambda source, start, count: source[start:start + count],
+                ToScriptHash=script_hash),
+            'boa.interop': module('boa.interop'),
+            'boa.interop.System': module('boa.interop.System'),
+            'boa.interop.System.Runtime': module(
+                'boa.interop.System.Runtime',
+                CheckWitness=self.__check_witness,
+                Notify=self.__notify,
+                Log=lambda message: True),
+            'boa.interop.System.Storage': module(
+                'boa.interop.System.Storage',
+                GetContext=self.__get_context,
+                Get=self.__get,
+                Put=self.__put,
+                Delete=self.__delete),
+            'boa.interop.System.ExecutionEngine': module(
+                'boa.interop.System.ExecutionEngine',
+                GetExecutingScriptHash=lambda: self.__frames[-1],
+                GetCallingScriptHash=lambda: self.__frames[-2] if len(self.__frames) > 1 else None,
+                GetEntryScriptHash=lambda: self.__frames[0]),
+            'boa.interop.System.App': module(
+                'boa.interop.System.App',
+                RegisterAppCall=self.__register_app_call,
+                DynamicAppCall=lambda script_hash, operation, args: self.app_call(script_hash, operation, args)),
+        }
@@ -0,0 +1,65 @@
+import os
+import unittest
+
+from neovm import Engine
+from simulator import DEPLOYER, script_hash
+
+# SpokkzCoin as built by ont-boa 0.4.9; rebuild it and update the gas below when the contract changes
+SPOKKZ_COIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'SpokkzCoin.avm')
+
+
+class SpokkzCoinGasTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = Engine()
+        self.spkz = self.engine.load(SPOKKZ_COIN)
+        self.deployer = script_hash(DEPLOYER)
+        self.holders = [(index + 1).to_bytes(20, 'big') for index in range(16)]
+        self.assertEqual(self.engine.invoke(self.spkz, 'deploy', [], [DEPLOYER])['State'], 1)
+
+    def test_transfer_gas(self):
+        result = self.engine.invoke(self.spkz, 'transfer', [self.deployer, self.holders[0], 100], [DEPLOYER])
+        self.assertEqual(result['State'], 1)
+        self.assertEqual(result['VmGas'], 9166)
+        self.assertEqual(result['Gas'], 20000)
+
+    def test_transfer_multi_gas(self):
+        for batch, gas in ((4, 36742), (16, 146530)):
+            result = self.engine.invoke(self.spkz, 'transferMulti',
+                                        [[self.deployer, holder, 1] for holder in self.holders[:batch]], [DEPLOYER])
+            self.assertEqual(result['State'], 1)
+            self.assertEqual(result['VmGas'], gas)
+            self.assertEqual(result['Gas'], gas)
+
+    def test_fault_leaves_storage_untouched(self):
+        before = dict(self.engine.storage.items)
+        # the second entry overdraws an empty account after the first one was written
+        result = self.engine.invoke(self.spkz, 'transferMulti',
+                                    [[self.deployer, self.holders[0], 1], [self.holders[1], self.holders[0], 1]],
+                                    [DEPLOYER, self.holders[1]])
+        self.assertEqual(result['State'], 0)
+        self.assertEqual(self.engine.storage.items, before)
+
+    def test_missing_witness_faults(self):
+        result = self.engine.invoke(self.spkz, 'transfer', [self.deployer, self.holders[0], 100], [])
+        self.assertEqual(result['State'], 0)
+
+
+class EngineFaultTest(unittest.TestCase):
+
+    def test_execution_error_faults(self):
+        engine = Engine()
+        # PUSH0 REVERSE: REVERSE of a byte array
+        result = engine.invoke(engine.deploy(b'\x00\xc9'), 'main')
+        self.assertEqual(result['State'], 0)
+        self.assertIn('reverse', result['Error'])
+
+    def test_invalid_opcode_faults(self):
+        engine = Engine()
+        result = engine.invoke(engine.deploy(b'\xff'), 'main')
+        self.assertEqual(result['State'], 0)
+        self.assertIn('invalid opcode', result['Error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
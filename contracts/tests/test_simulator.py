@@ -0,0 +1,62 @@
+import unittest
+
+from simulator import DEPLOYER, SPOKKZ_COIN, SPOKKZ_COIN_ADDRESS, SPUUL_TOKENIZATION, Simulator, script_hash
+
+SPUUL_ADDRESS = '5b4a0ad8e4b5fc6a1e4ce4d2dfd10bd6f81c3b6a'
+
+
+class SimulatorRollbackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sim = Simulator()
+        self.sim.deploy(SPOKKZ_COIN, SPOKKZ_COIN_ADDRESS)
+        self.sim.deploy(SPUUL_TOKENIZATION, SPUUL_ADDRESS)
+        self.assertEqual(self.sim.invoke(SPOKKZ_COIN_ADDRESS, 'deploy', [], [DEPLOYER])['State'], 1)
+        self.assertEqual(self.sim.invoke(SPUUL_ADDRESS, 'deploy', [], [DEPLOYER])['State'], 1)
+        self.deployer = script_hash(DEPLOYER)
+        self.holders = [(index + 1).to_bytes(20, 'big') for index in range(2)]
+        self.spuul = bytes.fromhex(SPUUL_ADDRESS)[::-1]
+
+    def balance_of(self, address):
+        return self.sim.invoke(SPOKKZ_COIN_ADDRESS, 'balanceOf', [address])['Result']
+
+    def test_failed_invocation_undoes_its_writes(self):
+        before = self.sim.snapshot()
+        # the first entry is written before the second one overdraws an empty account
+        result = self.sim.invoke(SPOKKZ_COIN_ADDRESS, 'transferMulti',
+                                 [[self.deployer, self.holders[0], 1], [self.holders[1], self.holders[0], 1]],
+                                 [DEPLOYER, self.holders[1]])
+        self.assertEqual(result['State'], 0)
+        self.assertIn('Error', result)
+        self.assertEqual(result['Notify'], list())
+        self.assertEqual(self.sim.snapshot(), before)
+        self.assertEqual(self.balance_of(self.holders[0]), 0)
+
+    def test_refused_commit_undoes_the_called_contracts_writes(self):
+        customer = self.holders[0]
+        self.assertEqual(self.sim.invoke(SPOKKZ_COIN_ADDRESS, 'transfer', [self.deployer, customer, 100],
+                                         [DEPLOYER])['State'], 1)
+        self.assertEqual(self.sim.invoke(SPOKKZ_COIN_ADDRESS, 'approve', [customer, self.spuul, 40],
+                                         [customer])['State'], 1)
+        before = self.sim.snapshot()
+        # the payment writes to both contracts; refusing it, as a gas limit check does, undoes both
+        result = self.sim.invoke(SPUUL_ADDRESS, 'confirmPayment', [customer, 40, 'order-1'], [DEPLOYER],
+                                 commit=lambda item: False)
+        self.assertEqual(result['State'], 1)
+        self.assertEqual(self.sim.snapshot(), before)
+
+        result = self.sim.invoke(SPUUL_ADDRESS, 'confirmPayment', [customer, 40, 'order-1'], [DEPLOYER])
+        self.assertEqual(result['State'], 1)
+        self.assertEqual(self.balance_of(customer), 60)
+        self.assertEqual(self.balance_of(self.spuul), 40)
+
+    def test_dry_run_leaves_storage_untouched(self):
+        before = self.sim.snapshot()
+        result = self.sim.invoke(SPOKKZ_COIN_ADDRESS, 'transfer', [self.deployer, self.holders[0], 100], [DEPLOYER],
+                                 commit=False)
+        self.assertEqual(result['State'], 1)
+        self.assertEqual(self.sim.snapshot(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
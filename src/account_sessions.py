@@ -0,0 +1,77 @@
+import collections
+import secrets
+import threading
+import time
+
+
+class AccountSessions(object):
+    """
+    Keeps decrypted accounts in memory behind random session tokens, so the
+    wallet's scrypt key derivation runs once per unlock instead of once per
+    signed transaction. A session ends after `idle_timeout` seconds without
+    use, after `max_lifetime` seconds in total, on an explicit lock, or when
+    more than `max_sessions` accounts are unlocked and it is the least
+    recently used one.
+    """
+
+    def __init__(self, idle_timeout=300, max_lifetime=3600, max_sessions=32):
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.max_sessions = max_sessions
+        self.__sessions = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __expired(self, session, now):
+        _, created_at, last_used_at = session
+        return now - last_used_at > self.idle_timeout or now - created_at > self.max_lifetime
+
+    def unlock(self, account):
+        """
+        :param account: the decrypted `Account`.
+        :return: the session token to sign with.
+        """
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self.__lock:
+            for expired in [t for t, session in self.__sessions.items() if self.__expired(session, now)]:
+                del self.__sessions[expired]
+            self.__sessions[token] = (account, now, now)
+            while len(self.__sessions) > self.max_sessions:
+                self.__sessions.popitem(last=False)
+        return token
+
+    def get(self, token, b58_address):
+        """
+        :return: the unlocked `Account` of `b58_address`, or None if the token
+        is unknown, expired or belongs to another address.
+        """
+        now = time.monotonic()
+        with self.__lock:
+            session = self.__sessions.get(token)
+            if session is None:
+                return None
+            if self.__expired(session, now):
+                del self.__sessions[token]
+                return None
+            account, created_at, _ = session
+            if account.get_address_base58() != b58_address:
+                return None
+            self.__sessions[token] = (account, created_at, now)
+            self.__sessions.move_to_end(token)
+            return account
+
+    def lock(self, token):
+        with self.__lock:
+            return self.__sessions.pop(token, None) is not None
+
+    def lock_address(self, b58_address):
+        with self.__lock:
+            tokens = [token for token, session in self.__sessions.items()
+                      if session[0].get_address_base58() == b58_address]
+            for token in tokens:
+                del self.__sessions[token]
+            return len(tokens)
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__sessions)
@@ -0,0 +1,160 @@
+import collections
+import re
+import threading
+
+from ontology.ont_sdk import OntologySdk
+from ontology.smart_contract.neo_vm import NeoVm
+
+CONTRACT_ADDRESS_PATTERN = re.compile('^[0-9a-fA-F]{40}$')
+
+
+class InvalidTarget(ValueError):
+    """
+    The network or contract address named by a request is unknown or malformed.
+    """
+
+
+class NetworkSdk(object):
+    """
+    The part of `OntologySdk` that `NeoVm` and `Oep4` use, bound to one
+    network's rpc client. `OntologySdk` is a process-wide singleton, so it can
+    only ever talk to one network at a time.
+    """
+
+    sign_transaction = staticmethod(OntologySdk.sign_transaction)
+    add_sign_transaction = staticmethod(OntologySdk.add_sign_transaction)
+
+    def __init__(self, rpc_client):
+        self.rpc = rpc_client
+        self.__neo_vm = NeoVm(self)
+
+    def get_rpc(self):
+        return self.rpc
+
+    def neo_vm(self):
+        return self.__neo_vm
+
+
+class Network(object):
+    """
+    One network's node pool, sdk and transaction queue.
+    """
+
+    def __init__(self, name, rpc_client, tx_queue):
+        self.name = name
+        self.rpc = rpc_client
+        self.sdk = NetworkSdk(rpc_client)
+        self.tx_queue = tx_queue
+
+    def start(self):
+        self.rpc.start()
+        self.tx_queue.start()
+
+    def close(self):
+        self.tx_queue.stop()
+        self.rpc.stop()
+        self.rpc.close()
+
+
+class ContractClient(object):
+    """
+    An `Oep4` bound to one contract on one network.
+    """
+
+    def __init__(self, network, contract_address):
+        self.network = network
+        self.contract_address = contract_address
+        self.oep4 = network.sdk.neo_vm().oep4()
+        self.oep4.set_contract_address(contract_address)
+
+    @property
+    def rpc(self):
+        return self.network.rpc
+
+    @property
+    def key(self):
+        return self.network.name, self.contract_address
+
+
+class ClientRegistry(object):
+    """
+    Builds and keeps one `Network` per network name and one `ContractClient`
+    per (network, contract address), so requests against different networks
+    and contracts share no mutable state. Both are created on first use; the
+    registry starts a network's probes and queue workers once it is itself
+    started, and `close` stops them all.
+    """
+
+    def __init__(self, nodes, make_rpc_client, make_tx_queue, max_contracts=256):
+        """
+        :param nodes: dict of network name -> list of node addresses.
+        :param make_rpc_client: function of the node addresses returning a `NodePool`.
+        :param make_tx_queue: function of the rpc client returning a `TxQueue`.
+        :param max_contracts: least recently used contract clients beyond this are dropped.
+        """
+        self.nodes = nodes
+        self.make_rpc_client = make_rpc_client
+        self.make_tx_queue = make_tx_queue
+        self.max_contracts = max_contracts
+        self.started = False
+        self.__networks = dict()
+        self.__contracts = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def network(self, name):
+        with self.__lock:
+            network = self.__networks.get(name)
+            if network is None:
+                addrs = self.nodes.get(name)
+                if addrs is None:
+                    raise InvalidTarget(''.join(['unsupported network: ', str(name)]))
+                rpc_client = self.make_rpc_client(addrs)
+                network = Network(name, rpc_client, self.make_tx_queue(rpc_client))
+                if self.started:
+                    network.start()
+                self.__networks[name] = network
+            return network
+
+    def contract(self, network_name, contract_address):
+        if not isinstance(contract_address, str) or CONTRACT_ADDRESS_PATTERN.match(contract_address) is None:
+            raise InvalidTarget(''.join(['invalid contract address: ', str(contract_address)]))
+        network = self.network(network_name)
+        key = (network_name, contract_address.lower())
+        with self.__lock:
+            client = self.__contracts.get(key)
+            if client is None:
+                client = ContractClient(network, key[1])
+                self.__contracts[key] = client
+                while len(self.__contracts) > self.max_contracts:
+                    self.__contracts.popitem(last=False)
+            self.__contracts.move_to_end(key)
+            return client
+
+    def networks(self):
+        with self.__lock:
+            return list(self.__networks.values())
+
+    def job(self, job_id):
+        """
+        Looks a queued transaction up on every network, since job ids are
+        unique across them.
+        :return: the job status with its `network`, or None.
+        """
+        for network in self.networks():
+            job = network.tx_queue.status(job_id)
+            if job is not None:
+                return dict(job, network=network.name)
+        return None
+
+    def start(self):
+        with self.__lock:
+            self.started = True
+            for network in self.__networks.values():
+                network.start()
+
+    def close(self):
+        with self.__lock:
+            for network in self.__networks.values():
+                network.close()
+            self.__networks.clear()
+            self.__contracts.clear()
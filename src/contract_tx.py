@@ -0,0 +1,38 @@
+import secrets
+
+from ontology.core.transaction import Transaction
+from ontology.ont_sdk import OntologySdk
+from ontology.smart_contract.neo_contract.abi.build_params import BuildParams
+
+from tracing import span
+
+
+def make_invoke_transaction(contract_address, operation, args, payer, gas_limit, gas_price):
+    """
+    Builds an unsigned `Main(operation, args)` invocation the same way the
+    SDK's `Oep4` does, but with a random nonce so identical invocations built
+    in the same second still get distinct tx hashes.
+    :param contract_address: contract address bytes, as `oep4.get_contract_address(is_hex=False)`.
+    :param operation: contract operation, e.g. `transferMulti`.
+    :param args: list of operation arguments.
+    :param payer: payer address bytes.
+    """
+    params = BuildParams.create_code_params_script([operation.encode(), args])
+    params.append(0x67)
+    params += contract_address
+    return Transaction(0, 0xd1, secrets.randbits(32), gas_price, gas_limit, payer, params, bytearray(), [],
+                       bytearray())
+
+
+def sign_transaction(tx, signers):
+    """
+    Adds one signature per distinct signer address.
+    """
+    signed = set()
+    with span('sign', signers=len(signers)):
+        for signer in signers:
+            b58_address = signer.get_address_base58()
+            if b58_address not in signed:
+                OntologySdk.add_sign_transaction(tx, signer)
+                signed.add(b58_address)
+    return tx
@@ -1,4 +1,50 @@
 DEFAULT_REMOTE_RPC_ADDRESS = 'http://polaris1.ont.io:20336'
+DEFAULT_NETWORK = 'TestNet'
+RPC_NODES = {
+    'MainNet': ['http://dappnode1.ont.io:20336', 'http://dappnode2.ont.io:20336', 'http://dappnode3.ont.io:20336',
+                'http://dappnode4.ont.io:20336'],
+    'TestNet': ['http://polaris1.ont.io:20336', 'http://polaris2.ont.io:20336', 'http://polaris3.ont.io:20336',
+                'http://polaris4.ont.io:20336', 'http://polaris5.ont.io:20336'],
+    'Localhost': ['http://127.0.0.1:20336'],
+}
 DEFAULT_CONTRACT_ADDRESS = 'af85e68414d5d7dd5726cca3a3df4658708b2c8a'
+MAX_CONTRACT_CLIENTS = 256
 GAS_LIMIT = 20600000
 GAS_PRICE = 500
+GAS_MARGIN = 1.2
+MIN_GAS_LIMIT = 20000
+GAS_ESTIMATE_TTL = 600
+RPC_MAX_IN_FLIGHT = 16
+RPC_TIMEOUT = 10
+RPC_EWMA_ALPHA = 0.3
+RPC_MAX_LAG = 2
+RPC_EJECT_AFTER = 3
+RPC_EJECT_FOR = 30
+RPC_PROBE_INTERVAL = 5
+METADATA_CACHE_TTL = 30
+BULK_BALANCE_CONCURRENCY = 8
+EVENT_INDEXER_ENABLED = False
+EVENT_INDEX_DB = 'events.db'
+EVENT_INDEX_CONTRACTS = [DEFAULT_CONTRACT_ADDRESS]
+EVENT_INDEX_START_HEIGHT = 0
+SESSION_IDLE_TIMEOUT = 300
+SESSION_MAX_LIFETIME = 3600
+SESSION_MAX_ACCOUNTS = 32
+SIGNER_POOL_PROCESSES = None
+PAYOUT_DIR = 'payouts'
+PAYOUT_GAS_PER_TRANSFER = 40000
+PAYOUT_MAX_TX_BYTES = 65536
+PAYOUT_MAX_BATCH = 1024
+PAYOUT_CONCURRENCY = 4
+PAYOUT_MAX_ATTEMPTS = 5
+TX_QUEUE_WORKERS = 4
+TX_MAX_ATTEMPTS = 5
+TX_RETRY_BACKOFF = 1
+TX_CONFIRM_POLL_INTERVAL = 3
+TX_CONFIRM_TIMEOUT = 300
+BULK_EVENT_CONCURRENCY = 8
+BULK_EVENT_MAX_HASHES = 1000
+TRACE_LOG = 'trace.log'
+TRACE_SAMPLE_RATE = 0.01
+TRACE_SLOW_THRESHOLD = 1.0
+TRACE_MAX_QUEUE = 10000
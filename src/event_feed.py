@@ -0,0 +1,141 @@
+import logging
+import queue
+import threading
+
+from ontology.exception.exception import SDKException
+
+from event_indexer import EVENT_COLUMNS, decode_block_events
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription(object):
+    """
+    One connected client. Empty filters match everything; a slow client whose
+    queue fills up is closed instead of holding events for everybody else.
+    Queued jobs are only sent to the clients naming their id, and a client
+    naming job ids alone gets no chain events.
+    """
+
+    def __init__(self, addresses=None, names=None, tx_hashes=None, max_queue=1000, job_ids=None):
+        self.addresses = set(addresses or ())
+        self.names = set(names or ())
+        self.tx_hashes = set(tx_hashes or ())
+        self.job_ids = set(job_ids or ())
+        self.queue = queue.Queue(max_queue)
+        self.closed = False
+
+    def matches(self, item):
+        if item['name'] == 'job':
+            return item['id'] in self.job_ids
+        if self.job_ids and not (self.addresses or self.names or self.tx_hashes):
+            return False
+        if self.addresses and item.get('from_address') not in self.addresses \
+                and item.get('to_address') not in self.addresses:
+            return False
+        if self.names and item['name'] not in self.names:
+            return False
+        if self.tx_hashes and item['tx_hash'] not in self.tx_hashes:
+            return False
+        return True
+
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+
+class EventFeed(object):
+    """
+    Fans decoded contract events out to every subscriber. Events come either
+    from the event indexer, which calls `publish_block` for each block it
+    writes, or from a single poll loop started with `start_polling`; in both
+    cases there is one upstream reader no matter how many clients are open.
+    `publish_job` is a `TxQueue` listener, so clients follow their queued
+    transactions here instead of polling `/tx_status`.
+    """
+
+    def __init__(self, max_queue=1000):
+        self.max_queue = max_queue
+        self.__subscriptions = set()
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+
+    def subscribe(self, addresses=None, names=None, tx_hashes=None, job_ids=None):
+        subscription = Subscription(addresses, names, tx_hashes, self.max_queue, job_ids)
+        with self.__lock:
+            self.__subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.__lock:
+            self.__subscriptions.discard(subscription)
+
+    def subscriber_count(self):
+        with self.__lock:
+            return len(self.__subscriptions)
+
+    def publish_block(self, height, transactions, events):
+        """
+        Publishes the rows the indexer decoded for one block: a `transaction`
+        item per transaction, so clients can wait for their tx hash, followed
+        by its events.
+        """
+        items = [{'name': 'transaction', 'tx_hash': tx_hash, 'height': tx_height, 'state': state,
+                  'gas_consumed': gas_consumed} for tx_hash, tx_height, state, gas_consumed in transactions]
+        items += [dict(zip(EVENT_COLUMNS, event)) for event in events]
+        self.publish(items)
+
+    def publish_job(self, job):
+        """
+        Publishes a `job` item with the state of a queued transaction.
+        """
+        self.publish([dict(job, name='job')])
+
+    def publish(self, items):
+        if len(items) == 0:
+            return
+        with self.__lock:
+            subscriptions = list(self.__subscriptions)
+        for subscription in subscriptions:
+            for item in items:
+                if not subscription.matches(item):
+                    continue
+                try:
+                    subscription.queue.put_nowait(item)
+                except queue.Full:
+                    subscription.closed = True
+                    self.unsubscribe(subscription)
+                    break
+
+    def poll(self, rpc_client, contracts, poll_interval):
+        """
+        Follows the tip from the start, also while nobody is subscribed, so a
+        client subscribing between two polls still gets every block after the
+        last tip seen.
+        """
+        height = None
+        while True:
+            try:
+                block_count = rpc_client.get_block_count()
+                if height is None or self.subscriber_count() == 0:
+                    # nobody is listening, so skip the new blocks instead of reading their events
+                    height = block_count
+                while height < block_count:
+                    tx_events = rpc_client.get_smart_contract_event_by_height(height)
+                    self.publish_block(height, *decode_block_events(height, tx_events, contracts))
+                    height += 1
+            except SDKException as e:
+                logger.warning('event feed poll failed: %s', e.args[1])
+            except Exception:
+                # e.g. a malformed node response; the block is read again on the next poll
+                logger.exception('event feed poll failed')
+            if self.__stop.wait(poll_interval):
+                return
+
+    def start_polling(self, rpc_client, contracts, poll_interval=6):
+        contracts = {contract.lower() for contract in contracts}
+        thread = threading.Thread(target=self.poll, args=(rpc_client, contracts, poll_interval),
+                                  name='event-feed', daemon=True)
+        thread.start()
+
+    def stop(self):
+        self.__stop.set()
@@ -0,0 +1,477 @@
+import argparse
+import collections
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from ontology.common.address import Address
+from ontology.common.error_code import ErrorCode
+from ontology.exception.exception import SDKException
+
+from rpc_client import PooledRpcClient
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    tx_hash TEXT PRIMARY KEY,
+    height INTEGER NOT NULL,
+    state INTEGER NOT NULL,
+    gas_consumed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    tx_hash TEXT NOT NULL,
+    event_index INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    contract TEXT NOT NULL,
+    name TEXT NOT NULL,
+    from_address TEXT,
+    to_address TEXT,
+    amount INTEGER,
+    order_id TEXT,
+    PRIMARY KEY (tx_hash, event_index)
+);
+CREATE TABLE IF NOT EXISTS holders (
+    contract TEXT NOT NULL,
+    address TEXT NOT NULL,
+    balance INTEGER NOT NULL,
+    PRIMARY KEY (contract, address)
+);
+CREATE TABLE IF NOT EXISTS holder_counts (
+    contract TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_height ON events (height);
+CREATE INDEX IF NOT EXISTS holders_balance ON holders (contract, balance DESC, address);
+CREATE INDEX IF NOT EXISTS events_from_address ON events (from_address, height);
+CREATE INDEX IF NOT EXISTS events_to_address ON events (to_address, height);
+CREATE INDEX IF NOT EXISTS transactions_height ON transactions (height);
+"""
+
+EVENT_COLUMNS = ('tx_hash', 'event_index', 'height', 'contract', 'name', 'from_address', 'to_address', 'amount',
+                 'order_id')
+
+# positions of each field in the Notify states list, after the event name
+EVENT_LAYOUTS = {
+    'transfer': ('from_address', 'to_address', 'amount'),
+    'approve': ('from_address', 'to_address', 'amount'),
+    'burn': ('from_address', 'amount'),
+    'confirmPayment': ('from_address', 'amount', 'order_id'),
+    'withdraw': ('from_address', 'to_address', 'amount'),
+}
+
+
+def decode_address(value):
+    data = bytes.fromhex(value)
+    if len(data) != 20:
+        return value
+    return Address(data).b58encode()
+
+
+def decode_integer(value):
+    return int.from_bytes(bytes.fromhex(value), 'little', signed=True)
+
+
+def decode_string(value):
+    data = bytes.fromhex(value)
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return value
+
+
+DECODERS = {
+    'from_address': decode_address,
+    'to_address': decode_address,
+    'amount': decode_integer,
+    'order_id': decode_string,
+}
+
+
+def decode_notify(states):
+    """
+    Decodes the hex encoded states of a contract `Notify` into event fields.
+    :param states: list of hex strings, the first one is the event name.
+    :return: dict of event fields or None if the event is unknown or not hex encoded.
+    """
+    if not isinstance(states, list) or len(states) == 0:
+        return None
+    try:
+        name = decode_string(states[0])
+        layout = EVENT_LAYOUTS.get(name)
+        if layout is None or len(states) != len(layout) + 1:
+            return None
+        event = {'name': name}
+        for field, value in zip(layout, states[1:]):
+            event[field] = DECODERS[field](value)
+    except (TypeError, ValueError):
+        # e.g. the native ONG fee notify, whose states are plain strings and integers
+        return None
+    return event
+
+
+def decode_block_events(height, tx_events, contracts):
+    """
+    Picks the transactions touching `contracts` out of a `getsmartcodeevent`
+    height result and decodes their notifications.
+    :return: (transaction rows, event rows) ready to insert.
+    """
+    transactions = list()
+    events = list()
+    for tx_event in tx_events or list():
+        notify_list = [notify for notify in tx_event.get('Notify') or list()
+                       if notify.get('ContractAddress', '').lower() in contracts]
+        if len(notify_list) == 0:
+            continue
+        tx_hash = tx_event['TxHash']
+        transactions.append((tx_hash, height, tx_event['State'], tx_event['GasConsumed']))
+        if tx_event['State'] == 0:
+            # a failed transaction reverts its notifications
+            continue
+        for event_index, notify in enumerate(notify_list):
+            event = decode_notify(notify.get('States'))
+            if event is None:
+                continue
+            event.update(tx_hash=tx_hash, event_index=event_index, height=height,
+                         contract=notify['ContractAddress'].lower())
+            events.append(tuple(event.get(column) for column in EVENT_COLUMNS))
+    return transactions, events
+
+
+def notify_fields(event):
+    """
+    :param event: mapping of `EVENT_COLUMNS`, e.g. an `events` row.
+    :return: the event as a lookup returns it: the contract, the name and the fields it has.
+    """
+    return {column: event[column] for column in EVENT_COLUMNS[3:] if event[column] is not None}
+
+
+def decode_tx_event(tx_event, contracts):
+    """
+    Decodes a `getsmartcodeevent` tx hash result into what the index stores
+    for it, so a lookup answers the same from the index or from the node:
+    only the known events of `contracts`, none for a failed transaction.
+    :param contracts: lowercase hex addresses of the contracts whose events to keep.
+    :return: dict with `State`, `GasConsumed` and the `Notify` list.
+    """
+    _, events = decode_block_events(None, [dict(tx_event, TxHash=None)], contracts)
+    return {'State': tx_event['State'], 'GasConsumed': tx_event['GasConsumed'],
+            'Notify': [notify_fields(dict(zip(EVENT_COLUMNS, event))) for event in events]}
+
+
+class EventIndexer(object):
+    """
+    Walks blocks, decodes the Notify events of the configured contracts and
+    stores them in SQLite. The last indexed height is committed in the same
+    transaction as the events, so a restart resumes where it stopped.
+    """
+
+    def __init__(self, db_path, rpc_client, contracts, start_height=0, poll_interval=6, commit_interval=100):
+        self.db_path = db_path
+        self.rpc_client = rpc_client
+        self.contracts = {contract.lower() for contract in contracts}
+        self.start_height = start_height
+        self.poll_interval = poll_interval
+        self.commit_interval = commit_interval
+        self.listeners = list()
+        self.__local = threading.local()
+        self.__stop = threading.Event()
+        self.__thread = None
+        conn = self.connection()
+        conn.executescript(SCHEMA)
+        conn.execute('PRAGMA journal_mode=WAL')
+
+    def connection(self):
+        conn = getattr(self.__local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            self.__local.conn = conn
+        return conn
+
+    def last_height(self):
+        row = self.connection().execute("SELECT value FROM sync_state WHERE name = 'height'").fetchone()
+        return row[0] if row is not None else self.start_height - 1
+
+    @staticmethod
+    def get_balance(conn, contract, address):
+        row = conn.execute('SELECT balance FROM holders WHERE contract = ? AND address = ?',
+                           (contract, address)).fetchone()
+        return row[0] if row is not None else 0
+
+    @staticmethod
+    def safe_put_balance(conn, contract, address, old_balance, balance):
+        """
+        Mirrors `SafePut`: a zero balance deletes the holder.
+        """
+        if balance == 0:
+            conn.execute('DELETE FROM holders WHERE contract = ? AND address = ?', (contract, address))
+        else:
+            conn.execute('INSERT OR REPLACE INTO holders VALUES (?, ?, ?)', (contract, address, balance))
+        delta = (balance != 0) - (old_balance != 0)
+        if delta != 0:
+            conn.execute('INSERT OR IGNORE INTO holder_counts VALUES (?, 0)', (contract,))
+            conn.execute('UPDATE holder_counts SET count = count + ? WHERE contract = ?', (delta, contract))
+
+    def apply_event(self, conn, event):
+        """
+        Updates the holder balances the way `_transfer` and `_burn` in
+        `SpokkzCoin.py` update storage.
+        """
+        event = dict(zip(EVENT_COLUMNS, event))
+        contract = event['contract']
+        if event['name'] == 'transfer':
+            _from, _to, value = event['from_address'], event['to_address'], event['amount']
+            if _from == '':
+                # `deploy` puts the initial supply directly
+                old_val = self.get_balance(conn, contract, _to)
+                self.safe_put_balance(conn, contract, _to, old_val, old_val + value)
+                return
+            # both balances are read before either is written, exactly like `_transfer`
+            old_from_val = self.get_balance(conn, contract, _from)
+            old_to_val = self.get_balance(conn, contract, _to)
+            self.safe_put_balance(conn, contract, _from, old_from_val, old_from_val - value)
+            self.safe_put_balance(conn, contract, _to, self.get_balance(conn, contract, _to), old_to_val + value)
+        elif event['name'] == 'burn':
+            account, value = event['from_address'], event['amount']
+            old_val = self.get_balance(conn, contract, account)
+            self.safe_put_balance(conn, contract, account, old_val, old_val - value)
+
+    def write_block(self, conn, height, transactions, events):
+        """
+        Writes a block and moves the indexed height to it, in the caller's
+        transaction. A block at or below the indexed height was applied
+        already and is skipped, so replaying blocks never counts a balance
+        twice.
+        :return: True if the block was written.
+        """
+        row = conn.execute("SELECT value FROM sync_state WHERE name = 'height'").fetchone()
+        if row is not None and height <= row[0]:
+            return False
+        conn.executemany('INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?)', transactions)
+        conn.executemany('INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', events)
+        for event in events:
+            self.apply_event(conn, event)
+        conn.execute("INSERT OR REPLACE INTO sync_state VALUES ('height', ?)", (height,))
+        return True
+
+    def sync(self):
+        """
+        Indexes every block from the last indexed height up to the node's
+        current height. Blocks are committed whole, every `commit_interval`
+        blocks and at the end, and listeners hear of them once committed. On
+        any error the uncommitted blocks are rolled back and fetched again by
+        the next sync.
+        :return: the number of blocks indexed.
+        """
+        conn = self.connection()
+        start = self.last_height() + 1
+        end = self.rpc_client.get_block_count() - 1
+        written = list()
+        try:
+            for height in range(start, end + 1):
+                tx_events = self.rpc_client.get_smart_contract_event_by_height(height)
+                transactions, events = decode_block_events(height, tx_events, self.contracts)
+                if self.write_block(conn, height, transactions, events):
+                    written.append((height, transactions, events))
+                if (height - start + 1) % self.commit_interval == 0:
+                    self.__commit(conn, written)
+                if self.__stop.is_set():
+                    break
+        except Exception:
+            conn.rollback()
+            raise
+        self.__commit(conn, written)
+        return max(0, end - start + 1)
+
+    def __commit(self, conn, written):
+        conn.commit()
+        for block in written:
+            for listener in self.listeners:
+                listener(*block)
+        written.clear()
+
+    def fetch_range(self, start, end):
+        blocks = list()
+        for height in range(start, end + 1):
+            tx_events = self.rpc_client.get_smart_contract_event_by_height(height)
+            blocks.append((height,) + decode_block_events(height, tx_events, self.contracts))
+        return blocks
+
+    def __fetch_range_after(self, delay, start, end):
+        time.sleep(delay)
+        return self.fetch_range(start, end)
+
+    def backfill(self, end_height=None, chunk_size=500, max_workers=8, max_retries=5, backoff=1, max_backoff=30):
+        """
+        Indexes a historical height range in parallel. Chunks of `chunk_size`
+        blocks are fetched by a worker pool and written in height order by the
+        calling thread, which commits a checkpoint after every chunk. The
+        number of chunks in flight is halved whenever the node fails a chunk
+        and grows back by one per successful chunk. A failed chunk, including
+        one the node answered with events that can't be decoded, is fetched
+        again after an exponential backoff, at most `max_retries` times.
+        :param end_height: last height to index, defaults to the node's height.
+        :return: the number of blocks indexed.
+        """
+        conn = self.connection()
+        start = self.last_height() + 1
+        if end_height is None:
+            end_height = self.rpc_client.get_block_count() - 1
+        total = end_height - start + 1
+        if total <= 0:
+            return 0
+        chunks = [(lo, min(lo + chunk_size - 1, end_height)) for lo in range(start, end_height + 1, chunk_size)]
+        queue = collections.deque(range(len(chunks)))
+        limit = max_workers
+        pending = dict()
+        retries = collections.Counter()
+        done_chunks = dict()
+        next_write = 0
+        written = 0
+        started_at = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='backfill') as executor:
+            while next_write < len(chunks):
+                # queue[0] is the lowest unfetched chunk; chunks that finished ahead of the write
+                # head are buffered, so only fetch up to 2 * max_workers chunks past it
+                while queue and len(pending) < limit and queue[0] < next_write + 2 * max_workers:
+                    index = queue.popleft()
+                    delay = min(max_backoff, backoff * 2 ** (retries[index] - 1)) if retries[index] else 0
+                    pending[executor.submit(self.__fetch_range_after, delay, *chunks[index])] = index
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index = pending.pop(future)
+                    try:
+                        done_chunks[index] = future.result()
+                        limit = min(max_workers, limit + 1)
+                    except (SDKException, KeyError, TypeError, ValueError) as e:
+                        # KeyError, TypeError and ValueError come from decoding a malformed node response
+                        error = e.args[1] if isinstance(e, SDKException) else repr(e)
+                        retries[index] += 1
+                        if retries[index] > max_retries:
+                            raise SDKException(ErrorCode.other_error('backfill chunk {}-{} failed {} times: {}'.format(
+                                chunks[index][0], chunks[index][1], retries[index], error)))
+                        limit = max(1, limit // 2)
+                        queue.appendleft(index)
+                        logger.warning('backfill chunk %d-%d failed, %d workers: %s', *chunks[index], limit, error)
+                while next_write in done_chunks:
+                    try:
+                        for block in done_chunks.pop(next_write):
+                            self.write_block(conn, *block)
+                    except Exception:
+                        conn.rollback()
+                        raise
+                    conn.commit()
+                    written += chunks[next_write][1] - chunks[next_write][0] + 1
+                    next_write += 1
+                    rate = written / max(time.monotonic() - started_at, 1e-6)
+                    logger.info('backfill %d/%d blocks, %.1f blocks/s, eta %ds', written, total, rate,
+                                (total - written) / rate)
+        return total
+
+    def run(self):
+        while not self.__stop.is_set():
+            try:
+                self.sync()
+            except SDKException as e:
+                logger.warning('event sync failed: %s', e.args[1])
+            except Exception:
+                # e.g. a malformed node response or a locked database, retried on the next poll
+                logger.exception('event sync failed')
+            self.__stop.wait(self.poll_interval)
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.run, name='event-indexer', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def events_by_address(self, b58_address, name=None, limit=50, offset=0):
+        sql = 'SELECT * FROM events WHERE (from_address = ? OR to_address = ?)'
+        params = [b58_address, b58_address]
+        if name is not None:
+            sql += ' AND name = ?'
+            params.append(name)
+        sql += ' ORDER BY height DESC, tx_hash, event_index LIMIT ? OFFSET ?'
+        params += [limit, offset]
+        return [dict(row) for row in self.connection().execute(sql, params)]
+
+    def events_by_tx_hash(self, tx_hash):
+        rows = self.connection().execute('SELECT * FROM events WHERE tx_hash = ? ORDER BY event_index', (tx_hash,))
+        return [dict(row) for row in rows]
+
+    def holders(self, contract, limit=50, after=None):
+        """
+        Holders by balance, one page at a time. Pages are keyed by the last
+        holder of the previous page, so each one is a seek on `holders_balance`
+        however deep it is.
+        :param after: (balance, address) of the last holder of the previous page.
+        """
+        sql = 'SELECT address, balance FROM holders WHERE contract = ?'
+        params = [contract.lower()]
+        if after is not None:
+            sql += ' AND (balance < ? OR balance = ? AND address > ?)'
+            params += [after[0], after[0], after[1]]
+        sql += ' ORDER BY balance DESC, address LIMIT ?'
+        params.append(limit)
+        return [dict(row) for row in self.connection().execute(sql, params)]
+
+    def holder_count(self, contract):
+        row = self.connection().execute('SELECT count FROM holder_counts WHERE contract = ?',
+                                        (contract.lower(),)).fetchone()
+        return row[0] if row is not None else 0
+
+    def transaction(self, tx_hash):
+        row = self.connection().execute('SELECT * FROM transactions WHERE tx_hash = ?', (tx_hash,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def transaction_events(self, tx_hashes, chunk_size=500):
+        """
+        Looks many transactions up at once, in the shape of `decode_tx_event`
+        plus the block `height`.
+        :return: dict of tx hash -> decoded event, for the indexed hashes only.
+        """
+        conn = self.connection()
+        result = dict()
+        for start in range(0, len(tx_hashes), chunk_size):
+            chunk = tx_hashes[start:start + chunk_size]
+            marks = ','.join('?' * len(chunk))
+            for row in conn.execute('SELECT * FROM transactions WHERE tx_hash IN (%s)' % marks, chunk):
+                result[row['tx_hash']] = {'State': row['state'], 'GasConsumed': row['gas_consumed'],
+                                          'height': row['height'], 'Notify': list()}
+            rows = conn.execute('SELECT * FROM events WHERE tx_hash IN (%s) ORDER BY tx_hash, event_index' % marks,
+                                chunk)
+            for row in rows:
+                result[row['tx_hash']]['Notify'].append(notify_fields(row))
+        return result
+
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser()
+    args.add_argument('contracts', metavar='C', type=str, nargs='+', help='Hex contract addresses to index')
+    args.add_argument('--rpc', type=str, help='rpc address', default='http://polaris1.ont.io:20336')
+    args.add_argument('--db', type=str, help='sqlite database path', default='events.db')
+    args.add_argument('--start-height', type=int, default=0)
+    args.add_argument('--backfill', action='store_true', help='index history in parallel, then exit')
+    args.add_argument('--end-height', type=int, default=None)
+    args.add_argument('--chunk-size', type=int, default=500)
+    args.add_argument('--workers', type=int, default=8)
+    args.add_argument('--max-retries', type=int, default=5, help='fetches of a failed chunk before giving up')
+    args = args.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    indexer = EventIndexer(args.db, PooledRpcClient(args.rpc, pool_size=args.workers), args.contracts,
+                           args.start_height)
+    if args.backfill:
+        indexer.backfill(args.end_height, args.chunk_size, args.workers, args.max_retries)
+    else:
+        indexer.run()
@@ -0,0 +1,67 @@
+import math
+import threading
+import time
+
+from tracing import span
+
+
+class GasEstimator(object):
+    """
+    Sets a transaction's gas limit from a pre-execution of it instead of one
+    fixed limit for everything. The gas measured is cached per (operation key,
+    batch size) for `ttl` seconds, keeping the highest value seen, so only the
+    first call of a kind pays for the extra round trip. Sizes aren't grouped:
+    a call's fixed cost spread over the items of a large batch underestimates
+    a small one.
+    """
+
+    def __init__(self, margin=1.2, min_gas_limit=20000, max_gas_limit=20600000, ttl=600):
+        self.margin = margin
+        self.min_gas_limit = min_gas_limit
+        self.max_gas_limit = max_gas_limit
+        self.ttl = ttl
+        self.__estimates = dict()
+        self.__lock = threading.Lock()
+
+    def gas_limit(self, gas):
+        return min(self.max_gas_limit, max(self.min_gas_limit, math.ceil(gas * self.margin)))
+
+    def cached(self, key, size):
+        with self.__lock:
+            entry = self.__estimates.get((key, size))
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return self.gas_limit(entry[0])
+
+    def measure(self, rpc_client, key, size, tx):
+        """
+        Pre-executes a signed transaction and caches its gas.
+        :return: the gas it consumed.
+        """
+        with span('pre_execute', size=size):
+            gas = int(rpc_client.pre_execute(tx)['Gas'])
+        now = time.monotonic()
+        with self.__lock:
+            entry = self.__estimates.get((key, size))
+            highest = gas
+            if entry is not None and entry[1] >= now:
+                highest = max(highest, entry[0])
+            self.__estimates[(key, size)] = (highest, now + self.ttl)
+        return gas
+
+    def estimate(self, rpc_client, key, size, build):
+        """
+        :param key: what the gas depends on, e.g. (network, contract, operation).
+        :param size: the number of items in the call, 1 for single operations.
+        :param build: function of a gas limit returning the signed transaction.
+        :return: (signed transaction, measured gas or None when the estimate was cached).
+        """
+        gas_limit = self.cached(key, size)
+        if gas_limit is not None:
+            return build(gas_limit), None
+        gas = self.measure(rpc_client, key, size, build(self.max_gas_limit))
+        return build(self.gas_limit(gas)), gas
+
+    def clear(self):
+        with self.__lock:
+            self.__estimates.clear()
@@ -0,0 +1,72 @@
+import threading
+import time
+
+IMMUTABLE_FIELDS = ('name', 'symbol', 'decimals')
+
+_MISSING = object()
+
+
+class MetadataCache(object):
+    """
+    Caches OEP4 token metadata per (network, contract address). `name`,
+    `symbol` and `decimals` are constants in the contract and are kept until
+    the cache is cleared; every other field, e.g. `totalSupply`, expires after
+    `ttl` seconds.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.__entries = dict()
+        self.__lock = threading.Lock()
+
+    def get(self, key, field):
+        with self.__lock:
+            entry = self.__entries.get((key, field))
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return _MISSING
+
+    def put(self, key, field, value):
+        expires_at = None if field in IMMUTABLE_FIELDS else time.monotonic() + self.ttl
+        with self.__lock:
+            self.__entries[(key, field)] = (value, expires_at)
+
+    def load(self, key, field, load):
+        """
+        Blocking counterpart of `fetch` for worker threads.
+        :param load: function that queries the contract.
+        """
+        value = self.get(key, field)
+        if value is _MISSING:
+            value = load()
+            self.put(key, field, value)
+        return value
+
+    async def fetch(self, key, field, load):
+        """
+        Returns the cached field or awaits `load()` and caches its result.
+        :param key: (network, contract address) tuple.
+        :param field: contract operation name, e.g. `name`.
+        :param load: coroutine function that queries the contract.
+        """
+        value = self.get(key, field)
+        if value is _MISSING:
+            value = await load()
+            self.put(key, field, value)
+        return value
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(self):
+        with self.__lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.__entries),
+                    'hit_ratio': self.hits / total if total else 0.0}
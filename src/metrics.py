@@ -0,0 +1,169 @@
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_labels(names, key, extra=None):
+    values = key if isinstance(key, tuple) else (key,)
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if len(pairs) == 0:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in pairs]
+    return '{' + ','.join(''.join([name, '="', value, '"']) for name, value in escaped) + '}'
+
+
+class Values(object):
+    """
+    One dict of values per metric behind a lock. An update holds the lock for
+    a dict lookup and an add, so contention stays low, and the memory is
+    bounded by the label keys however many threads write to it.
+    """
+
+    def __init__(self):
+        self.values = dict()
+        self.lock = threading.Lock()
+
+    def copy(self, value):
+        return value
+
+    def totals(self):
+        with self.lock:
+            return {key: self.copy(value) for key, value in self.values.items()}
+
+
+class Counter(Values):
+    """
+    :param key: one label value, or a tuple of them in `labelnames` order.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def inc(self, key=(), amount=1):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = list()
+        for key, value in sorted(self.totals().items()):
+            lines.append(''.join([self.name, format_labels(self.labelnames, key), ' ', str(value)]))
+        return lines
+
+
+class Gauge(Counter):
+    """
+    A counter that goes down too, e.g. the number of requests in flight.
+    """
+
+    kind = 'gauge'
+
+    def dec(self, key=(), amount=1):
+        self.inc(key, -amount)
+
+
+class CallbackGauge(object):
+    """
+    A gauge read from elsewhere at scrape time.
+    :param collect: function returning a dict of label key -> value.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames, collect):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def render(self):
+        return [''.join([self.name, format_labels(self.labelnames, key), ' ', str(value)])
+                for key, value in sorted(self.collect().items())]
+
+
+class Histogram(Values):
+    """
+    Each key has one row of per-bucket counts followed by the sum and the
+    count of all observations; rows are only made cumulative when rendered.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+
+    def observe(self, key, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 3)
+            row[index] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def copy(self, row):
+        return list(row)
+
+    def render(self):
+        lines = list()
+        for key, row in sorted(self.totals().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), row):
+                cumulative += count
+                labels = format_labels(self.labelnames, key, ('le', bound))
+                lines.append(''.join([self.name, '_bucket', labels, ' ', str(cumulative)]))
+            labels = format_labels(self.labelnames, key)
+            lines.append(''.join([self.name, '_sum', labels, ' ', str(row[-2])]))
+            lines.append(''.join([self.name, '_count', labels, ' ', str(row[-1])]))
+        return lines
+
+
+class Registry(object):
+    def __init__(self):
+        self.metrics = list()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        :return: the metrics in the Prometheus text exposition format.
+        """
+        lines = list()
+        for metric in self.metrics:
+            lines.append(' '.join(['# HELP', metric.name, metric.documentation]))
+            lines.append(' '.join(['# TYPE', metric.name, metric.kind]))
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+RPC_REQUEST_DURATION = REGISTRY.register(Histogram(
+    'rpc_request_duration_seconds', 'JSON-RPC requests to the nodes by method and node.', ('method', 'node')))
+RPC_REQUEST_ERRORS = REGISTRY.register(Counter(
+    'rpc_request_errors_total', 'JSON-RPC requests that failed in transport by method and node.', ('method', 'node')))
+RPC_CALL_DURATION = REGISTRY.register(Histogram(
+    'rpc_call_duration_seconds', 'Blocking sdk and rpc calls run on the worker pool, e.g. balance_of.', ('call',)))
+RPC_CALLS_IN_FLIGHT = REGISTRY.register(Gauge(
+    'rpc_calls_in_flight', 'Blocking sdk and rpc calls running on the worker pool.', ('call',)))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'explorer_request_duration_seconds', 'Explorer requests by route.', ('route',)))
+REQUEST_ERRORS = REGISTRY.register(Counter(
+    'explorer_request_errors_total', 'Explorer requests answered with a 4xx or 5xx status.', ('route', 'status')))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    'explorer_requests_in_flight', 'Explorer requests being handled by route.', ('route',)))
@@ -0,0 +1,300 @@
+import argparse
+import csv
+import getpass
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from decimal import Decimal, InvalidOperation
+
+from ontology.account.account import Account
+from ontology.common.address import Address
+from ontology.common.error_code import ErrorCode
+from ontology.exception.exception import SDKException
+from ontology.wallet.wallet_manager import WalletManager
+
+from contract_tx import make_invoke_transaction, sign_transaction
+from rpc_client import PooledRpcClient
+
+logger = logging.getLogger(__name__)
+
+# NeoVM refuses to PACK arrays larger than this
+MAX_VM_ARRAY_SIZE = 1024
+# serialized size of one [from, to, value] triple in the invocation script, rounded up
+BYTES_PER_TRANSFER = 60
+
+
+def read_recipients(path):
+    """
+    Reads `(b58_address, amount)` rows from a CSV file with an optional
+    header, or from a JSONL file of `{"b58_address": ..., "amount": ...}`.
+    """
+    with open(path, newline='') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    yield item['b58_address'], str(item['amount'])
+        else:
+            for row_number, row in enumerate(csv.reader(f)):
+                if len(row) == 0:
+                    continue
+                if row_number == 0 and row[0].strip() == 'b58_address':
+                    continue
+                yield row[0].strip(), row[1].strip()
+
+
+def to_units(amount, decimals):
+    try:
+        units = Decimal(amount).scaleb(decimals)
+    except InvalidOperation:
+        raise ValueError(''.join(['invalid amount: ', amount]))
+    if units <= 0 or units != units.to_integral_value():
+        raise ValueError(''.join(['invalid amount: ', amount]))
+    return int(units)
+
+
+def max_batch_size(gas_limit, gas_per_transfer, max_tx_bytes, max_batch=MAX_VM_ARRAY_SIZE):
+    """
+    The number of transfers that fit in one `transferMulti` transaction
+    under the gas limit, the tx size limit and the VM array size limit.
+    """
+    return max(1, min(max_batch, MAX_VM_ARRAY_SIZE, gas_limit // gas_per_transfer, max_tx_bytes // BYTES_PER_TRANSFER))
+
+
+def sign_batch(private_key, scheme, contract_address, transfers, gas_limit, gas_price):
+    """
+    Builds and signs one `transferMulti` transaction in a worker process.
+    :param transfers: list of (b58 to address, value in units).
+    :return: (tx hash, serialized tx hex).
+    """
+    account = Account(private_key, scheme)
+    from_address = account.get_address().to_array()
+    args = [[from_address, Address.b58decode(b58_address).to_array(), value] for b58_address, value in transfers]
+    tx = make_invoke_transaction(contract_address, 'transferMulti', args, from_address, gas_limit, gas_price)
+    sign_transaction(tx, [account])
+    return tx.hash256_explorer(), tx.serialize().hex()
+
+
+class PayoutJournal(object):
+    """
+    Append-only JSON lines checkpoint of a payout. A batch's signed
+    transaction is written and fsynced before it is broadcast, so after a
+    crash the very same transaction is re-broadcast instead of a new one
+    being signed; the node can then only ever execute it once.
+    """
+
+    def __init__(self, path, header):
+        self.path = path
+        self.batches = dict()
+        self.__lock = threading.Lock()
+        lines = list()
+        if os.path.isfile(path):
+            with open(path) as f:
+                lines = [json.loads(line) for line in f if line.strip()]
+        if lines:
+            if lines[0] != header:
+                raise ValueError('the checkpoint belongs to a payout with different settings')
+            for entry in lines[1:]:
+                self.batches.setdefault(entry['batch'], dict()).update(entry)
+            self.__file = open(path, 'a')
+        else:
+            # new, or created by a run that crashed before writing its header
+            self.__file = open(path, 'w')
+            self.__write(header)
+
+    def __write(self, entry):
+        self.__file.write(json.dumps(entry) + '\n')
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+
+    def record(self, batch, **entry):
+        entry['batch'] = batch
+        with self.__lock:
+            self.__write(entry)
+            self.batches.setdefault(batch, dict()).update(entry)
+
+    def summary(self):
+        with self.__lock:
+            statuses = [batch['status'] for batch in self.batches.values()]
+        return {status: statuses.count(status) for status in set(statuses)}
+
+    def close(self):
+        self.__file.close()
+
+
+class Payout(object):
+    """
+    Pays many recipients from one account by packing them into
+    `transferMulti` transactions, signing those on a process pool and
+    broadcasting them with bounded concurrency. Batch states in the journal:
+    `signed` (written before broadcast), `submitted`, `error` (the broadcast
+    failed and is retried with the same transaction), `abandoned` (the
+    broadcast failed `max_attempts` times; it is only checked on chain from
+    then on, never re-broadcast or signed again), `confirmed` and `failed`
+    (reverted on chain, so it is safe to sign again). `run` polls the
+    batches every `confirm_interval` seconds until each is confirmed or
+    failed, or `confirm_timeout` runs out; a batch in `error` may be on its
+    way too, e.g. when its re-broadcast was refused as a duplicate.
+    """
+
+    def __init__(self, rpc_client, contract_address, account, batch_size, gas_limit, gas_price, journal,
+                 sign_processes=None, submit_concurrency=4, max_attempts=5, confirm_interval=3, confirm_timeout=300):
+        self.rpc_client = rpc_client
+        self.contract_address = contract_address
+        self.account = account
+        self.batch_size = batch_size
+        self.gas_limit = gas_limit
+        self.gas_price = gas_price
+        self.journal = journal
+        self.sign_processes = sign_processes
+        self.submit_concurrency = submit_concurrency
+        self.max_attempts = max_attempts
+        self.confirm_interval = confirm_interval
+        self.confirm_timeout = confirm_timeout
+
+    def batches(self, recipients, decimals):
+        """
+        Validates the recipients and packs them into batches; the packing only
+        depends on the input and the batch size, so a resumed run gets the
+        same batches.
+        """
+        transfers = [(b58_address, to_units(amount, decimals)) for b58_address, amount in recipients]
+        for b58_address, _ in transfers:
+            Address.b58decode(b58_address)
+        return [transfers[i:i + self.batch_size] for i in range(0, len(transfers), self.batch_size)]
+
+    def submit(self, batch, tx_hash, tx_data):
+        attempts = self.journal.batches[batch].get('attempts', 0) + 1
+        try:
+            self.rpc_client.send_raw_transaction_hex(tx_data)
+        except SDKException as e:
+            # a re-broadcast of a transaction already in the ledger lands here too; confirm() settles it
+            status = 'error' if attempts < self.max_attempts else 'abandoned'
+            self.journal.record(batch, status=status, error=e.args[1], attempts=attempts)
+            if status == 'abandoned':
+                logger.warning('payout batch %d abandoned after %d broadcasts: %s', batch, attempts, e.args[1])
+            return
+        self.journal.record(batch, status='submitted', attempts=attempts)
+        logger.info('payout batch %d submitted: %s', batch, tx_hash)
+
+    def confirm_batch(self, batch):
+        event = self.rpc_client.get_smart_contract_event_by_tx_hash(self.journal.batches[batch]['tx_hash'])
+        if event:
+            self.journal.record(batch, status='confirmed' if event['State'] == 1 else 'failed',
+                                gas_consumed=event['GasConsumed'])
+
+    def run(self, batches):
+        """
+        Runs or resumes the payout; batches already confirmed are skipped.
+        Returns once every batch is settled on chain or the confirm timeout
+        runs out.
+        :param batches: as returned by `batches`.
+        :return: the number of batches in each state.
+        """
+        private_key = self.account.serialize_private_key().hex()
+        scheme = self.account.get_signature_scheme()
+        with ThreadPoolExecutor(max_workers=self.submit_concurrency, thread_name_prefix='payout') as submitter:
+            pending = [batch for batch in range(len(batches)) if batch in self.journal.batches
+                       and self.journal.batches[batch]['status'] not in ('confirmed', 'failed')]
+            for batch in as_completed([submitter.submit(self.confirm_batch, batch) for batch in pending]):
+                batch.result()
+            resubmits = list()
+            to_sign = list()
+            for batch in range(len(batches)):
+                state = self.journal.batches.get(batch)
+                if state is None or state['status'] == 'failed':
+                    to_sign.append(batch)
+                elif state['status'] not in ('confirmed', 'abandoned'):
+                    resubmits.append(submitter.submit(self.submit, batch, state['tx_hash'], state['tx_data']))
+            with ProcessPoolExecutor(max_workers=self.sign_processes) as signer:
+                futures = {signer.submit(sign_batch, private_key, scheme, self.contract_address, batches[batch],
+                                         self.gas_limit, self.gas_price): batch for batch in to_sign}
+                submits = list()
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    tx_hash, tx_data = future.result()
+                    self.journal.record(batch, status='signed', tx_hash=tx_hash, tx_data=tx_data,
+                                        transfers=len(batches[batch]))
+                    submits.append(submitter.submit(self.submit, batch, tx_hash, tx_data))
+            for future in resubmits + submits:
+                future.result()
+        return self.wait_confirmed()
+
+    def wait_confirmed(self):
+        """
+        Checks the unconfirmed batches on chain until all of them are settled.
+        :return: the number of batches in each state.
+        """
+        deadline = time.monotonic() + self.confirm_timeout
+        while True:
+            summary = self.confirm()
+            if set(summary) <= {'confirmed', 'failed'} or time.monotonic() >= deadline:
+                return summary
+            time.sleep(self.confirm_interval)
+
+    def confirm(self):
+        """
+        Checks every unconfirmed batch on chain once.
+        :return: the number of batches in each state.
+        """
+        pending = [batch for batch, state in self.journal.batches.items()
+                   if state['status'] not in ('confirmed', 'failed')]
+        with ThreadPoolExecutor(max_workers=self.submit_concurrency) as executor:
+            for future in [executor.submit(self.confirm_batch, batch) for batch in pending]:
+                future.result()
+        return self.journal.summary()
+
+
+def journal_header(recipients_path, contract_address, b58_address, batch_size, decimals):
+    """
+    Everything the signed batches depend on; a journal only resumes a payout
+    with the very same header.
+    """
+    with open(recipients_path, 'rb') as f:
+        recipients_hash = hashlib.sha256(f.read()).hexdigest()
+    return {'recipients': recipients_hash, 'contract': contract_address, 'payer': b58_address,
+            'batch_size': batch_size, 'decimals': decimals}
+
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser()
+    args.add_argument('recipients', type=str, help='CSV (b58_address,amount) or JSONL recipients file')
+    args.add_argument('--wallet', type=str, required=True, help='wallet file')
+    args.add_argument('--address', type=str, required=True, help='base58 address paying out')
+    args.add_argument('--contract', type=str, required=True, help='hex contract address')
+    args.add_argument('--rpc', type=str, default='http://polaris1.ont.io:20336')
+    args.add_argument('--decimals', type=int, default=8)
+    args.add_argument('--gas-limit', type=int, default=20600000)
+    args.add_argument('--gas-price', type=int, default=500)
+    args.add_argument('--gas-per-transfer', type=int, default=40000)
+    args.add_argument('--max-tx-bytes', type=int, default=65536)
+    args.add_argument('--journal', type=str, help='checkpoint file, defaults to <recipients>.checkpoint.jsonl')
+    args.add_argument('--concurrency', type=int, default=4, help='max transactions being broadcast at once')
+    args.add_argument('--max-attempts', type=int, default=5, help='broadcasts of a batch before it is abandoned')
+    args.add_argument('--confirm-timeout', type=int, default=300, help='seconds to wait for the batches on chain')
+    args.add_argument('--confirm', action='store_true', help='only check submitted batches on chain')
+    args = args.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    wallet_manager = WalletManager()
+    wallet_manager.open_wallet(args.wallet)
+    payer = wallet_manager.get_account(args.address, getpass.getpass('Account Password: '))
+    if payer is None:
+        raise SDKException(ErrorCode.other_error(''.join(['account not found: ', args.address])))
+    contract_address = bytearray.fromhex(args.contract)
+    contract_address.reverse()
+    size = max_batch_size(args.gas_limit, args.gas_per_transfer, args.max_tx_bytes)
+    journal = PayoutJournal(args.journal or args.recipients + '.checkpoint.jsonl',
+                            journal_header(args.recipients, args.contract, args.address, size, args.decimals))
+    payout = Payout(PooledRpcClient(args.rpc, pool_size=args.concurrency), contract_address, payer, size,
+                    args.gas_limit, args.gas_price, journal, submit_concurrency=args.concurrency,
+                    max_attempts=args.max_attempts, confirm_timeout=args.confirm_timeout)
+    if args.confirm:
+        print(payout.confirm())
+    else:
+        print(payout.run(payout.batches(read_recipients(args.recipients), args.decimals)))
+    journal.close()
@@ -0,0 +1,383 @@
+import asyncio
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ontology.common.error_code import ErrorCode
+from ontology.exception.exception import SDKException
+
+from metrics import RPC_CALL_DURATION, RPC_CALLS_IN_FLIGHT, RPC_REQUEST_DURATION, RPC_REQUEST_ERRORS
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+JSON_RPC_VERSION = '2.0'
+# HTTPError and BadResponse come from a proxy in front of the node, e.g. an HTML 502 page
+TRANSPORT_ERRORS = tuple(ErrorCode.other_error(kind)['desc'] for kind in ('ConnectTimeout', 'ReadTimeout',
+                                                                          'ConnectionError', 'HTTPError',
+                                                                          'BadResponse'))
+# errors raised before the request reached the node
+UNSENT_ERRORS = tuple(ErrorCode.other_error(kind)['desc'] for kind in ('ConnectTimeout', 'ConnectionError'))
+# raised by `AsyncRpc.run` when it stops waiting for a call that may still be running
+CALL_TIMEOUT = ErrorCode.other_error('Timeout: ')['desc']
+
+
+def is_transport_error(e):
+    """
+    True when the `SDKException` comes from the connection to the node rather
+    than from the node rejecting the request, i.e. the request may be retried.
+    """
+    return isinstance(e.args[1], str) and e.args[1].startswith(TRANSPORT_ERRORS)
+
+
+def is_call_timeout(e):
+    """
+    True when the `SDKException` comes from `AsyncRpc.run` giving up on a call
+    that keeps running on its worker.
+    """
+    return isinstance(e.args[1], str) and e.args[1].startswith(CALL_TIMEOUT)
+
+
+class PooledRpcClient(object):
+    """
+    Drop-in replacement for the SDK's `RpcClient` that talks JSON-RPC over a
+    keep-alive `requests.Session`, so every call reuses a pooled connection to
+    the node instead of opening a new one.
+    """
+
+    def __init__(self, addr=None, pool_size=16, timeout=10):
+        self.addr = addr
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def set_address(self, addr):
+        self.addr = addr
+
+    def close(self):
+        self.session.close()
+
+    def post(self, addr, method, params=None):
+        started_at = time.perf_counter()
+        try:
+            with span('rpc', method=method, node=addr):
+                return self.__post(addr, method, params)
+        except SDKException:
+            RPC_REQUEST_ERRORS.inc((method, addr))
+            raise
+        finally:
+            RPC_REQUEST_DURATION.observe((method, addr), time.perf_counter() - started_at)
+
+    def __post(self, addr, method, params):
+        payload = {'jsonrpc': JSON_RPC_VERSION, 'id': '1', 'method': method, 'params': params or list()}
+        try:
+            response = self.session.post(addr, json=payload, timeout=self.timeout)
+        except requests.exceptions.MissingSchema as e:
+            raise SDKException(ErrorCode.connect_err(e.args[0]))
+        except requests.exceptions.ConnectTimeout:
+            raise SDKException(ErrorCode.other_error(''.join(['ConnectTimeout: ', addr])))
+        except requests.exceptions.Timeout:
+            raise SDKException(ErrorCode.other_error(''.join(['ReadTimeout: ', addr])))
+        except requests.exceptions.ConnectionError:
+            raise SDKException(ErrorCode.other_error(''.join(['ConnectionError: ', addr])))
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            raise SDKException(ErrorCode.other_error(''.join(['HTTPError: ', str(response.status_code), ' ', addr])))
+        try:
+            return json.loads(response.content.decode())
+        except ValueError:
+            raise SDKException(ErrorCode.other_error(''.join(['BadResponse: ', addr])))
+
+    def request(self, method, params=None):
+        """
+        Posts one JSON-RPC request and returns the decoded response body.
+        :param method: rpc method name, e.g. `getbalance`.
+        :param params: rpc params list.
+        :return: the response dict with `error` and `result`.
+        """
+        return self.post(self.addr, method, params)
+
+    def call(self, method, params=None):
+        return self.request(method, params)['result']
+
+    def get_version(self):
+        return self.call('getversion')
+
+    def get_block_count(self):
+        return self.call('getblockcount')
+
+    def get_block_by_height(self, height):
+        return self.call('getblock', [height, 1])
+
+    def get_balance(self, base58_address):
+        return self.call('getbalance', [base58_address, 1])
+
+    def get_smart_contract_event_by_tx_hash(self, tx_hash):
+        return self.call('getsmartcodeevent', [tx_hash, 1])
+
+    def get_smart_contract_event_by_height(self, height):
+        return self.call('getsmartcodeevent', [height, 1])
+
+    def get_block_height_by_tx_hash(self, tx_hash):
+        return self.call('getblockheightbytxhash', [tx_hash])
+
+    def send_raw_transaction(self, tx):
+        return self.send_raw_transaction_hex(tx.serialize().hex())
+
+    def send_raw_transaction_hex(self, tx_data):
+        data = self.request('sendrawtransaction', [tx_data])
+        if data['error'] != 0:
+            raise SDKException(ErrorCode.other_error(data['result']))
+        return data['result']
+
+    def pre_execute(self, tx):
+        """
+        :return: the pre-execution result with `State`, `Gas` and `Result`.
+        """
+        data = self.request('sendrawtransaction', [tx.serialize().hex(), 1])
+        if data['error'] > 0:
+            raise RuntimeError(data.get('result', 'send raw transaction pre-execute error'))
+        if data['result']['State'] == 0:
+            raise RuntimeError('State = 0')
+        return data['result']
+
+    def send_raw_transaction_pre_exec(self, tx):
+        return self.pre_execute(tx)['Result']
+
+
+class Node(object):
+    def __init__(self, addr):
+        self.addr = addr
+        self.latency = None
+        self.height = None
+        self.failures = 0
+        self.ejected_until = 0
+        self.in_flight = 0
+
+    def stats(self):
+        return {'addr': self.addr, 'latency': self.latency, 'height': self.height, 'failures': self.failures,
+                'ejected': self.ejected_until > time.monotonic(), 'in_flight': self.in_flight}
+
+
+class NodePool(PooledRpcClient):
+    """
+    `PooledRpcClient` over several nodes of one network. Each call goes to the
+    healthy node with the lowest EWMA latency times its in-flight calls, and
+    fails over to the next one on transport errors. A node failing
+    `eject_after` times in a row is ejected for `eject_for` seconds, and a node
+    more than `max_lag` blocks behind the best known height serves nothing,
+    since the reads here all want the latest state. `start` runs a probe that
+    refreshes every node's latency and height, so recovered nodes come back
+    without waiting for live traffic.
+    """
+
+    def __init__(self, addrs, pool_size=16, timeout=10, alpha=0.3, max_lag=2, eject_after=3, eject_for=30,
+                 probe_interval=5):
+        super().__init__(None, pool_size, timeout)
+        self.pool_size = pool_size
+        self.alpha = alpha
+        self.max_lag = max_lag
+        self.eject_after = eject_after
+        self.eject_for = eject_for
+        self.probe_interval = probe_interval
+        self.nodes = list()
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.set_nodes(addrs)
+
+    def set_nodes(self, addrs):
+        """
+        Switches to another set of nodes; `addr` becomes the first of them and
+        names the network, e.g. in cache keys.
+        """
+        old_adapters = set(self.session.adapters.values())
+        adapter = HTTPAdapter(pool_connections=len(addrs), pool_maxsize=self.pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        with self.__lock:
+            self.nodes = [Node(addr) for addr in addrs]
+            self.addr = addrs[0]
+        # drop the connections to the old nodes; calls still on them close theirs when done
+        for old_adapter in old_adapters:
+            old_adapter.close()
+
+    def set_address(self, addr):
+        self.set_nodes([addr])
+
+    def node_addresses(self):
+        with self.__lock:
+            return [node.addr for node in self.nodes]
+
+    def candidates(self):
+        """
+        The nodes in the order a call tries them: healthy ones by score, then
+        the ejected ones as a last resort. Lagging nodes are left out, since
+        their state is older than what the caller may already have seen.
+        """
+        now = time.monotonic()
+        with self.__lock:
+            heights = [node.height for node in self.nodes if node.height is not None]
+            best_height = max(heights) if heights else None
+
+            def current(node):
+                return best_height is None or node.height is None or node.height >= best_height - self.max_lag
+
+            nodes = [node for node in self.nodes if current(node)]
+            ready = [node for node in nodes if node.ejected_until <= now]
+            ready.sort(key=lambda node: (node.latency or 0) * (node.in_flight + 1))
+            ejected = [node for node in nodes if node.ejected_until > now]
+            ejected.sort(key=lambda node: node.ejected_until)
+            return ready + ejected
+
+    def record(self, node, elapsed, height=None):
+        with self.__lock:
+            if elapsed is None:
+                node.failures += 1
+                if node.failures >= self.eject_after and node.ejected_until <= time.monotonic():
+                    node.ejected_until = time.monotonic() + self.eject_for
+                    logger.warning('rpc node %s ejected after %d failures', node.addr, node.failures)
+                return
+            node.failures = 0
+            node.ejected_until = 0
+            node.latency = elapsed if node.latency is None else self.alpha * elapsed + (1 - self.alpha) * node.latency
+            if height is not None:
+                node.height = height
+
+    def request(self, method, params=None):
+        # a broadcast is only sent on to another node when it surely never reached the first one
+        broadcast = method == 'sendrawtransaction' and len(params or ()) == 1
+        error = None
+        for node in self.candidates():
+            with self.__lock:
+                node.in_flight += 1
+            started_at = time.perf_counter()
+            try:
+                response = self.post(node.addr, method, params)
+            except SDKException as e:
+                self.record(node, None)
+                if not is_transport_error(e) or broadcast and not e.args[1].startswith(UNSENT_ERRORS):
+                    raise
+                error = e
+                continue
+            finally:
+                with self.__lock:
+                    node.in_flight -= 1
+            height = response.get('result') if method == 'getblockcount' and response.get('error') == 0 else None
+            self.record(node, time.perf_counter() - started_at, height)
+            return response
+        raise error
+
+    def probe(self, node):
+        started_at = time.perf_counter()
+        try:
+            response = self.post(node.addr, 'getblockcount')
+        except SDKException:
+            self.record(node, None)
+            return
+        self.record(node, time.perf_counter() - started_at, response.get('result'))
+
+    def __probe_loop(self):
+        with ThreadPoolExecutor(max_workers=8, thread_name_prefix='rpc-probe') as executor:
+            while True:
+                with self.__lock:
+                    nodes = list(self.nodes)
+                list(executor.map(self.probe, nodes))
+                if self.__stop.wait(self.probe_interval):
+                    return
+
+    def start(self):
+        threading.Thread(target=self.__probe_loop, name='rpc-probe', daemon=True).start()
+
+    def stop(self):
+        self.__stop.set()
+
+    def stats(self):
+        with self.__lock:
+            return [node.stats() for node in self.nodes]
+
+
+class AsyncRpc(object):
+    """
+    Runs blocking SDK and rpc calls on a bounded worker pool so route handlers
+    can await them and fan out. The pool size is the max number of in-flight
+    calls against the node across all requests.
+    """
+
+    def __init__(self, max_in_flight=16, timeout=10):
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='rpc')
+
+    async def run(self, func, *args, timeout=None):
+        """
+        Awaits `func(*args)` on the worker pool.
+        :param func: blocking callable, e.g. `oep4.balance_of`.
+        :param timeout: per-call timeout in seconds, defaults to the client timeout.
+        """
+        loop = asyncio.get_running_loop()
+        # the worker runs in a copy of the caller's context, so its spans join the caller's trace
+        context = contextvars.copy_context()
+        future = loop.run_in_executor(self.executor, functools.partial(context.run, self.timed, func, *args))
+        try:
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            raise SDKException(ErrorCode.other_error(''.join(['Timeout: ', getattr(func, '__name__', str(func))])))
+
+    def imap_unordered(self, calls, limit, timeout=None):
+        """
+        Runs blocking calls on the worker pool with at most `limit` of them in
+        flight and yields `(key, result)` pairs in completion order. A failed
+        call yields its exception as the result, and a call still running
+        after `timeout` seconds yields a timeout `SDKException`; its worker is
+        left to finish, but the result is dropped.
+        :param calls: dict of key -> `(func, *args)` tuple.
+        :param limit: max number of calls of this batch in flight.
+        :param timeout: per-call timeout in seconds, defaults to the client timeout.
+        """
+        timeout = timeout or self.timeout
+        calls = iter(calls.items())
+        pending = dict()
+        while True:
+            for key, call in itertools.islice(calls, limit - len(pending)):
+                future = self.executor.submit(contextvars.copy_context().run, self.timed, *call)
+                pending[future] = (key, time.monotonic() + timeout, getattr(call[0], '__name__', str(call[0])))
+            if not pending:
+                return
+            next_deadline = min(deadline for _, deadline, _ in pending.values())
+            done, _ = wait(pending, max(0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            for future in done:
+                key, _, _ = pending.pop(future)
+                try:
+                    yield key, future.result()
+                except Exception as e:
+                    yield key, e
+            now = time.monotonic()
+            for future in [future for future, (_, deadline, _) in pending.items() if deadline <= now]:
+                key, _, name = pending.pop(future)
+                future.cancel()
+                yield key, SDKException(ErrorCode.other_error(''.join(['Timeout: ', name])))
+
+    @staticmethod
+    def timed(func, *args):
+        name = getattr(func, '__name__', 'unknown')
+        RPC_CALLS_IN_FLIGHT.inc(name)
+        started_at = time.perf_counter()
+        try:
+            with span('call', call=name):
+                return func(*args)
+        finally:
+            RPC_CALL_DURATION.observe(name, time.perf_counter() - started_at)
+            RPC_CALLS_IN_FLIGHT.dec(name)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,63 @@
+import asyncio
+import base64
+from concurrent.futures import ProcessPoolExecutor
+
+from ontology.account.account import Account
+from ontology.common.error_code import ErrorCode
+from ontology.exception.exception import SDKException
+
+
+def decrypt_private_key(key, password, b58_address, salt, n, scheme):
+    """
+    Runs the wallet's scrypt + AES-GCM decryption in a worker process. Errors
+    are returned instead of raised because `SDKException` cannot be unpickled.
+    :return: (hex private key, None) or (None, (error code, error desc)).
+    """
+    try:
+        return Account.get_gcm_decoded_private_key(key, password, b58_address, salt, n, scheme), None
+    except SDKException as e:
+        return None, e.args
+    except RuntimeError:
+        return None, (ErrorCode.decrypt_encrypted_private_key_error['error'], 'password does not match the address')
+
+
+class SignerPool(object):
+    """
+    Decrypts wallet accounts on a process pool, so a transaction with many
+    signers spends its key derivation on all cores instead of one.
+    """
+
+    def __init__(self, max_workers=None):
+        self.__executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    @staticmethod
+    def __account_params(wallet_manager, b58_address):
+        wallet = wallet_manager.wallet_in_mem
+        for account_data in wallet.accounts:
+            if account_data.address == b58_address:
+                salt = base64.b64decode(account_data.salt)
+                return account_data.key, b58_address, salt, wallet.scrypt.get_n()
+        raise SDKException(ErrorCode.other_error(''.join(['account not found: ', b58_address])))
+
+    async def decrypt_accounts(self, wallet_manager, credentials):
+        """
+        :param credentials: list of (b58 address, password) pairs; duplicates
+        are decrypted once.
+        :return: dict of b58 address -> `Account`.
+        """
+        credentials = list(dict.fromkeys(credentials))
+        futures = list()
+        for b58_address, password in credentials:
+            key, address, salt, n = self.__account_params(wallet_manager, b58_address)
+            future = self.__executor.submit(decrypt_private_key, key, password, address, salt, n,
+                                            wallet_manager.scheme)
+            futures.append(asyncio.wrap_future(future))
+        accounts = dict()
+        for (b58_address, _), (private_key, error) in zip(credentials, await asyncio.gather(*futures)):
+            if error is not None:
+                raise SDKException(ErrorCode.get_error(*error))
+            accounts[b58_address] = Account(private_key, wallet_manager.scheme)
+        return accounts
+
+    def shutdown(self):
+        self.__executor.shutdown(wait=False)
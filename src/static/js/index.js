@@ -1,3 +1,17 @@
+// the network and contract every request is made against, the server keeps no such state
+let target = {network: 'TestNet', contract_address: ''};
+// how long to wait on the event stream for a transaction, like the server's TX_CONFIRM_TIMEOUT
+const TX_WATCH_TIMEOUT = 300000;
+axios.interceptors.request.use(config => {
+    if (config.method === 'get') {
+        config.params = Object.assign({}, target, config.params);
+    }
+    else {
+        config.data = Object.assign({}, target, config.data);
+    }
+    return config;
+});
+
 new Vue({
     el: '#vue-app',
     data: function () {
@@ -66,6 +80,55 @@ new Vue({
         }
     },
     methods: {
+        watchTransaction(tx_hash) {
+            let url = Flask.url_for('event_stream', {'tx_hash': tx_hash});
+            let source = new EventSource(url);
+            let timer = setTimeout(() => {
+                source.close();
+                this.$notify({
+                    title: 'Transaction not seen yet',
+                    type: 'warning',
+                    message: tx_hash.concat(' is not in a block after ', TX_WATCH_TIMEOUT / 60000, ' minutes'),
+                    duration: 4000
+                });
+            }, TX_WATCH_TIMEOUT);
+            source.addEventListener('transaction', (event) => {
+                clearTimeout(timer);
+                source.close();
+                let tx = JSON.parse(event.data);
+                this.$notify({
+                    title: tx.state === 1 ? 'Transaction confirmed' : 'Transaction failed',
+                    type: tx.state === 1 ? 'success' : 'error',
+                    message: tx.tx_hash.concat(' at height ', tx.height),
+                    duration: 4000
+                });
+            });
+        },
+        watchJob(job_id) {
+            let url = Flask.url_for('event_stream', {'job_id': job_id, 'network': target.network});
+            let source = new EventSource(url);
+            let notified = false;
+            source.addEventListener('job', (event) => {
+                let job = JSON.parse(event.data);
+                if (job.status === 'broadcast' && !notified) {
+                    notified = true;
+                    this.$message({
+                        type: 'success',
+                        message: 'TxHash： '.concat(job.tx_hash).concat('!'),
+                        duration: 2000
+                    });
+                }
+                if (job.status === 'confirmed' || job.status === 'failed') {
+                    source.close();
+                    this.$notify({
+                        title: job.status === 'confirmed' ? 'Transaction confirmed' : 'Transaction failed',
+                        type: job.status === 'confirmed' ? 'success' : 'error',
+                        message: job.status === 'confirmed' ? job.tx_hash.concat(' at height ', job.height) : job.error,
+                        duration: 4000
+                    });
+                }
+            });
+        },
         async submitMultiTransferForm(formName) {
             if (formName === "multiTransferForm") {
                 let valid = await this.$refs[formName].validate();
@@ -119,11 +182,14 @@ new Vue({
                         });
                         let tx_hash = response.data.result;
                         if (tx_hash.length === 64) {
+                            // 202: the broadcast timed out, so the transfer may or may not land
                             this.$message({
-                                type: 'success',
-                                message: 'Transfer successfully： '.concat(tx_hash).concat('!'),
+                                type: response.status === 202 ? 'warning' : 'success',
+                                message: (response.status === 202 ? 'Transfer status unknown： ' :
+                                    'Transfer successfully： ').concat(tx_hash).concat('!'),
                                 duration: 2000
                             });
+                            this.watchTransaction(tx_hash);
                         }
                         else {
                             this.$message({
@@ -315,21 +381,12 @@ new Vue({
                     b58_to_address: this.transferFromForm.toAddress,
                     amount: Number(this.transferFromForm.amount)
                 });
-                let tx_hash = response.data.result;
-                if (tx_hash.length === 64) {
-                    this.$message({
-                        type: 'success',
-                        message: 'Transfer successfully： '.concat(tx_hash).concat('!'),
-                        duration: 2000
-                    });
-                }
-                else {
-                    this.$message({
-                        type: 'error',
-                        message: 'Transfer failed!',
-                        duration: 800
-                    });
-                }
+                this.$message({
+                    type: 'success',
+                    message: 'Transfer queued!',
+                    duration: 2000
+                });
+                this.watchJob(response.data.result);
             } catch (error) {
                 if (error.response.status === 400 || error.response.status === 500) {
                     this.$notify({
@@ -480,6 +537,7 @@ new Vue({
                 let response = await axios.post(change_net_url, {
                     network_selected: value[0]
                 });
+                target.network = value[0];
                 this.$notify({
                     title: 'Network Change',
                     type: 'success',
@@ -487,7 +545,7 @@ new Vue({
                     duration: 2000
                 });
             } catch (error) {
-                this.settingForm.networkSelected = ['TestNet'];
+                this.settingForm.networkSelected = [target.network];
                 if (error.response.status === 400) {
                     this.$notify({
                         title: 'Network Change',
@@ -544,6 +602,7 @@ new Vue({
                 let response = await axios.post(change_contract_url, {
                     'contract_address': hex_contract_address
                 });
+                target.contract_address = response.data.result;
                 this.$message({
                     type: 'success',
                     message: 'change contract address successful!',
@@ -588,21 +647,12 @@ new Vue({
                         b58_to_address: this.transferForm.inputTransferTo,
                         amount: this.transferForm.inputTransferAmount
                     });
-                    let tx_hash = response.data.result;
-                    if (tx_hash.length === 64) {
-                        this.$message({
-                            type: 'success',
-                            message: 'Transfer successfully： '.concat(tx_hash).concat('!'),
-                            duration: 2000
-                        });
-                    }
-                    else {
-                        this.$message({
-                            type: 'error',
-                            message: 'Transfer failed!',
-                            duration: 800
-                        });
-                    }
+                    this.$message({
+                        type: 'success',
+                        message: 'Transfer queued!',
+                        duration: 2000
+                    });
+                    this.watchJob(response.data.result);
                 } catch (error) {
                     if (error.response.status === 400 || error.response.status === 500) {
                         this.$notify({
@@ -713,12 +763,12 @@ new Vue({
                     'b58_spender_address': this.inputApproveSpender,
                     'amount': Number(this.inputApproveAmount)
                 });
-                let tx_hash = response.data.result;
                 this.$message({
                     type: 'success',
-                    message: 'TxHash： '.concat(tx_hash).concat('!'),
+                    message: 'Approve queued!',
                     duration: 2000
                 });
+                this.watchJob(response.data.result);
             } catch (error) {
                 if (error.response.status === 400 || error.response.status === 500) {
                     this.$notify({
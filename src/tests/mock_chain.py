@@ -0,0 +1,59 @@
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+from ontology.account.account import Account
+from ontology.common.address import Address
+from ontology.crypto.signature_scheme import SignatureScheme
+
+from contract_tx import make_invoke_transaction, sign_transaction
+
+# the mock node and the simulator live with the contracts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                'contracts'))
+
+from mock_node import DEFAULT_SPKZ_ADDRESS, Faults, make_handler, make_node  # noqa: E402
+
+GAS_LIMIT = 20000000
+GAS_PRICE = 500
+
+
+def new_account():
+    return Account(os.urandom(32).hex(), SignatureScheme.SHA256withECDSA)
+
+
+class MockChain(object):
+    """
+    A mock node serving on a free local port for the length of a test.
+    :param funds: list of (base58 address, whole SPKZ tokens).
+    :param faults: `Faults` injected into the responses.
+    """
+
+    def __init__(self, funds=(), block_interval=0, faults=None, balances=None):
+        self.node = make_node(funds=funds, block_interval=block_interval, balances=balances)
+        self.faults = faults or Faults()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(self.node, self.faults))
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.contract_address = bytes.fromhex(DEFAULT_SPKZ_ADDRESS)[::-1]
+        self.node.start()
+        threading.Thread(target=self.server.serve_forever, name='mock-chain', daemon=True).start()
+
+    def transfer(self, account, b58_to_address, value, operation='transfer'):
+        """
+        :return: a signed SPKZ transfer of `value` units from `account`.
+        """
+        from_address = account.get_address().to_array()
+        tx = make_invoke_transaction(self.contract_address, operation,
+                                     [from_address, Address.b58decode(b58_to_address).to_array(), value],
+                                     from_address, GAS_LIMIT, GAS_PRICE)
+        return sign_transaction(tx, [account])
+
+    def balance_of(self, b58_address):
+        return self.node.sim.invoke(DEFAULT_SPKZ_ADDRESS, 'balanceOf',
+                                    [Address.b58decode(b58_address).to_array()])['Result']
+
+    def close(self):
+        self.node.stop()
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+
+from ontology.exception.exception import SDKException
+
+from event_indexer import EventIndexer, decode_block_events, decode_tx_event
+from rpc_client import PooledRpcClient
+
+from tests.mock_chain import DEFAULT_SPKZ_ADDRESS, MockChain, new_account
+
+
+class FlakyEvents(PooledRpcClient):
+    """
+    Answers the first `failures` block scans at `height` with an event
+    missing its `TxHash`, the way a misbehaving node might.
+    """
+
+    def __init__(self, addr, height, failures):
+        super().__init__(addr)
+        self.height = height
+        self.failures = failures
+
+    def get_smart_contract_event_by_height(self, height):
+        if height == self.height and self.failures > 0:
+            self.failures -= 1
+            return [{'State': 1, 'GasConsumed': 0,
+                     'Notify': [{'ContractAddress': DEFAULT_SPKZ_ADDRESS, 'States': []}]}]
+        return super().get_smart_contract_event_by_height(height)
+
+
+class BackfillTest(unittest.TestCase):
+
+    def setUp(self):
+        self.account = new_account()
+        self.chain = MockChain(funds=[(self.account.get_address_base58(), 1000)])
+        self.recipients = [new_account().get_address_base58() for _ in range(4)]
+        rpc_client = PooledRpcClient(self.chain.url)
+        for b58_address in self.recipients:
+            rpc_client.send_raw_transaction_hex(self.chain.transfer(self.account, b58_address, 5).serialize().hex())
+        self.db_path = os.path.join(tempfile.mkdtemp(), 'events.db')
+
+    def tearDown(self):
+        self.chain.close()
+
+    def test_malformed_chunk_is_retried(self):
+        indexer = EventIndexer(self.db_path, FlakyEvents(self.chain.url, 2, 2), [DEFAULT_SPKZ_ADDRESS])
+        self.assertEqual(indexer.backfill(chunk_size=2, max_workers=2, backoff=0.01), 5)
+        self.assertEqual(indexer.last_height(), 4)
+        for b58_address in self.recipients:
+            self.assertEqual(indexer.get_balance(indexer.connection(), DEFAULT_SPKZ_ADDRESS, b58_address), 5)
+
+    def test_chunk_failing_every_retry_stops_the_backfill(self):
+        indexer = EventIndexer(self.db_path, FlakyEvents(self.chain.url, 2, 10), [DEFAULT_SPKZ_ADDRESS])
+        with self.assertRaises(SDKException) as context:
+            indexer.backfill(chunk_size=2, max_workers=2, max_retries=3, backoff=0.01)
+        self.assertIn('failed 4 times', context.exception.args[1])
+        # the chunk before the failing one is checkpointed
+        self.assertEqual(indexer.last_height(), 1)
+
+
+class HolderReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.accounts = [new_account() for _ in range(2)]
+        self.chain = MockChain(funds=[(account.get_address_base58(), 100) for account in self.accounts])
+        self.rpc_client = PooledRpcClient(self.chain.url)
+        self.indexer = EventIndexer(os.path.join(tempfile.mkdtemp(), 'events.db'), self.rpc_client,
+                                    [DEFAULT_SPKZ_ADDRESS])
+        # the mock node puts the funds in storage without a `transfer` event, so seed them the same way
+        conn = self.indexer.connection()
+        for account in self.accounts:
+            self.indexer.safe_put_balance(conn, DEFAULT_SPKZ_ADDRESS, account.get_address_base58(), 0, 100 * 10 ** 8)
+        conn.commit()
+
+    def tearDown(self):
+        self.chain.close()
+
+    def send(self, account, b58_to_address, value):
+        self.rpc_client.send_raw_transaction_hex(self.chain.transfer(account, b58_to_address, value).serialize().hex())
+
+    def assertIndexed(self, b58_addresses):
+        conn = self.indexer.connection()
+        for b58_address in b58_addresses:
+            self.assertEqual(self.indexer.get_balance(conn, DEFAULT_SPKZ_ADDRESS, b58_address),
+                             self.chain.balance_of(b58_address))
+        self.assertEqual(self.indexer.holder_count(DEFAULT_SPKZ_ADDRESS), len(b58_addresses))
+
+    def test_replayed_blocks_are_skipped(self):
+        payer, payee = self.accounts[0], self.accounts[1].get_address_base58()
+        newcomer = new_account().get_address_base58()
+        self.send(payer, payee, 7)
+        self.send(payer, newcomer, 5)
+        # more than the payer holds, so it fails and moves nothing
+        self.send(payer, payee, 10 ** 12)
+        self.assertEqual(self.indexer.sync(), 4)
+        holders = [payer.get_address_base58(), payee, newcomer]
+        self.assertIndexed(holders)
+
+        conn = self.indexer.connection()
+        for height in range(self.indexer.last_height() + 1):
+            tx_events = self.rpc_client.get_smart_contract_event_by_height(height)
+            self.assertFalse(self.indexer.write_block(conn, height,
+                                                      *decode_block_events(height, tx_events, {DEFAULT_SPKZ_ADDRESS})))
+        conn.commit()
+        self.assertIndexed(holders)
+
+        # sending everything away drops the holder
+        self.send(self.accounts[1], newcomer, self.chain.balance_of(payee))
+        self.assertEqual(self.indexer.sync(), 1)
+        self.assertIndexed([payer.get_address_base58(), newcomer])
+
+    def test_node_lookup_matches_the_index(self):
+        payer, payee = self.accounts[0], self.accounts[1].get_address_base58()
+        # the second one overdraws, so it fails
+        txs = [self.chain.transfer(payer, payee, 7), self.chain.transfer(payer, payee, 10 ** 12)]
+        for tx in txs:
+            self.rpc_client.send_raw_transaction_hex(tx.serialize().hex())
+        tx_hashes = [tx.hash256_explorer() for tx in txs]
+        self.indexer.sync()
+        indexed = self.indexer.transaction_events(tx_hashes)
+        events = [decode_tx_event(self.rpc_client.get_smart_contract_event_by_tx_hash(tx_hash), {DEFAULT_SPKZ_ADDRESS})
+                  for tx_hash in tx_hashes]
+        # the node's ONG fee notify is left out like in the index
+        events[0]['height'] = indexed[tx_hashes[0]]['height']
+        self.assertEqual(events[0], indexed[tx_hashes[0]])
+        self.assertEqual(len(events[0]['Notify']), 1)
+        # a failed transaction has no SPKZ notify, so it is only ever looked up on the node
+        self.assertNotIn(tx_hashes[1], indexed)
+        self.assertEqual(events[1]['State'], 0)
+        self.assertEqual(events[1]['Notify'], list())
+
+if __name__ == '__main__':
+    unittest.main()
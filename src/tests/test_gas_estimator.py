@@ -0,0 +1,74 @@
+import unittest
+
+from contract_tx import make_invoke_transaction, sign_transaction
+from gas_estimator import GasEstimator
+from rpc_client import PooledRpcClient
+
+from tests.mock_chain import GAS_LIMIT, GAS_PRICE, MockChain, new_account
+
+
+class FixedCostNode(object):
+    """
+    Pre-executes `(size, gas limit)` stand-ins for transactions at a fixed
+    cost per call plus a cost per item, like a real node's `transferMulti`,
+    which the mock node's gas schedule has no fixed part for.
+    """
+
+    fixed = 11642
+    per_item = 6275
+
+    def cost(self, size):
+        return self.fixed + self.per_item * size
+
+    def pre_execute(self, tx):
+        return {'Gas': self.cost(tx[0])}
+
+
+class GasEstimatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.account = new_account()
+        self.chain = MockChain(funds=[(self.account.get_address_base58(), 1000000)])
+        self.rpc_client = PooledRpcClient(self.chain.url)
+        self.recipients = [new_account().get_address().to_array() for _ in range(64)]
+
+    def tearDown(self):
+        self.chain.close()
+
+    def build(self, size):
+        from_address = self.account.get_address().to_array()
+        transfers = [[from_address, to_address, 1] for to_address in self.recipients[:size]]
+
+        def sign(limit):
+            tx = make_invoke_transaction(self.chain.contract_address, 'transferMulti', transfers, from_address,
+                                         limit, GAS_PRICE)
+            return sign_transaction(tx, [self.account])
+
+        return sign
+
+    def test_cached_estimate_covers_every_batch_size(self):
+        # no margin, so a limit below the cost shows as a failed transaction
+        estimator = GasEstimator(margin=1, max_gas_limit=GAS_LIMIT)
+        # the largest batches first, so a smaller one could reuse their estimates
+        for size in range(64, 0, -1):
+            estimator.estimate(self.rpc_client, ('transferMulti',), size, self.build(size))
+            tx, gas = estimator.estimate(self.rpc_client, ('transferMulti',), size, self.build(size))
+            self.assertIsNone(gas)
+            tx_hash = self.rpc_client.send_raw_transaction(tx)
+            event = self.rpc_client.get_smart_contract_event_by_tx_hash(tx_hash)
+            self.assertEqual(event['State'], 1, 'batch of {} ran out of gas'.format(size))
+            self.assertGreaterEqual(tx.gas_limit, event['GasConsumed'])
+
+    def test_fixed_cost_is_not_spread_over_smaller_batches(self):
+        node = FixedCostNode()
+        estimator = GasEstimator(margin=1, max_gas_limit=GAS_LIMIT)
+        for size in range(64, 0, -1):
+            estimator.estimate(node, ('transferMulti',), size, lambda limit: (size, limit))
+        for size in range(1, 65):
+            (_, gas_limit), gas = estimator.estimate(node, ('transferMulti',), size, lambda limit: (size, limit))
+            self.assertIsNone(gas)
+            self.assertGreaterEqual(gas_limit, node.cost(size))
+
+
+if __name__ == '__main__':
+    unittest.main()
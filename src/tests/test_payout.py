@@ -0,0 +1,73 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from payout import Payout, PayoutJournal
+from rpc_client import PooledRpcClient
+
+from tests.mock_chain import GAS_LIMIT, GAS_PRICE, MockChain, new_account
+
+
+class CrashAfterBroadcast(PooledRpcClient):
+    """
+    Broadcasts the `crash_at`th transaction and then dies before the payout
+    can record it, like a process killed right after the node accepted it.
+    """
+
+    def __init__(self, addr, crash_at):
+        super().__init__(addr)
+        self.crash_at = crash_at
+        self.broadcasts = 0
+
+    def send_raw_transaction_hex(self, tx_data):
+        result = super().send_raw_transaction_hex(tx_data)
+        self.broadcasts += 1
+        if self.broadcasts == self.crash_at:
+            raise SystemExit('killed')
+        return result
+
+
+class PayoutResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.payer = new_account()
+        # blocks only come when the test produces them, so nothing is confirmed at the crash
+        self.chain = MockChain(funds=[(self.payer.get_address_base58(), 1000)], block_interval=3600)
+        self.recipients = [(new_account().get_address_base58(), '1.5') for _ in range(7)]
+        self.journal_path = os.path.join(tempfile.mkdtemp(), 'payout.checkpoint.jsonl')
+        self.header = {'payout': 'test'}
+
+    def tearDown(self):
+        self.chain.close()
+
+    def payout(self, rpc_client):
+        return Payout(rpc_client, self.chain.contract_address, self.payer, 3, GAS_LIMIT, GAS_PRICE,
+                      PayoutJournal(self.journal_path, self.header), sign_processes=1, submit_concurrency=1,
+                      confirm_interval=0.05, confirm_timeout=5)
+
+    def test_resume_pays_everyone_once(self):
+        crashed = self.payout(CrashAfterBroadcast(self.chain.url, 2))
+        with self.assertRaises(SystemExit):
+            crashed.run(crashed.batches(self.recipients, 8))
+        crashed.journal.close()
+        signed = {batch: state['tx_hash'] for batch, state in crashed.journal.batches.items()}
+        self.assertIn('signed', [state['status'] for state in crashed.journal.batches.values()])
+
+        resumed = self.payout(PooledRpcClient(self.chain.url))
+        timer = threading.Timer(1, self.chain.node.produce_block)
+        timer.start()
+        try:
+            self.assertEqual(resumed.run(resumed.batches(self.recipients, 8)), {'confirmed': 3})
+        finally:
+            timer.cancel()
+        resumed.journal.close()
+        # the batches signed before the crash went out as the very same transactions
+        for batch, tx_hash in signed.items():
+            self.assertEqual(resumed.journal.batches[batch]['tx_hash'], tx_hash)
+        for b58_address, _ in self.recipients:
+            self.assertEqual(self.chain.balance_of(b58_address), 150000000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ontology.exception.exception import SDKException
+
+from rpc_client import NodePool, is_transport_error
+
+from tests.mock_chain import MockChain
+
+
+class BadGateway(BaseHTTPRequestHandler):
+    """
+    A proxy in front of a dead node: an HTML 502 page for every request.
+    """
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = b'<html><body>502 Bad Gateway</body></html>'
+        self.send_response(502)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class NodePoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.proxy = ThreadingHTTPServer(('127.0.0.1', 0), BadGateway)
+        threading.Thread(target=self.proxy.serve_forever, daemon=True).start()
+        self.proxy_url = 'http://127.0.0.1:{}'.format(self.proxy.server_address[1])
+        self.chain = MockChain()
+
+    def tearDown(self):
+        self.chain.close()
+        self.proxy.shutdown()
+        self.proxy.server_close()
+
+    def test_http_error_is_a_transport_error(self):
+        pool = NodePool([self.proxy_url])
+        with self.assertRaises(SDKException) as context:
+            pool.get_block_count()
+        self.assertTrue(is_transport_error(context.exception))
+
+    def test_bad_gateway_fails_over(self):
+        pool = NodePool([self.proxy_url, self.chain.url], eject_after=1)
+        for _ in range(3):
+            self.assertEqual(pool.get_block_count(), 1)
+        stats = {item['addr']: item for item in pool.stats()}
+        self.assertTrue(stats[self.proxy_url]['ejected'])
+        self.assertFalse(stats[self.chain.url]['ejected'])
+
+
+if __name__ == '__main__':
+    unittest.main()
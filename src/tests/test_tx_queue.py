@@ -0,0 +1,134 @@
+import time
+import unittest
+
+from ontology.common.error_code import ErrorCode
+from ontology.exception.exception import SDKException
+
+from rpc_client import PooledRpcClient
+from tx_queue import BROADCAST, CONFIRMED, FAILED, TxQueue
+
+from tests.mock_chain import MockChain, new_account
+
+
+class MalformedEvents(PooledRpcClient):
+    """
+    Answers every block scan with an event missing its `TxHash`, and the
+    first block count with a body that is no JSON-RPC at all.
+    """
+
+    def __init__(self, addr):
+        super().__init__(addr)
+        self.block_counts = 0
+
+    def get_block_count(self):
+        self.block_counts += 1
+        if self.block_counts == 1:
+            raise ValueError('Expecting value: line 1 column 1 (char 0)')
+        return super().get_block_count()
+
+    def get_smart_contract_event_by_height(self, height):
+        return [{'State': 1, 'GasConsumed': 0, 'Notify': []}]
+
+
+class DroppedBroadcasts(PooledRpcClient):
+    """
+    Loses the connection on the first `drops` broadcasts before they reach
+    the node.
+    """
+
+    def __init__(self, addr, drops):
+        super().__init__(addr)
+        self.drops = drops
+        self.broadcasts = 0
+
+    def send_raw_transaction_hex(self, tx_data):
+        self.broadcasts += 1
+        if self.broadcasts <= self.drops:
+            raise SDKException(ErrorCode.other_error(''.join(['ConnectionError: ', self.addr])))
+        return super().send_raw_transaction_hex(tx_data)
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TxQueueTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.account = new_account()
+        self.chain = MockChain(funds=[(self.account.get_address_base58(), 1000)])
+
+    def tearDown(self):
+        self.chain.close()
+
+    def test_malformed_events_do_not_stop_the_tracker(self):
+        tx_queue = TxQueue(MalformedEvents(self.chain.url), workers=1, poll_interval=0.05, confirm_timeout=0.5)
+        tx_queue.start()
+        try:
+            job_id = tx_queue.submit(lambda: self.chain.transfer(self.account, new_account().get_address_base58(), 1))
+            self.assertTrue(wait_for(lambda: tx_queue.status(job_id)['status'] != 'queued'))
+            self.assertEqual(tx_queue.status(job_id)['status'], BROADCAST)
+            # the block scan never sees the job, so it settles by hash once it expires
+            self.assertTrue(wait_for(lambda: tx_queue.status(job_id)['status'] == CONFIRMED))
+        finally:
+            tx_queue.stop()
+
+
+
+class TxQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.account = new_account()
+        self.b58_to_address = new_account().get_address_base58()
+
+    def tearDown(self):
+        self.chain.close()
+
+    def start(self, rpc_client, **kwargs):
+        tx_queue = TxQueue(rpc_client, workers=1, backoff=0.01, poll_interval=0.05, **kwargs)
+        tx_queue.start()
+        self.addCleanup(tx_queue.stop)
+        return tx_queue
+
+    def test_broadcast_is_retried_after_transport_errors(self):
+        self.chain = MockChain(funds=[(self.account.get_address_base58(), 1000)], block_interval=0.2)
+        tx_queue = self.start(DroppedBroadcasts(self.chain.url, 2), max_attempts=3)
+        job_id = tx_queue.submit(lambda: self.chain.transfer(self.account, self.b58_to_address, 5))
+        self.assertTrue(wait_for(lambda: tx_queue.status(job_id)['status'] == CONFIRMED))
+        job = tx_queue.status(job_id)
+        self.assertEqual(job['attempts'], 3)
+        self.assertIsNotNone(job['height'])
+        self.assertEqual(self.chain.balance_of(self.b58_to_address), 5)
+
+    def test_broadcast_fails_after_max_attempts(self):
+        self.chain = MockChain(funds=[(self.account.get_address_base58(), 1000)], block_interval=0.2)
+        tx_queue = self.start(DroppedBroadcasts(self.chain.url, 3), max_attempts=3)
+        job_id = tx_queue.submit(lambda: self.chain.transfer(self.account, self.b58_to_address, 5))
+        self.assertTrue(wait_for(lambda: tx_queue.status(job_id)['status'] == FAILED))
+        self.assertIn('ConnectionError', tx_queue.status(job_id)['error'])
+        self.assertEqual(self.chain.balance_of(self.b58_to_address), 0)
+
+    def test_reverted_transaction_settles_as_failed(self):
+        self.chain = MockChain(funds=[(self.account.get_address_base58(), 1000)], block_interval=0.2)
+        tx_queue = self.start(PooledRpcClient(self.chain.url))
+        # more than the account holds
+        job_id = tx_queue.submit(lambda: self.chain.transfer(self.account, self.b58_to_address, 10 ** 12))
+        self.assertTrue(wait_for(lambda: tx_queue.status(job_id)['status'] == FAILED))
+        self.assertIsNotNone(tx_queue.status(job_id)['height'])
+
+    def test_unconfirmed_transaction_expires(self):
+        # no block is produced while the test runs
+        self.chain = MockChain(funds=[(self.account.get_address_base58(), 1000)], block_interval=3600)
+        tx_queue = self.start(PooledRpcClient(self.chain.url), confirm_timeout=0.5)
+        job_id = tx_queue.submit(lambda: self.chain.transfer(self.account, self.b58_to_address, 5))
+        self.assertTrue(wait_for(lambda: tx_queue.status(job_id)['status'] == FAILED))
+        self.assertEqual(tx_queue.status(job_id)['error'], 'not confirmed in time')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,31 +1,115 @@
 import os
-
-from flask import Flask, request, send_from_directory, render_template, url_for
+import queue
+import re
+import secrets
+import threading
+import time
+from decimal import Decimal
+
+from flask import Flask, Response, g, request, send_from_directory, render_template, url_for
 from flask_jsglue import JSGlue
 from flask import json
 
 from ontology.wallet.wallet_manager import WalletManager
 from ontology.exception.exception import SDKException
-from ontology.ont_sdk import OntologySdk
+from ontology.common.error_code import ErrorCode
+from ontology.common.address import Address
 from ontology.utils import util
 
+from rpc_client import PooledRpcClient, NodePool, AsyncRpc, is_call_timeout, is_transport_error
+from metadata_cache import MetadataCache
+from event_indexer import EventIndexer, decode_tx_event
+from event_feed import EventFeed
+from account_sessions import AccountSessions
+from signer_pool import SignerPool
+from payout import Payout, PayoutJournal, journal_header, max_batch_size, read_recipients
+from contract_tx import make_invoke_transaction, sign_transaction
+from tx_queue import TxQueue
+from gas_estimator import GasEstimator
+from client_registry import ClientRegistry, InvalidTarget
+from metrics import REGISTRY, REQUEST_DURATION, REQUEST_ERRORS, REQUESTS_IN_FLIGHT, CallbackGauge
+from tracing import TRACER, current_span, span
+
 static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
 template_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'html')
 app = Flask('SpokkzCoin', static_folder=static_folder, template_folder=template_folder)
 app.config.from_object('default_settings')
 jsglue = JSGlue()
 jsglue.init_app(app)
-
-sdk = OntologySdk()
-sdk.set_rpc(app.config['DEFAULT_REMOTE_RPC_ADDRESS'])
-oep4 = sdk.neo_vm().oep4()
-oep4.set_contract_address(app.config['DEFAULT_CONTRACT_ADDRESS'])
+event_feed = EventFeed()
+
+
+def make_tx_queue(rpc_client):
+    tx_queue = TxQueue(rpc_client, app.config['TX_QUEUE_WORKERS'], app.config['TX_MAX_ATTEMPTS'],
+                       app.config['TX_RETRY_BACKOFF'], poll_interval=app.config['TX_CONFIRM_POLL_INTERVAL'],
+                       confirm_timeout=app.config['TX_CONFIRM_TIMEOUT'])
+    tx_queue.listeners.append(event_feed.publish_job)
+    return tx_queue
+
+
+clients = ClientRegistry(
+    app.config['RPC_NODES'],
+    lambda addrs: NodePool(addrs, app.config['RPC_MAX_IN_FLIGHT'], app.config['RPC_TIMEOUT'],
+                           app.config['RPC_EWMA_ALPHA'], app.config['RPC_MAX_LAG'], app.config['RPC_EJECT_AFTER'],
+                           app.config['RPC_EJECT_FOR'], app.config['RPC_PROBE_INTERVAL']),
+    make_tx_queue,
+    app.config['MAX_CONTRACT_CLIENTS'])
+rpc = AsyncRpc(max_in_flight=app.config['RPC_MAX_IN_FLIGHT'], timeout=app.config['RPC_TIMEOUT'])
+metadata_cache = MetadataCache(ttl=app.config['METADATA_CACHE_TTL'])
 gas_price = app.config['GAS_PRICE']
 gas_limit = app.config['GAS_LIMIT']
+gas_estimator = GasEstimator(app.config['GAS_MARGIN'], app.config['MIN_GAS_LIMIT'], gas_limit,
+                             app.config['GAS_ESTIMATE_TTL'])
 wallet_manager = WalletManager()
 wallet_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'wallet', 'wallet_local.dat')
 if os.path.isfile(wallet_path):
     wallet_manager.open_wallet(wallet_path)
+account_sessions = AccountSessions(app.config['SESSION_IDLE_TIMEOUT'], app.config['SESSION_MAX_LIFETIME'],
+                                   app.config['SESSION_MAX_ACCOUNTS'])
+signer_pool = SignerPool(app.config['SIGNER_POOL_PROCESSES'])
+event_indexer = None
+if app.config['EVENT_INDEXER_ENABLED']:
+    event_index_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    app.config['EVENT_INDEX_DB'])
+    event_indexer = EventIndexer(event_index_path, PooledRpcClient(app.config['DEFAULT_REMOTE_RPC_ADDRESS']),
+                                 app.config['EVENT_INDEX_CONTRACTS'], app.config['EVENT_INDEX_START_HEIGHT'])
+if event_indexer is not None:
+    event_indexer.listeners.append(event_feed.publish_block)
+payout_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), app.config['PAYOUT_DIR'])
+payouts = dict()
+
+
+def cache_metrics():
+    stats = metadata_cache.stats()
+    return {'hit': stats['hits'], 'miss': stats['misses']}
+
+
+def node_metrics(field):
+    return {(network.name, node['addr']): float(node[field] or 0) for network in clients.networks()
+            for node in network.rpc.stats()}
+
+
+def tx_job_metrics():
+    return {(network.name, status): count for network in clients.networks()
+            for status, count in network.tx_queue.counts().items()}
+
+
+REGISTRY.register(CallbackGauge('metadata_cache_lookups', 'Token metadata cache lookups by result.', ('result',),
+                                cache_metrics))
+REGISTRY.register(CallbackGauge('metadata_cache_hit_ratio', 'Token metadata cache hit ratio.', (),
+                                lambda: {(): metadata_cache.stats()['hit_ratio']}))
+REGISTRY.register(CallbackGauge('rpc_node_latency_seconds', 'EWMA latency of each rpc node.', ('network', 'node'),
+                                lambda: node_metrics('latency')))
+REGISTRY.register(CallbackGauge('rpc_node_in_flight', 'Requests in flight to each rpc node.', ('network', 'node'),
+                                lambda: node_metrics('in_flight')))
+REGISTRY.register(CallbackGauge('rpc_node_ejected', 'Whether each rpc node is ejected.', ('network', 'node'),
+                                lambda: node_metrics('ejected')))
+REGISTRY.register(CallbackGauge('tx_jobs', 'Queued transaction jobs by status.', ('network', 'status'),
+                                tx_job_metrics))
+REGISTRY.register(CallbackGauge('unlocked_sessions', 'Unlocked account sessions.', (),
+                                lambda: {(): len(account_sessions)}))
+REGISTRY.register(CallbackGauge('event_stream_subscribers', 'Open event stream connections.', (),
+                                lambda: {(): event_feed.subscriber_count()}))
 
 
 @app.route('/')
@@ -39,6 +123,99 @@ def favicon():
                                mimetype='image/vnd.microsoft.icon')
 
 
+@app.before_request
+def start_request_metrics():
+    g.started_at = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc(request.endpoint or 'unknown')
+
+
+@app.before_request
+def start_trace():
+    g.trace_id = secrets.token_hex(8)
+    g.trace = TRACER.start(request.endpoint or 'unknown', trace_id=g.trace_id, method=request.method,
+                           path=request.path)
+
+
+@app.after_request
+def add_trace_id(response):
+    root = current_span()
+    if root is not None:
+        root.attrs['status'] = response.status_code
+    response.headers['X-Trace-Id'] = g.get('trace_id', '')
+    return response
+
+
+@app.teardown_request
+def finish_trace(error):
+    TRACER.finish(g.pop('trace', None), error)
+
+
+@app.after_request
+def count_request_errors(response):
+    if response.status_code >= 400:
+        REQUEST_ERRORS.inc((request.endpoint or 'unknown', response.status_code))
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(error):
+    started_at = g.pop('started_at', None)
+    if started_at is None:
+        return
+    route = request.endpoint or 'unknown'
+    if error is not None:
+        REQUEST_ERRORS.inc((route, 500))
+    REQUEST_DURATION.observe(route, time.perf_counter() - started_at)
+    REQUESTS_IN_FLIGHT.dec(route)
+
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4')
+
+
+@app.errorhandler(InvalidTarget)
+def invalid_target(e):
+    return json.jsonify({'result': str(e)}), 400
+
+
+def request_fields():
+    return request.get_json(silent=True) or request.args
+
+
+def get_network():
+    """
+    The network a request names in its `network` field, the default one otherwise.
+    """
+    return clients.network(request_fields().get('network') or app.config['DEFAULT_NETWORK'])
+
+
+def check_indexed(contract_address=None):
+    """
+    Raises `InvalidTarget` unless the event indexer covers the network, and
+    the contract if given, that a request names.
+    """
+    network = get_network()
+    if network.name != app.config['DEFAULT_NETWORK']:
+        raise InvalidTarget(''.join(['events are not indexed on network: ', network.name]))
+    if contract_address is not None and contract_address.lower() not in event_indexer.contracts:
+        raise InvalidTarget(''.join(['events are not indexed for contract: ', contract_address]))
+
+
+def get_client():
+    """
+    The contract client a request names in its `network` and
+    `contract_address` fields, the default network and contract otherwise.
+    """
+    fields = request_fields()
+    return clients.contract(fields.get('network') or app.config['DEFAULT_NETWORK'],
+                            fields.get('contract_address') or app.config['DEFAULT_CONTRACT_ADDRESS'])
+
+
+async def get_token_setting(client, field, load):
+    return await metadata_cache.fetch(client.key, field, lambda: rpc.run(load))
+
+
 @app.route('/get_accounts')
 def get_accounts():
     account_list = wallet_manager.get_wallet().get_accounts()
@@ -93,77 +270,100 @@ def remove_account():
         if acct is None:
             return json.jsonify({'result': ''.join(['remove ', b58_address_remove, ' failed!'])}), 500
         wallet_manager.wallet_in_mem.remove_account(b58_address_remove)
+        account_sessions.lock_address(b58_address_remove)
         wallet_manager.save()
         return json.jsonify({'result': ''.join(['remove ', b58_address_remove, ' successful!'])}), 200
     except SDKException or RuntimeError:
         return json.jsonify({'result': ''.join(['remove ', b58_address_remove, ' failed!'])}), 500
 
 
+def get_signer(b58_address, password, session_token=None):
+    if session_token is not None:
+        account = account_sessions.get(session_token, b58_address)
+        if account is None:
+            raise SDKException(ErrorCode.other_error('invalid or expired session token'))
+        return account
+    with span('decrypt', address=b58_address):
+        return wallet_manager.get_account(b58_address, password)
+
+
+@app.route('/unlock_account', methods=['POST'])
+def unlock_account():
+    password = request.json.get('password')
+    try:
+        b58_address = request.json.get('b58_address') or wallet_manager.get_default_account().get_address()
+        account = wallet_manager.get_account(b58_address, password)
+    except IndexError:
+        return json.jsonify({'result': 'Please import an account'}), 400
+    except SDKException as e:
+        return json.jsonify({'result': e.args[1]}), 500
+    except RuntimeError:
+        return json.jsonify({'result': 'wrong password'}), 400
+    if account is None:
+        return json.jsonify({'result': 'Invalid address'}), 400
+    return json.jsonify({'result': account_sessions.unlock(account)}), 200
+
+
+@app.route('/lock_account', methods=['POST'])
+def lock_account():
+    session_token = request.json.get('session_token')
+    b58_address = request.json.get('b58_address')
+    if session_token is not None:
+        locked = int(account_sessions.lock(session_token))
+    else:
+        locked = account_sessions.lock_address(b58_address)
+    return json.jsonify({'result': locked}), 200
+
+
 @app.route('/set_contract_address', methods=['POST'])
 def set_contract_address():
+    """
+    Checks a contract address; the page then names it in its requests.
+    """
     contract_address = request.json.get('contract_address')
-    global oep4
-    oep4.set_contract_address(contract_address['value'])
-    return json.jsonify({'result': contract_address}), 200
+    client = clients.contract(request.json.get('network') or app.config['DEFAULT_NETWORK'],
+                              contract_address['value'])
+    return json.jsonify({'result': client.contract_address}), 200
 
 
 @app.route('/get_contract_address', methods=['GET'])
 def get_contract_address():
-    global oep4
-    contract_address = oep4.get_contract_address()
-    return json.jsonify({'result': contract_address}), 200
+    client = get_client()
+    return json.jsonify({'result': client.contract_address}), 200
 
 
 @app.route('/change_net', methods=['POST'])
-def change_net():
+async def change_net():
+    """
+    Checks that a network's nodes answer; the page then names it in its requests.
+    """
     network_selected = request.json.get('network_selected')
-    if network_selected == 'MainNet':
-        remote_rpc_address = 'http://dappnode1.ont.io:20336'
-        with app.app_context() as context:
-            sdk.set_rpc(remote_rpc_address)
-            sdk_rpc_address = sdk.get_rpc().addr
-            if sdk_rpc_address != remote_rpc_address:
-                result = ''.join(['remote rpc address set failed. the rpc address now used is ', sdk_rpc_address])
-                return json.jsonify({'result': result}), 409
-    elif network_selected == 'TestNet':
-        remote_rpc_address = 'http://polaris3.ont.io:20336'
-        with app.app_context() as context:
-            sdk.set_rpc(remote_rpc_address)
-            sdk_rpc_address = sdk.get_rpc().addr
-            if sdk_rpc_address != remote_rpc_address:
-                result = ''.join(['remote rpc address set failed. the rpc address now used is ', sdk_rpc_address])
-                return json.jsonify({'result': result}), 409
-    elif network_selected == 'Localhost':
-        remote_rpc_address = 'http://127.0.0.1:20336'
-        with app.app_context() as context:
-            sdk.set_rpc(remote_rpc_address)
-            old_remote_rpc_address = sdk.get_rpc()
-            sdk_rpc_address = sdk.get_rpc().addr
-            if sdk_rpc_address != remote_rpc_address:
-                result = ''.join(['remote rpc address set failed. the rpc address now used is ', sdk_rpc_address])
-                return json.jsonify({'result': result}), 409
-            try:
-                sdk.rpc.get_version()
-            except SDKException as e:
-                sdk.set_rpc(old_remote_rpc_address)
-                error_msg = 'Other Error, ConnectionError'
-                if error_msg in e.args[1]:
-                    return json.jsonify({'result': 'Connection to localhost node failed.'}), 400
-                else:
-                    return json.jsonify({'result': e.args[1]}), 500
-    else:
+    if network_selected not in app.config['RPC_NODES']:
         return json.jsonify({'result': 'unsupported network.'}), 501
-    global oep4
-    oep4 = sdk.neo_vm().oep4()
+    network = clients.network(network_selected)
+    try:
+        await rpc.run(network.rpc.get_version)
+    except SDKException as e:
+        error_msg = 'Other Error, ConnectionError'
+        if error_msg in e.args[1]:
+            return json.jsonify({'result': ''.join(['Connection to ', network_selected, ' nodes failed.'])}), 400
+        else:
+            return json.jsonify({'result': e.args[1]}), 500
     return json.jsonify({'result': 'succeed'}), 200
 
 
+@app.route('/rpc_nodes')
+def rpc_nodes():
+    return json.jsonify({'result': get_network().rpc.stats()}), 200
+
+
 @app.route('/get_smart_contract_event', methods=['POST'])
-def get_smart_contract_event():
+async def get_smart_contract_event():
     tx_hash = request.json.get('tx_hash')
     event_info_select = request.json.get('event_info_select')
+    network = get_network()
     try:
-        event = sdk.rpc.get_smart_contract_event_by_tx_hash(tx_hash)
+        event = await rpc.run(network.rpc.get_smart_contract_event_by_tx_hash, tx_hash)
     except SDKException as e:
         return json.jsonify({'result': e.args[1]}), 500
     try:
@@ -173,11 +373,127 @@ def get_smart_contract_event():
     return json.jsonify({'result': result}), 200
 
 
+def fetch_tx_event(rpc_client, tx_hash, contracts):
+    """
+    Looks a transaction up over rpc, in the shape of the event index.
+    :return: the decoded event with its block `height`, None for an unknown hash.
+    """
+    event = rpc_client.get_smart_contract_event_by_tx_hash(tx_hash)
+    if not event:
+        return None
+    event = decode_tx_event(event, contracts)
+    event['height'] = rpc_client.get_block_height_by_tx_hash(tx_hash)
+    return event
+
+
+@app.route('/get_smart_contract_events', methods=['POST'])
+def get_smart_contract_events():
+    """
+    Looks up many transactions at once, from the event index when it has them
+    and concurrently over rpc otherwise; both answer in the shape of
+    `decode_tx_event`.
+    :param tx_hashes: list of tx hashes.
+    :param event_info_select: list of fields out of `State`, `GasConsumed`,
+    `Notify` and `height`, defaults to all of them.
+    :return: dict of tx hash -> selected fields, None for unknown hashes.
+    """
+    tx_hashes = list(dict.fromkeys(request.json.get('tx_hashes') or list()))
+    fields = request.json.get('event_info_select') or ['State', 'GasConsumed', 'Notify', 'height']
+    if len(tx_hashes) > app.config['BULK_EVENT_MAX_HASHES']:
+        return json.jsonify({'result': 'too many tx hashes'}), 400
+    network = get_network()
+    indexed = event_indexer is not None and network.name == app.config['DEFAULT_NETWORK']
+    events = event_indexer.transaction_events(tx_hashes) if indexed else dict()
+    index_hits = len(events)
+    contracts = {contract.lower() for contract in app.config['EVENT_INDEX_CONTRACTS']}
+    contracts.add(get_client().contract_address.lower())
+    calls = {tx_hash: (fetch_tx_event, network.rpc, tx_hash, contracts)
+             for tx_hash in tx_hashes if tx_hash not in events}
+    for tx_hash, event in rpc.imap_unordered(calls, app.config['BULK_EVENT_CONCURRENCY']):
+        if isinstance(event, Exception):
+            events[tx_hash] = {'error': event.args[1] if len(event.args) > 1 else str(event)}
+        elif event:
+            events[tx_hash] = event
+    result = dict()
+    for tx_hash in tx_hashes:
+        event = events.get(tx_hash)
+        if event is None or 'error' in event:
+            result[tx_hash] = event
+        else:
+            result[tx_hash] = {field: event.get(field) for field in fields}
+    return json.jsonify({'result': result, 'index_hits': index_hits}), 200
+
+
+@app.route('/get_event_history', methods=['POST'])
+def get_event_history():
+    if event_indexer is None:
+        return json.jsonify({'result': 'event indexer is not enabled'}), 501
+    check_indexed()
+    b58_address = request.json.get('b58_address')
+    event_name = request.json.get('event_name')
+    limit = int(request.json.get('limit', 50))
+    offset = int(request.json.get('offset', 0))
+    result = event_indexer.events_by_address(b58_address, event_name, limit, offset)
+    return json.jsonify({'result': result}), 200
+
+
+@app.route('/event_stream')
+def event_stream():
+    job_ids = request.args.getlist('job_id')
+    subscription = event_feed.subscribe(request.args.getlist('address'), request.args.getlist('event'),
+                                        request.args.getlist('tx_hash'), job_ids)
+    # a job may have moved on before the client subscribed, so start with where each one is now
+    for job_id in job_ids:
+        job = clients.job(job_id)
+        if job is not None:
+            subscription.queue.put_nowait(dict(job, name='job'))
+
+    def generate():
+        try:
+            while not subscription.closed:
+                try:
+                    item = subscription.get(timeout=15)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield ''.join(['event: ', item['name'], '\ndata: ', json.dumps(item), '\n\n'])
+        finally:
+            event_feed.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/holders')
+def holders():
+    if event_indexer is None:
+        return json.jsonify({'result': 'event indexer is not enabled'}), 501
+    contract_address = get_client().contract_address
+    check_indexed(contract_address)
+    limit = min(int(request.args.get('limit', 50)), 1000)
+    after = None
+    if 'after_balance' in request.args:
+        after = (int(request.args['after_balance']), request.args.get('after_address', ''))
+    result = event_indexer.holders(contract_address, limit, after)
+    # pass `next` back as after_balance and after_address for the following page
+    next_page = {'after_balance': result[-1]['balance'], 'after_address': result[-1]['address']} \
+        if len(result) == limit else None
+    return json.jsonify({'result': result, 'next': next_page}), 200
+
+
+@app.route('/holder_count')
+def holder_count():
+    if event_indexer is None:
+        return json.jsonify({'result': 'event indexer is not enabled'}), 501
+    contract_address = get_client().contract_address
+    check_indexed(contract_address)
+    return json.jsonify({'result': event_indexer.holder_count(contract_address)}), 200
+
+
 @app.route('/get_name')
-def get_name():
+async def get_name():
     try:
-        global oep4
-        name = oep4.get_name()
+        client = get_client()
+        name = await get_token_setting(client, 'name', client.oep4.get_name)
         return json.jsonify({'result': name}), 200
     except RuntimeError:
         return json.jsonify({'result': 'get name failed'}), 500
@@ -186,10 +502,10 @@ def get_name():
 
 
 @app.route('/get_symbol')
-def get_symbol():
+async def get_symbol():
     try:
-        global oep4
-        symbol = oep4.get_symbol()
+        client = get_client()
+        symbol = await get_token_setting(client, 'symbol', client.oep4.get_symbol)
         return json.jsonify({'result': symbol}), 200
     except RuntimeError:
         return json.jsonify({'result': 'get symbol failed'}), 500
@@ -198,10 +514,10 @@ def get_symbol():
 
 
 @app.route('/get_decimal')
-def get_decimal():
+async def get_decimal():
     try:
-        global oep4
-        decimal = oep4.get_decimal()
+        client = get_client()
+        decimal = await get_token_setting(client, 'decimals', client.oep4.get_decimal)
         return json.jsonify({'result': decimal}), 200
     except RuntimeError:
         return json.jsonify({'result': 'get decimal failed'}), 500
@@ -209,20 +525,37 @@ def get_decimal():
         return json.jsonify({'result': e.args[1]}), 500
 
 
+@app.route('/get_total_supply')
+async def get_total_supply():
+    try:
+        client = get_client()
+        total_supply = await get_token_setting(client, 'totalSupply', client.oep4.get_total_supply)
+        return json.jsonify({'result': total_supply}), 200
+    except RuntimeError:
+        return json.jsonify({'result': 'get total supply failed'}), 500
+    except SDKException as e:
+        return json.jsonify({'result': e.args[1]}), 500
+
+
+@app.route('/metadata_cache_stats')
+def metadata_cache_stats():
+    return json.jsonify({'result': metadata_cache.stats()}), 200
+
+
 @app.route('/query_balance', methods=['POST'])
-def query_balance():
+async def query_balance():
     b58_address = request.json.get('b58_address')
     asset_select = request.json.get('asset_select')
+    client = get_client()
     try:
         if asset_select == 'OEP4 Token':
-            global oep4
-            balance = oep4.balance_of(b58_address)
+            balance = await rpc.run(client.oep4.balance_of, b58_address)
             return json.jsonify({'result': str(balance)}), 200
         elif asset_select == 'ONT':
-            balance = sdk.rpc.get_balance(b58_address)
+            balance = await rpc.run(client.rpc.get_balance, b58_address)
             return json.jsonify({'result': str(balance['ont'])}), 200
         elif asset_select == 'ONG':
-            balance = sdk.rpc.get_balance(b58_address)
+            balance = await rpc.run(client.rpc.get_balance, b58_address)
             return json.jsonify({'result': str(balance['ong'])}), 200
         else:
             return json.jsonify({'result': 'query balance failed'}), 500
@@ -230,6 +563,75 @@ def query_balance():
         return json.jsonify({'result': e.args[1]}), 500
 
 
+@app.route('/query_balances', methods=['POST'])
+def query_balances():
+    b58_address_list = request.json.get('b58_address_list')
+    asset_select_list = request.json.get('asset_select_list', ['OEP4 Token', 'ONT', 'ONG'])
+    if not isinstance(b58_address_list, list):
+        return json.jsonify({'result': 'b58_address_list should be a list'}), 400
+    if not set(asset_select_list) <= {'OEP4 Token', 'ONT', 'ONG'}:
+        return json.jsonify({'result': 'unsupported asset'}), 400
+    client = get_client()
+    calls = dict()
+    for b58_address in dict.fromkeys(b58_address_list):
+        if 'OEP4 Token' in asset_select_list:
+            calls[(b58_address, 'OEP4 Token')] = (client.oep4.balance_of, b58_address)
+        if 'ONT' in asset_select_list or 'ONG' in asset_select_list:
+            # a single getbalance answers both native assets
+            calls[(b58_address, 'native')] = (client.rpc.get_balance, b58_address)
+
+    def generate():
+        for (b58_address, asset), balance in rpc.imap_unordered(calls, app.config['BULK_BALANCE_CONCURRENCY']):
+            assets = [asset] if asset == 'OEP4 Token' else [a for a in ('ONT', 'ONG') if a in asset_select_list]
+            for asset_select in assets:
+                item = {'b58_address': b58_address, 'asset_select': asset_select}
+                if isinstance(balance, SDKException):
+                    item['error'] = balance.args[1]
+                elif isinstance(balance, Exception):
+                    item['error'] = 'query balance failed'
+                elif asset_select == 'OEP4 Token':
+                    item['result'] = str(balance)
+                elif not isinstance(balance, dict):
+                    # getbalance answers an invalid address with an error code and an empty result
+                    item['error'] = 'query balance failed'
+                else:
+                    item['result'] = str(balance[asset_select.lower()])
+                yield json.dumps(item) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+def queue_invoke(client, operation, signer, args, amount):
+    """
+    Queues a signed call of an OEP4 operation whose last argument is a token
+    amount. The amount is scaled to the token's decimals and the gas limit
+    estimated on the queue worker, since both can take a call to the node.
+    :return: the job id.
+    """
+    def build():
+        decimals = metadata_cache.load(client.key, 'decimals', client.oep4.get_decimal)
+
+        def sign(limit):
+            tx = make_invoke_transaction(client.oep4.get_contract_address(is_hex=False), operation,
+                                         args + [amount * 10 ** decimals],
+                                         signer.get_address().to_array(), limit, gas_price)
+            return sign_transaction(tx, [signer])
+
+        tx, _ = gas_estimator.estimate(client.rpc, client.key + (operation,), 1, sign)
+        return tx
+
+    return client.network.tx_queue.submit(build, operation=operation, contract=client.contract_address)
+
+
+@app.route('/tx_status')
+def tx_status():
+    job_id = request.args.get('job_id')
+    job = clients.job(job_id)
+    if job is None:
+        return json.jsonify({'result': 'unknown job_id'}), 404
+    return json.jsonify({'result': job}), 200
+
+
 @app.route('/transfer', methods=['POST'])
 def transfer():
     b58_to_address = request.json.get('b58_to_address')
@@ -237,54 +639,197 @@ def transfer():
     amount = int(request.json.get('amount'))
     try:
         b58_from_address = wallet_manager.get_default_account().get_address()
-        try:
-            from_acct = wallet_manager.get_account(b58_from_address, password)
-        except SDKException as e:
-            return json.jsonify({'result': e.args[1]}), 500
-        global oep4
-        tx_hash = oep4.transfer(from_acct, b58_to_address, amount, from_acct, gas_limit, gas_price)
+        from_acct = get_signer(b58_from_address, password, request.json.get('session_token'))
+        to_address = Address.b58decode(b58_to_address).to_array()
     except IndexError:
         return json.jsonify({'result': 'Please import an account'}), 400
     except SDKException as e:
         return json.jsonify({'result': e.args[1]}), 500
-    return json.jsonify({'result': tx_hash}), 200
+    job_id = queue_invoke(get_client(), 'transfer', from_acct, [from_acct.get_address().to_array(), to_address],
+                          amount)
+    return json.jsonify({'result': job_id}), 202
 
 
 @app.route('/transfer_multi', methods=['POST'])
-def transfer_multi():
+async def transfer_multi():
     transfer_array = request.json.get('transfer_array')
     password_array = request.json.get('password_array')
     args = json.loads(transfer_array)
-    signers = list()
-    for (item, password) in zip(args, password_array):
-        try:
-            account = wallet_manager.get_account(item[0], password)
-        except SDKException as e:
-            return json.jsonify({'result': e.args[1]}), 500
-        signers.append(account)
-    global oep4
+    if len(args) == 0:
+        return json.jsonify({'result': 'transfer_array is empty'}), 400
+    if any(not isinstance(item[2], (int, float)) or item[2] < 0 for item in args):
+        return json.jsonify({'result': 'the value should be a number equal or great than 0.'}), 400
+    if isinstance(password_array, str):
+        password_array = json.loads(password_array)
+    if password_array is None:
+        password_array = [None] * len(args)
+    session_token_array = request.json.get('session_token_array') or [None] * len(args)
+    # zip would silently drop the transfers without a password or session token
+    if len(password_array) != len(args) or len(session_token_array) != len(args):
+        return json.jsonify({'result': 'password_array and session_token_array must match transfer_array'}), 400
+    started_at = time.perf_counter()
+    accounts = dict()
+    credentials = list()
+    try:
+        for (item, password, session_token) in zip(args, password_array, session_token_array):
+            if session_token is not None:
+                accounts[item[0]] = get_signer(item[0], password, session_token)
+            else:
+                credentials.append((item[0], password))
+        with span('decrypt', accounts=len(credentials)):
+            accounts.update(await signer_pool.decrypt_accounts(wallet_manager, credentials))
+    except SDKException as e:
+        return json.jsonify({'result': e.args[1]}), 500
+    decrypted_at = time.perf_counter()
+    # one signature per distinct sender, the first sender pays
+    signers = [accounts[b58_address] for b58_address in dict.fromkeys(item[0] for item in args)]
+    client = get_client()
+    # the tx hash once the worker commits to broadcasting, or the route having given up first
+    broadcast = {'tx_hash': None, 'abandoned': False}
+    broadcast_lock = threading.Lock()
+
+    def send_transfer_multi():
+        decimals = metadata_cache.load(client.key, 'decimals', client.oep4.get_decimal)
+        # str() first, so 0.29 is scaled as written instead of as the nearest binary float
+        values = [Decimal(str(item[2])).scaleb(decimals) for item in args]
+        if any(value != value.to_integral_value() for value in values):
+            raise ValueError(''.join(['the value should have at most ', str(decimals), ' decimal places.']))
+        transfers = [[Address.b58decode(item[0]).to_array(), Address.b58decode(item[1]).to_array(), int(value)]
+                     for item, value in zip(args, values)]
+
+        def sign(limit):
+            tx = make_invoke_transaction(client.oep4.get_contract_address(is_hex=False), 'transferMulti', transfers,
+                                         signers[0].get_address().to_array(), limit, gas_price)
+            return sign_transaction(tx, signers)
+
+        tx, gas = gas_estimator.estimate(client.rpc, client.key + ('transferMulti',), len(transfers), sign)
+        with broadcast_lock:
+            if broadcast['abandoned']:
+                raise SDKException(ErrorCode.other_error('timed out before the broadcast'))
+            broadcast['tx_hash'] = tx.hash256_explorer()
+        return client.rpc.send_raw_transaction(tx), tx.gas_limit, gas
+
+    try:
+        # decimals, pre-execution and broadcast can each take a round trip
+        tx_hash, tx_gas_limit, gas = await rpc.run(send_transfer_multi, timeout=3 * app.config['RPC_TIMEOUT'])
+    except SDKException as e:
+        with broadcast_lock:
+            broadcast['abandoned'] = True
+            tx_hash = broadcast['tx_hash']
+        if tx_hash is not None and (is_call_timeout(e) or is_transport_error(e)):
+            # the transaction may reach the node yet, so hand out its hash to watch instead of a failure
+            return json.jsonify({'result': tx_hash, 'status': 'unknown', 'error': e.args[1]}), 202
+        return json.jsonify({'result': e.args[1]}), 500
+    except ValueError as e:
+        return json.jsonify({'result': str(e)}), 400
+    except RuntimeError as e:
+        return json.jsonify({'result': ''.join(['pre-execution failed: ', str(e)])}), 500
+    timing = {'decrypt': decrypted_at - started_at, 'build_sign_submit': time.perf_counter() - decrypted_at}
+    return json.jsonify({'result': tx_hash, 'gas_limit': tx_gas_limit, 'gas_estimated': gas, 'timing': timing}), 200
+
+
+def run_payout(payout_id, payout_job, batches):
+    try:
+        payouts[payout_id]['result'] = payout_job.run(batches)
+    except Exception as e:
+        payouts[payout_id]['error'] = str(e)
+    finally:
+        payout_job.journal.close()
+
+
+@app.route('/payout', methods=['POST'])
+async def payout():
+    """
+    Starts, or resumes after a crash, a payout from the default account.
+    :param payout_id: names the recipients file and the checkpoint under PAYOUT_DIR.
+    :param recipients: list of {"b58_address": ..., "amount": ...}; may be left out
+    when the recipients file was uploaded to PAYOUT_DIR or the payout is resumed.
+    """
+    payout_id = request.json.get('payout_id')
+    recipients = request.json.get('recipients')
+    password = request.json.get('password')
+    if payout_id is None or re.fullmatch(r'[\w-]+', payout_id) is None:
+        return json.jsonify({'result': 'invalid payout_id'}), 400
+    if payout_id in payouts and payouts[payout_id]['thread'].is_alive():
+        return json.jsonify({'result': 'payout is already running'}), 409
+    os.makedirs(payout_dir, exist_ok=True)
+    recipients_path = os.path.join(payout_dir, payout_id + '.jsonl')
+    if recipients is not None:
+        content = ''.join(json.dumps(item) + '\n' for item in recipients)
+        if os.path.isfile(recipients_path):
+            with open(recipients_path) as f:
+                if f.read() != content:
+                    return json.jsonify({'result': 'payout_id belongs to other recipients'}), 409
+        else:
+            with open(recipients_path, 'w') as f:
+                f.write(content)
+    elif not os.path.isfile(recipients_path):
+        return json.jsonify({'result': 'recipients is required'}), 400
     try:
-        tx_hash = oep4.transfer_multi(args, signers[0], signers, gas_limit, gas_price)
+        b58_from_address = wallet_manager.get_default_account().get_address()
+        payer = get_signer(b58_from_address, password, request.json.get('session_token'))
+        if payer is None:
+            return json.jsonify({'result': ''.join(['account not found in the wallet: ', b58_from_address])}), 400
+        client = get_client()
+        decimals = await get_token_setting(client, 'decimals', client.oep4.get_decimal)
+    except IndexError:
+        return json.jsonify({'result': 'Please import an account'}), 400
     except SDKException as e:
         return json.jsonify({'result': e.args[1]}), 500
-    return json.jsonify({'result': tx_hash}), 200
+    except RuntimeError:
+        # the wallet fails to decrypt the account with a wrong password
+        return json.jsonify({'result': 'password does not match the address'}), 500
+    batch_size = max_batch_size(gas_limit, app.config['PAYOUT_GAS_PER_TRANSFER'], app.config['PAYOUT_MAX_TX_BYTES'],
+                                app.config['PAYOUT_MAX_BATCH'])
+    header = journal_header(recipients_path, client.contract_address, b58_from_address, batch_size, decimals)
+    try:
+        journal = PayoutJournal(os.path.join(payout_dir, payout_id + '.checkpoint.jsonl'), header)
+    except ValueError as e:
+        return json.jsonify({'result': str(e)}), 409
+    payout_job = Payout(client.rpc, client.oep4.get_contract_address(is_hex=False), payer, batch_size, gas_limit,
+                        gas_price, journal, app.config['SIGNER_POOL_PROCESSES'], app.config['PAYOUT_CONCURRENCY'],
+                        app.config['PAYOUT_MAX_ATTEMPTS'], app.config['TX_CONFIRM_POLL_INTERVAL'],
+                        app.config['TX_CONFIRM_TIMEOUT'])
+    try:
+        batches = payout_job.batches(read_recipients(recipients_path), decimals)
+    except (ValueError, KeyError, SDKException) as e:
+        journal.close()
+        return json.jsonify({'result': ''.join(['invalid recipients: ', str(e)])}), 400
+    thread = threading.Thread(target=run_payout, args=(payout_id, payout_job, batches),
+                              name=''.join(['payout-', payout_id]), daemon=True)
+    payouts[payout_id] = {'thread': thread, 'journal': journal, 'batches': len(batches)}
+    thread.start()
+    return json.jsonify({'result': payout_id, 'batches': len(batches), 'batch_size': batch_size}), 202
+
+
+@app.route('/payout_status')
+def payout_status():
+    payout_id = request.args.get('payout_id')
+    job = payouts.get(payout_id)
+    if job is None:
+        return json.jsonify({'result': 'unknown payout_id'}), 404
+    result = {'running': job['thread'].is_alive(), 'batches': job['batches'], 'status': job['journal'].summary()}
+    if 'error' in job:
+        result['error'] = job['error']
+    return json.jsonify({'result': result}), 200
 
 
 @app.route('/approve', methods=['POST'])
 def approve():
     password = request.json.get('password')
     b58_spender_address = request.json.get('b58_spender_address')
-    amount = request.json.get('amount')
+    amount = int(request.json.get('amount'))
     try:
         b58_from_address = wallet_manager.get_default_account().get_address()
-        default_acct = wallet_manager.get_account(b58_from_address, password)
-        global oep4
-        tx_hash = oep4.approve(default_acct, b58_spender_address, amount, default_acct, gas_limit, gas_price)
+        default_acct = get_signer(b58_from_address, password, request.json.get('session_token'))
+        spender_address = Address.b58decode(b58_spender_address).to_array()
     except IndexError:
         return json.jsonify({'result': 'Please import an account'}), 400
     except SDKException as e:
         return json.jsonify({'result': e.args[1]}), 500
-    return json.jsonify({'result': tx_hash}), 200
+    job_id = queue_invoke(get_client(), 'approve', default_acct,
+                          [default_acct.get_address().to_array(), spender_address], amount)
+    return json.jsonify({'result': job_id}), 202
 
 
 @app.route('/transfer_from', methods=['POST'])
@@ -295,28 +840,42 @@ def transfer_from():
     b58_to_address = request.json.get('b58_to_address')
     amount = int(request.json.get('amount'))
     try:
-        spender = wallet_manager.get_account(b58_spender_address, password)
+        spender = get_signer(b58_spender_address, password, request.json.get('session_token'))
+        if spender is None:
+            return json.jsonify({'result': ''.join(['account not found: ', b58_spender_address])}), 500
+        args = [Address.b58decode(b58_address).to_array()
+                for b58_address in (b58_spender_address, b58_from_address, b58_to_address)]
     except SDKException as e:
         return json.jsonify({'result': e.args[1]}), 500
-    global oep4
-    try:
-        tx_hash = oep4.transfer_from(spender, b58_from_address, b58_to_address, amount, spender, gas_limit, gas_price)
-    except SDKException as e:
-        return json.jsonify({'result': e.args[1]}), 500
-    return json.jsonify({'result': tx_hash}), 200
+    job_id = queue_invoke(get_client(), 'transferFrom', spender, args, amount)
+    return json.jsonify({'result': job_id}), 202
 
 
 @app.route('/allowance', methods=['POST'])
-def allowance():
+async def allowance():
     b58_owner_address = request.json.get('b58_owner_address')
     b58_spender_address = request.json.get('b58_spender_address')
+    client = get_client()
     try:
-        global oep4
-        result = oep4.allowance(b58_owner_address, b58_spender_address)
+        result = await rpc.run(client.oep4.allowance, b58_owner_address, b58_spender_address)
     except SDKException as e:
         return json.jsonify({'result': e.args[1]}), 500
     return json.jsonify({'result': result}), 200
 
 
 if __name__ == '__main__':
+    if app.config['TRACE_LOG'] is not None:
+        TRACER.configure(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                      app.config['TRACE_LOG']),
+                         app.config['TRACE_SAMPLE_RATE'], app.config['TRACE_SLOW_THRESHOLD'],
+                         app.config['TRACE_MAX_QUEUE'])
+    # the reloader runs this module in a watcher process and again in the serving one,
+    # only the serving one runs the background threads
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        clients.start()
+        if event_indexer is not None:
+            event_indexer.start()
+        else:
+            event_feed.start_polling(PooledRpcClient(app.config['DEFAULT_REMOTE_RPC_ADDRESS']),
+                                     app.config['EVENT_INDEX_CONTRACTS'])
     app.run(debug=True, port=5001)
@@ -0,0 +1,146 @@
+import contextlib
+import contextvars
+import json
+import logging
+import queue
+import random
+import secrets
+import time
+from logging.handlers import QueueListener
+
+_current_span = contextvars.ContextVar('span', default=None)
+
+
+class Span(object):
+    __slots__ = ('name', 'attrs', 'started_at', 'duration', 'error', 'children')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.children = list()
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started_at
+
+    def to_dict(self, origin):
+        item = {'name': self.name, 'start_ms': round((self.started_at - origin) * 1000, 3),
+                'duration_ms': round((self.duration or 0) * 1000, 3)}
+        item.update(self.attrs)
+        if self.error is not None:
+            item['error'] = self.error
+        if self.children:
+            item['spans'] = [child.to_dict(origin) for child in list(self.children)]
+        return item
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """
+    Times a block as a child of the current span; does nothing outside a trace.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, attrs)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.error = repr(e)
+        raise
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def current_span():
+    return _current_span.get()
+
+
+class Tracer(object):
+    """
+    Collects the spans of a request, or of a background job, into one trace
+    and writes it as a JSON line: a `sample_rate` share of all traces plus
+    every trace slower than `slow_threshold` seconds or ending in an error.
+    Writing goes through a bounded queue to a listener thread that appends to
+    the log file; when the queue is full the trace is dropped and counted
+    instead of making the caller wait.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 0
+        self.slow_threshold = None
+        self.dropped = 0
+        self.__queue = None
+        self.__listener = None
+
+    def configure(self, path, sample_rate=0.01, slow_threshold=1.0, max_queue=10000):
+        handler = logging.FileHandler(path, mode='a', delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.__queue = queue.Queue(max_queue)
+        self.__listener = QueueListener(self.__queue, handler)
+        self.__listener.start()
+        self.enabled = True
+
+    def start(self, name, **attrs):
+        """
+        Starts a trace in the current context.
+        :return: a handle for `finish`, or None when tracing is off.
+        """
+        if not self.enabled:
+            return None
+        root = Span(name, attrs)
+        return root, _current_span.set(root)
+
+    def finish(self, handle, error=None):
+        if handle is None:
+            return
+        root, token = handle
+        root.finish()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # finished from another context, e.g. a teardown after a copied context; nothing to restore
+            pass
+        if error is not None:
+            root.error = repr(error)
+        if root.error is None and root.duration < self.slow_threshold and random.random() >= self.sample_rate:
+            return
+        trace = {'trace_id': root.attrs.pop('trace_id', None) or secrets.token_hex(8),
+                 'time': time.time() - root.duration}
+        trace.update(root.to_dict(root.started_at))
+        record = logging.makeLogRecord({'msg': json.dumps(trace, default=str)})
+        try:
+            self.__queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    @contextlib.contextmanager
+    def trace(self, name, **attrs):
+        """
+        Traces a block as its own root, e.g. a background job.
+        """
+        handle = self.start(name, **attrs)
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.finish(handle, error)
+
+    def stop(self):
+        if self.__listener is not None:
+            self.__listener.stop()
+
+
+TRACER = Tracer()
@@ -0,0 +1,220 @@
+import collections
+import logging
+import queue
+import secrets
+import threading
+import time
+
+from ontology.exception.exception import SDKException
+
+from rpc_client import is_transport_error
+from tracing import TRACER, span
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+BROADCAST = 'broadcast'
+CONFIRMED = 'confirmed'
+FAILED = 'failed'
+
+
+class TxQueue(object):
+    """
+    Broadcasts transactions on background workers, so a route only has to
+    queue a job and return its id. A job's transaction is built and signed
+    once; on transport errors the very same raw transaction is re-sent with
+    exponential backoff. One tracker thread confirms all broadcast jobs by
+    reading the events of every new block, so a poll cycle costs one call per
+    block however many transactions are outstanding. Each listener is called
+    with a copy of a job whenever its status or tx hash changes.
+
+    Jobs live in this process's memory only: run the explorer as a single
+    process, since a job queued on one worker can't be seen from another, and
+    jobs still queued when it stops are lost.
+    """
+
+    def __init__(self, rpc_client, workers=4, max_attempts=5, backoff=1, max_backoff=30, poll_interval=3,
+                 confirm_timeout=300, max_jobs=10000):
+        self.rpc_client = rpc_client
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.confirm_timeout = confirm_timeout
+        self.max_jobs = max_jobs
+        self.listeners = list()
+        self.__jobs = collections.OrderedDict()
+        self.__outstanding = dict()
+        self.__queue = queue.Queue()
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+
+    def start(self):
+        for index in range(self.workers):
+            threading.Thread(target=self.__work, name=''.join(['tx-queue-', str(index)]), daemon=True).start()
+        threading.Thread(target=self.__track, name='tx-tracker', daemon=True).start()
+
+    def stop(self):
+        self.__stop.set()
+
+    def submit(self, build, **info):
+        """
+        Queues a transaction.
+        :param build: callable returning the signed `Transaction`; it runs on a
+        worker, so anything that needs the node belongs in it.
+        :param info: extra fields reported by `status`, e.g. the operation.
+        :return: the job id.
+        """
+        job_id = secrets.token_hex(16)
+        job = dict(info, id=job_id, status=QUEUED, tx_hash=None, attempts=0, error=None, queued_at=time.time())
+        with self.__lock:
+            self.__jobs[job_id] = job
+            finished = [key for key, item in self.__jobs.items() if item['status'] in (CONFIRMED, FAILED)]
+            for key in finished[:max(0, len(self.__jobs) - self.max_jobs)]:
+                del self.__jobs[key]
+        self.__notify(dict(job))
+        self.__queue.put((job_id, build))
+        return job_id
+
+    def status(self, job_id):
+        with self.__lock:
+            job = self.__jobs.get(job_id)
+            return None if job is None else dict(job)
+
+    def counts(self):
+        with self.__lock:
+            statuses = [job['status'] for job in self.__jobs.values()]
+        return {status: statuses.count(status) for status in (QUEUED, BROADCAST, CONFIRMED, FAILED)}
+
+    def __update(self, job_id, **fields):
+        with self.__lock:
+            job = self.__jobs.get(job_id)
+            if job is None:
+                return
+            changed = any(job.get(key) != fields[key] for key in ('status', 'tx_hash') if key in fields)
+            job.update(fields)
+            if fields.get('status') == BROADCAST:
+                self.__outstanding[job['tx_hash']] = job_id
+            elif fields.get('status') in (CONFIRMED, FAILED):
+                self.__outstanding.pop(job['tx_hash'], None)
+            job = dict(job)
+        if changed:
+            self.__notify(job)
+
+    def __notify(self, job):
+        for listener in self.listeners:
+            try:
+                listener(job)
+            except Exception:
+                logger.exception('tx job listener failed')
+
+    def __work(self):
+        while not self.__stop.is_set():
+            try:
+                job_id, build = self.__queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                with TRACER.trace('tx_job', job_id=job_id):
+                    self.__broadcast(job_id, build)
+            except Exception as e:
+                logger.exception('tx job %s crashed', job_id)
+                self.__update(job_id, status=FAILED, error=str(e))
+
+    def __broadcast(self, job_id, build):
+        try:
+            with span('build'):
+                tx = build()
+        except (SDKException, RuntimeError) as e:
+            self.__update(job_id, status=FAILED, error=e.args[1] if len(e.args) > 1 else str(e))
+            return
+        with span('serialize'):
+            tx_hash = tx.hash256_explorer()
+            tx_data = tx.serialize().hex()
+        self.__update(job_id, tx_hash=tx_hash, gas_limit=tx.gas_limit)
+        for attempt in range(1, self.max_attempts + 1):
+            self.__update(job_id, attempts=attempt)
+            try:
+                self.rpc_client.send_raw_transaction_hex(tx_data)
+            except SDKException as e:
+                if not is_transport_error(e):
+                    if attempt == 1:
+                        self.__update(job_id, status=FAILED, error=e.args[1])
+                        return
+                    # an earlier attempt may have reached the node, so this can be a duplicate rejection;
+                    # the tracker settles it either way
+                    self.__update(job_id, error=e.args[1])
+                    break
+                if attempt == self.max_attempts:
+                    self.__update(job_id, status=FAILED, error=e.args[1])
+                    return
+                logger.warning('broadcast of %s failed, retrying: %s', tx_hash, e.args[1])
+                if self.__stop.wait(min(self.max_backoff, self.backoff * 2 ** (attempt - 1))):
+                    return
+                continue
+            break
+        self.__update(job_id, status=BROADCAST, broadcast_at=time.time())
+
+    def __settle(self, tx_hash, event, height=None):
+        with self.__lock:
+            job_id = self.__outstanding.get(tx_hash)
+        if job_id is not None:
+            self.__update(job_id, status=CONFIRMED if event['State'] == 1 else FAILED, height=height,
+                          gas_consumed=event['GasConsumed'])
+
+    def __expire(self):
+        now = time.time()
+        with self.__lock:
+            expired = [(tx_hash, job_id) for tx_hash, job_id in self.__outstanding.items()
+                       if now - self.__jobs[job_id]['broadcast_at'] > self.confirm_timeout]
+        for tx_hash, job_id in expired:
+            # the block scan can miss a transaction after a network switch, so ask for it directly once
+            event = self.rpc_client.get_smart_contract_event_by_tx_hash(tx_hash)
+            if not event:
+                self.__update(job_id, status=FAILED, error='not confirmed in time')
+                continue
+            try:
+                self.__settle(tx_hash, event)
+            except (KeyError, TypeError):
+                self.__update(job_id, status=FAILED, error='the node returned an unreadable event')
+
+    def __scan(self, height, block_count):
+        """
+        Settles the jobs in blocks `height` to `block_count - 1`.
+        :return: the next height to scan.
+        """
+        while height < block_count and not self.__stop.is_set():
+            for event in self.rpc_client.get_smart_contract_event_by_height(height) or list():
+                try:
+                    self.__settle(event['TxHash'], event, height)
+                except (KeyError, TypeError):
+                    # a job whose event is unreadable here is settled by __expire
+                    logger.warning('skipping unreadable event at height %d: %r', height, event)
+            height += 1
+        return height
+
+    def __track(self):
+        height = None
+        address = None
+        while not self.__stop.wait(self.poll_interval):
+            try:
+                block_count = self.rpc_client.get_block_count()
+                with self.__lock:
+                    outstanding = len(self.__outstanding)
+                if height is None or outstanding == 0 or address != self.rpc_client.addr:
+                    # idle, or on another network now: follow the tip instead of scanning old blocks
+                    height = block_count
+                    address = self.rpc_client.addr
+                height = self.__scan(height, block_count)
+            except SDKException as e:
+                logger.warning('tx tracker poll failed: %s', e.args[1])
+            except Exception:
+                # e.g. a malformed node response; the jobs in flight still expire below
+                logger.exception('tx tracker poll failed')
+            try:
+                self.__expire()
+            except SDKException as e:
+                logger.warning('tx expiry check failed: %s', e.args[1])
+            except Exception:
+                logger.exception('tx expiry check failed')